@@ -408,22 +408,18 @@ def processar_gamificacao_budget(sender, instance, created, **kwargs):
         return
     
     try:
+        from gamification.achievements import ORCAMENTO_CRIADO
         from gamification.services import GamificationService
         
-        # 50 pontos por criar orçamento
-        GamificationService.adicionar_pontos(
-            user=instance.user,
+        # 50 pontos por criar orçamento + conquistas de orçamentos
+        GamificationService.registrar_evento(
+            instance.user,
+            ORCAMENTO_CRIADO,
             pontos=50,
             tipo='orcamento',
             descricao=f'📊 Orçamento criado: {instance.category.name if instance.category else "Geral"}'
         )
         
-        # Verifica conquistas
-        total_budgets = Budget.objects.filter(user=instance.user).count()
-        
-        if total_budgets == 1:
-            GamificationService.verificar_e_desbloquear_conquista(instance.user, 'primeiro_orcamento')
-        
     except Exception as e:
         print(f"Erro gamificação budget: {e}")
 
@@ -437,21 +433,17 @@ def processar_gamificacao_cartao(sender, instance, created, **kwargs):
         return
     
     try:
+        from gamification.achievements import CARTAO_CRIADO
         from gamification.services import GamificationService
         
-        # 30 pontos por cadastrar cartão
-        GamificationService.adicionar_pontos(
-            user=instance.account.user,
+        # 30 pontos por cadastrar cartão + conquistas de cartões
+        GamificationService.registrar_evento(
+            instance.account.user,
+            CARTAO_CRIADO,
             pontos=30,
             tipo='cartao',
             descricao=f'💳 Cartão cadastrado: {instance.name}'
         )
         
-        # Conquista de primeiro cartão
-        total_cards = CreditCard.objects.filter(account__user=instance.account.user).count()
-        
-        if total_cards == 1:
-            GamificationService.verificar_e_desbloquear_conquista(instance.account.user, 'primeiro_cartao')
-        
     except Exception as e:
         print(f"Erro gamificação cartão: {e}")
\ No newline at end of file
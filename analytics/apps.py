@@ -5,3 +5,7 @@ class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analytics'
     verbose_name = 'Análises Financeiras'
+
+    def ready(self):
+        # Invalida o snapshot financeiro quando os dados mudam
+        from . import signals  # noqa: F401
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinancialSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(default=dict, verbose_name='Dados')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Versão')),
+                ('computed_version', models.PositiveIntegerField(default=0, verbose_name='Versão calculada')),
+                ('computed_for', models.DateField(blank=True, null=True, verbose_name='Calculado para')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Calculado em')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='financial_snapshot', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Snapshot financeiro',
+                'verbose_name_plural': 'Snapshots financeiros',
+            },
+        ),
+    ]
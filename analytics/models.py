@@ -1 +1,35 @@
+from django.conf import settings
 from django.db import models
+
+
+class FinancialSnapshot(models.Model):
+    """
+    Resumo financeiro pré-calculado do usuário (ver analytics/snapshot.py).
+
+    Usado pelo chatbot como contexto e pela página de insights. Cada escrita
+    que altera os números (transações, contas, categorias, gastos de cartão)
+    incrementa ``version``; o snapshot só é válido enquanto
+    ``computed_version == version`` e ``computed_for`` for o dia de hoje (os
+    períodos dependem da data atual) e é recalculado na leitura seguinte.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='financial_snapshot',
+        verbose_name='Usuário'
+    )
+    data = models.JSONField(default=dict, verbose_name='Dados')
+    version = models.PositiveIntegerField(default=0, verbose_name='Versão')
+    computed_version = models.PositiveIntegerField(default=0, verbose_name='Versão calculada')
+    computed_for = models.DateField(null=True, blank=True, verbose_name='Calculado para')
+    computed_at = models.DateTimeField(auto_now=True, verbose_name='Calculado em')
+
+    class Meta:
+        verbose_name = 'Snapshot financeiro'
+        verbose_name_plural = 'Snapshots financeiros'
+
+    def __str__(self):
+        return f'Snapshot financeiro de {self.user}'
+
+    def is_fresh(self, today):
+        return self.computed_version == self.version and self.computed_for == today
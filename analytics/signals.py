@@ -0,0 +1,42 @@
+"""
+Mantém o snapshot financeiro (analytics/snapshot.py) em dia.
+
+Qualquer escrita que altera os números do snapshot o marca como
+desatualizado; o recálculo roda uma vez, na próxima leitura.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Account
+from cards.models import LancamentoCartao
+from categories.models import Category
+from transactions.models import Transaction
+
+from .snapshot import mark_stale
+
+
+def _account_user_id(instance):
+    """Dono da conta da transação, sem consulta quando a conta já foi carregada"""
+    if Transaction._meta.get_field('account').is_cached(instance):
+        return instance.account.user_id
+    return Account.objects.filter(pk=instance.account_id).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def transaction_changed(sender, instance, **kwargs):
+    mark_stale(_account_user_id(instance))
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def user_data_changed(sender, instance, **kwargs):
+    mark_stale(instance.user_id)
+
+
+@receiver(post_save, sender=LancamentoCartao)
+@receiver(post_delete, sender=LancamentoCartao)
+def card_entry_changed(sender, instance, **kwargs):
+    mark_stale(instance.usuario_id)
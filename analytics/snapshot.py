@@ -0,0 +1,158 @@
+"""
+Snapshot financeiro por usuário, compartilhado entre chatbot e insights.
+
+O cálculo completo (4 consultas) só roda quando os dados mudaram: os
+signals em analytics/signals.py apenas marcam o snapshot como desatualizado
+(um UPDATE na linha do usuário, desfeito junto se a transação for revertida)
+e a próxima leitura o recalcula, uma única vez, mesmo que a transação tenha
+gravado centenas de linhas (ex.: importação de extrato). Lê-lo atualizado
+custa uma consulta simples pela chave do usuário.
+
+Exemplo:
+    data = get_financial_snapshot(request.user)
+    data['mes_atual']['gastos']
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from accounts.models import Account
+from cards.models import LancamentoCartao
+from transactions.models import Transaction
+
+from .models import FinancialSnapshot
+
+
+def get_financial_snapshot(user):
+    """Retorna o snapshot do usuário, recalculando apenas se estiver desatualizado"""
+    today = timezone.now().date()
+    snapshot = FinancialSnapshot.objects.filter(user_id=user.pk).first()
+    if snapshot is not None and snapshot.is_fresh(today):
+        return snapshot.data
+    return refresh_financial_snapshot(user.pk, today)
+
+
+def refresh_financial_snapshot(user_id, today=None):
+    """Recalcula e grava o snapshot; retorna os dados"""
+    today = today or timezone.now().date()
+    # A versão é lida antes do cálculo: uma escrita concorrente a incrementa
+    # e o snapshot gravado aqui já nasce desatualizado
+    version = FinancialSnapshot.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+    data = build_financial_snapshot(user_id, today)
+
+    defaults = {'data': data, 'computed_version': version, 'computed_for': today}
+    try:
+        with db_transaction.atomic():
+            FinancialSnapshot.objects.update_or_create(user_id=user_id, defaults=defaults)
+    except IntegrityError:
+        # Outra requisição criou o snapshot ao mesmo tempo
+        FinancialSnapshot.objects.filter(user_id=user_id).update(**defaults)
+    return data
+
+
+def mark_stale(user_id):
+    """
+    Marca o snapshot como desatualizado; o recálculo fica para a próxima leitura.
+
+    Usuários que nunca leram o snapshot não têm linha e nada é gravado.
+    """
+    if user_id is None:
+        return
+    FinancialSnapshot.objects.filter(user_id=user_id).update(version=F('version') + 1)
+
+
+def build_financial_snapshot(user_id, today):
+    """Calcula os dados do snapshot (mês atual, mês anterior, contas, categorias, cartões)"""
+    current_month_start = today.replace(day=1)
+    last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
+
+    expense = Q(transaction_type=Transaction.TransactionType.EXPENSE)
+    income = Q(transaction_type=Transaction.TransactionType.INCOME)
+    current_month = Q(transaction_date__gte=current_month_start)
+
+    # Mês atual e anterior numa única agregação
+    totals = Transaction.objects.filter(
+        account__user_id=user_id,
+        transaction_date__gte=last_month_start,
+        transaction_date__lte=today
+    ).aggregate(
+        gastos=Sum('amount', filter=expense & current_month),
+        quantidade_gastos=Count('id', filter=expense & current_month),
+        receitas=Sum('amount', filter=income & current_month),
+        quantidade_receitas=Count('id', filter=income & current_month),
+        gastos_mes_anterior=Sum('amount', filter=expense & ~current_month),
+    )
+    month_expenses = totals['gastos'] or Decimal('0')
+    month_income = totals['receitas'] or Decimal('0')
+    last_month_expenses = totals['gastos_mes_anterior'] or Decimal('0')
+
+    variation = 0
+    if last_month_expenses > 0:
+        variation = float((month_expenses - last_month_expenses) / last_month_expenses * 100)
+
+    # Contas ativas
+    accounts = list(Account.objects.filter(user_id=user_id, is_active=True))
+    total_balance = sum((account.balance for account in accounts), Decimal('0'))
+
+    # Top 5 categorias de gastos
+    top_categories = Transaction.objects.filter(
+        expense,
+        account__user_id=user_id,
+        transaction_date__gte=current_month_start,
+        transaction_date__lte=today
+    ).values(
+        'category__name'
+    ).annotate(
+        total=Sum('amount'),
+        count=Count('id')
+    ).order_by('-total')[:5]
+
+    categories = [
+        {
+            'nome': category['category__name'],
+            'total': float(category['total']),
+            'quantidade_transacoes': category['count'],
+            'porcentagem': round(float(category['total'] / month_expenses * 100), 1) if month_expenses > 0 else 0
+        }
+        for category in top_categories
+    ]
+
+    # Gasto em cartão de crédito no mês (ledger unificado: cards + accounts)
+    card_expenses = LancamentoCartao.total_gasto(user_id, current_month_start, today)
+
+    return {
+        'data_atual': today.strftime('%d/%m/%Y'),
+        'mes_atual': {
+            'gastos': float(month_expenses),
+            'quantidade_gastos': totals['quantidade_gastos'],
+            'receitas': float(month_income),
+            'quantidade_receitas': totals['quantidade_receitas'],
+            'balanco': float(month_income - month_expenses),
+        },
+        'mes_anterior': {
+            'gastos': float(last_month_expenses),
+        },
+        'comparacao': {
+            'variacao_percentual': round(variation, 1),
+            'aumentou': variation > 0
+        },
+        'contas': {
+            'saldo_total': float(total_balance),
+            'quantidade': len(accounts),
+            'detalhes': [
+                {
+                    'nome': account.name,
+                    'tipo': account.get_account_type_display(),
+                    'saldo': float(account.balance)
+                }
+                for account in accounts
+            ]
+        },
+        'categorias_top_5': categories,
+        'cartoes_credito': {
+            'gastos_mes': float(card_expenses),
+        },
+    }
@@ -1 +1,87 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction as db_transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import Account
+from transactions.models import Transaction
+
+from .models import FinancialSnapshot
+from .snapshot import get_financial_snapshot
+
+
+class FinancialSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='snapshot@teste.com', password='x')
+        self.account = Account.objects.create(user=self.user, name='Conta', bank_name='Banco')
+        self.category = self.user.categories.filter(category_type='EXPENSE').first()
+
+    def _gasto(self, valor):
+        return Transaction.objects.create(
+            account=self.account,
+            category=self.category,
+            transaction_type='EXPENSE',
+            amount=valor,
+            transaction_date=timezone.now().date(),
+            description='Mercado'
+        )
+
+    def _snapshot(self):
+        return FinancialSnapshot.objects.get(user=self.user)
+
+    def test_leitura_sem_mudancas_nao_recalcula(self):
+        get_financial_snapshot(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            get_financial_snapshot(self.user)
+        self.assertEqual(len(queries), 1)
+
+    def test_escrita_marca_e_a_leitura_seguinte_recalcula(self):
+        get_financial_snapshot(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self._gasto(Decimal('40.00'))
+        self.assertFalse(self._snapshot().is_fresh(timezone.now().date()))
+        self.assertFalse([q for q in queries if 'SELECT' in q['sql'] and 'SUM(' in q['sql']])
+
+        self.assertEqual(get_financial_snapshot(self.user)['mes_atual']['gastos'], 40.0)
+        self.assertTrue(self._snapshot().is_fresh(timezone.now().date()))
+
+    def test_escrita_revertida_nao_invalida(self):
+        get_financial_snapshot(self.user)
+
+        with self.assertRaises(RuntimeError):
+            with db_transaction.atomic():
+                self._gasto(Decimal('40.00'))
+                raise RuntimeError
+
+        self.assertTrue(self._snapshot().is_fresh(timezone.now().date()))
+
+    def test_muitas_escritas_recalculam_uma_vez(self):
+        with CaptureQueriesContext(connection) as calculo:
+            get_financial_snapshot(self.user)
+        with db_transaction.atomic():
+            for _ in range(10):
+                self._gasto(Decimal('5.00'))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_financial_snapshot(self.user)['mes_atual']['gastos'], 50.0)
+            get_financial_snapshot(self.user)
+        somas = [q for q in calculo if 'SUM(' in q['sql']]
+        self.assertEqual(len([q for q in queries if 'SUM(' in q['sql']]), len(somas))
+
+    def test_virada_do_dia_recalcula(self):
+        get_financial_snapshot(self.user)
+        FinancialSnapshot.objects.filter(user=self.user).update(computed_for=date.today() - timedelta(days=1))
+
+        get_financial_snapshot(self.user)
+        self.assertTrue(self._snapshot().is_fresh(timezone.now().date()))
+
+    def test_usuario_sem_snapshot_nao_ganha_linha_ao_escrever(self):
+        self._gasto(Decimal('40.00'))
+
+        self.assertFalse(FinancialSnapshot.objects.filter(user=self.user).exists())
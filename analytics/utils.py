@@ -7,6 +7,8 @@ from django.utils import timezone
 from transactions.models import Transaction
 from categories.models import Category
 
+from .snapshot import get_financial_snapshot
+
 
 class FinancialAnalytics:
     
@@ -393,23 +395,10 @@ class FinancialAnalytics:
         return months_data
     
     def get_current_vs_last_month(self):
-        """Compara mês atual com mês anterior"""
-        current_month_start = self.today.replace(day=1)
-        last_month_start = (current_month_start - relativedelta(months=1))
-        last_month_end = current_month_start - timedelta(days=1)
-        
-        current_expenses = Transaction.objects.filter(
-            account__user=self.user,
-            transaction_type=Transaction.TransactionType.EXPENSE,
-            transaction_date__gte=current_month_start
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        last_expenses = Transaction.objects.filter(
-            account__user=self.user,
-            transaction_type=Transaction.TransactionType.EXPENSE,
-            transaction_date__gte=last_month_start,
-            transaction_date__lte=last_month_end
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        """Compara mês atual com mês anterior (via snapshot compartilhado com o chatbot)"""
+        snapshot = get_financial_snapshot(self.user)
+        current_expenses = Decimal(str(snapshot['mes_atual']['gastos']))
+        last_expenses = Decimal(str(snapshot['mes_anterior']['gastos']))
         
         if last_expenses > 0:
             change_percentage = ((current_expenses - last_expenses) / last_expenses) * 100
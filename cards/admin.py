@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cartao, Fatura, TransacaoCartao
+from .models import Cartao, Fatura, FaturaCategoria, LancamentoCartao, TransacaoCartao
 
 
 @admin.register(Cartao)
@@ -26,8 +26,16 @@ class CartaoAdmin(admin.ModelAdmin):
     )
 
 
+class FaturaCategoriaInline(admin.TabularInline):
+    model = FaturaCategoria
+    extra = 0
+    can_delete = False
+    readonly_fields = ['categoria', 'total', 'quantidade']
+
+
 @admin.register(Fatura)
 class FaturaAdmin(admin.ModelAdmin):
+    inlines = [FaturaCategoriaInline]
     list_display = ['cartao', 'mes', 'ano', 'valor_total', 'valor_pago', 
                     'status', 'data_vencimento']
     list_filter = ['status', 'mes', 'ano', 'cartao__banco']
@@ -42,7 +50,7 @@ class FaturaAdmin(admin.ModelAdmin):
             'fields': ('mes', 'ano')
         }),
         ('Valores', {
-            'fields': ('valor_total', 'valor_pago')
+            'fields': ('valor_total', 'valor_pago', 'quantidade_transacoes')
         }),
         ('Datas', {
             'fields': ('data_fechamento', 'data_vencimento', 'data_pagamento')
@@ -72,4 +80,18 @@ class TransacaoCartaoAdmin(admin.ModelAdmin):
         ('Metadados', {
             'fields': ('criado_em',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(LancamentoCartao)
+class LancamentoCartaoAdmin(admin.ModelAdmin):
+    list_display = ['descricao', 'usuario', 'origem', 'categoria', 'valor', 'data']
+    list_filter = ['origem', 'categoria', 'data']
+    search_fields = ['descricao', 'usuario__email']
+    date_hierarchy = 'data'
+
+    # Mantido por signals: somente leitura no admin
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
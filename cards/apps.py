@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class CardsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cards'  # ← TEM QUE SER 'cards'
-    verbose_name = 'Cartões de Crédito'
\ No newline at end of file
+    verbose_name = 'Cartões de Crédito'
+
+    def ready(self):
+        # Mantém o ledger unificado (LancamentoCartao) em sincronia
+        from . import signals  # noqa: F401
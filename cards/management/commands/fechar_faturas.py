@@ -0,0 +1,210 @@
+# cards/management/commands/fechar_faturas.py
+import calendar
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from cards.models import Cartao, Fatura
+from notifications.models import Notification
+
+
+def _data_no_mes(ano, mes, dia):
+    """Monta a data limitando o dia ao último dia do mês (ex.: dia 31 em fevereiro)"""
+    return date(ano, mes, min(dia, calendar.monthrange(ano, mes)[1]))
+
+
+def _ciclo_atual(hoje, dia_fechamento):
+    """Retorna (mes, ano) da fatura que recebe compras feitas hoje"""
+    if hoje.day > dia_fechamento:
+        if hoje.month == 12:
+            return 1, hoje.year + 1
+        return hoje.month + 1, hoje.year
+    return hoje.month, hoje.year
+
+
+class Command(BaseCommand):
+    help = (
+        'Fecha faturas vencidas, marca faturas em atraso e pré-cria as faturas '
+        'do ciclo atual. Idempotente: pode rodar diariamente via cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Quantidade de faturas/cartões processados por lote (padrão: 1000)'
+        )
+        parser.add_argument(
+            '--data',
+            type=str,
+            default=None,
+            help='Data de referência no formato AAAA-MM-DD (padrão: hoje)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        hoje = (
+            datetime.strptime(options['data'], '%Y-%m-%d').date()
+            if options['data'] else timezone.localdate()
+        )
+
+        self.stdout.write(f'Processando faturas com data de referência {hoje:%d/%m/%Y}...')
+
+        fechadas = self.fechar_faturas(hoje, batch_size)
+        self.stdout.write(f'  ✓ {fechadas} fatura(s) fechada(s)')
+
+        atrasadas = self.marcar_atrasadas(hoje, batch_size)
+        self.stdout.write(f'  ✓ {atrasadas} fatura(s) em atraso')
+
+        criadas = self.criar_proximas_faturas(hoje, batch_size)
+        self.stdout.write(f'  ✓ {criadas} fatura(s) do próximo ciclo criada(s)')
+
+        self.stdout.write(self.style.SUCCESS('✅ Fechamento de faturas concluído!'))
+
+    def fechar_faturas(self, hoje, batch_size):
+        """aberta -> fechada para faturas cuja data de fechamento já passou"""
+        return self._transicionar(
+            Fatura.objects.filter(status='aberta', data_fechamento__lt=hoje),
+            novo_status='fechada',
+            batch_size=batch_size,
+            notificacao=lambda f: Notification.build_invoice_closed(
+                user_id=f['cartao__usuario_id'],
+                card_name=f['cartao__nome'],
+                month=f['mes'],
+                year=f['ano'],
+                amount=f['valor_total'],
+            ),
+        )
+
+    def marcar_atrasadas(self, hoje, batch_size):
+        """fechada -> atrasada para faturas vencidas e não quitadas"""
+        return self._transicionar(
+            Fatura.objects.filter(
+                status='fechada',
+                data_vencimento__lt=hoje,
+                valor_pago__lt=F('valor_total'),
+            ),
+            novo_status='atrasada',
+            batch_size=batch_size,
+            notificacao=lambda f: Notification.build_invoice_overdue(
+                user_id=f['cartao__usuario_id'],
+                card_name=f['cartao__nome'],
+                month=f['mes'],
+                year=f['ano'],
+                pending=f['valor_total'] - f['valor_pago'],
+            ),
+        )
+
+    def _transicionar(self, queryset, novo_status, batch_size, notificacao):
+        """
+        Aplica a transição em lotes: um SELECT ... FOR UPDATE SKIP LOCKED,
+        um UPDATE e um bulk_create de notificações por lote. Linhas já
+        transicionadas deixam de casar com o queryset, então o laço termina
+        e execuções repetidas (ou concorrentes) não duplicam notificações.
+
+        Faturas zeradas e de cartões inativos mudam de status, mas não
+        geram notificação.
+        """
+        total = 0
+
+        while True:
+            with transaction.atomic():
+                lote = list(
+                    queryset.select_for_update(skip_locked=True, of=('self',))
+                    .order_by('pk')
+                    .values(
+                        'id', 'mes', 'ano', 'valor_total', 'valor_pago',
+                        'cartao__usuario_id', 'cartao__nome', 'cartao__ativo',
+                    )[:batch_size]
+                )
+                if not lote:
+                    break
+
+                Fatura.objects.filter(id__in=[f['id'] for f in lote]).update(
+                    status=novo_status,
+                    atualizado_em=timezone.now(),
+                )
+                Notification.objects.bulk_create(
+                    [notificacao(f) for f in lote if f['valor_total'] and f['cartao__ativo']],
+                    batch_size=batch_size,
+                )
+            total += len(lote)
+
+        return total
+
+    def criar_proximas_faturas(self, hoje, batch_size):
+        """Garante que todo cartão ativo tenha a fatura aberta do ciclo atual"""
+        total = 0
+        ultimo_id = 0
+
+        while True:
+            cartoes = list(
+                Cartao.objects.filter(ativo=True, pk__gt=ultimo_id)
+                .order_by('pk')
+                .values('id', 'dia_fechamento', 'dia_vencimento')[:batch_size]
+            )
+            if not cartoes:
+                break
+            ultimo_id = cartoes[-1]['id']
+
+            ciclos = {c['id']: _ciclo_atual(hoje, c['dia_fechamento']) for c in cartoes}
+            existentes = set(
+                Fatura.objects.filter(
+                    cartao_id__in=ciclos.keys(),
+                    mes__in={mes for mes, _ in ciclos.values()},
+                    ano__in={ano for _, ano in ciclos.values()},
+                ).values_list('cartao_id', 'mes', 'ano')
+            )
+
+            novas = []
+            for cartao in cartoes:
+                mes, ano = ciclos[cartao['id']]
+                if (cartao['id'], mes, ano) in existentes:
+                    continue
+
+                mes_venc, ano_venc = (1, ano + 1) if mes == 12 else (mes + 1, ano)
+                novas.append(Fatura(
+                    cartao_id=cartao['id'],
+                    mes=mes,
+                    ano=ano,
+                    data_fechamento=_data_no_mes(ano, mes, cartao['dia_fechamento']),
+                    data_vencimento=_data_no_mes(ano_venc, mes_venc, cartao['dia_vencimento']),
+                    status='aberta',
+                ))
+
+            total += self._criar_faturas(novas, batch_size)
+
+        return total
+
+    def _criar_faturas(self, novas, batch_size):
+        """
+        Grava as faturas e retorna quantas foram de fato criadas.
+
+        Um obter_ou_criar_fatura concorrente pode criar a mesma fatura
+        (unique cartao/mes/ano) entre a leitura e o INSERT: nesse caso o
+        lote é refeito linha a linha e só as criadas aqui são contadas.
+        """
+        if not novas:
+            return 0
+        try:
+            with transaction.atomic():
+                Fatura.objects.bulk_create(novas, batch_size=batch_size)
+            return len(novas)
+        except IntegrityError:
+            return sum(
+                Fatura.objects.get_or_create(
+                    cartao_id=fatura.cartao_id,
+                    mes=fatura.mes,
+                    ano=fatura.ano,
+                    defaults={
+                        'data_fechamento': fatura.data_fechamento,
+                        'data_vencimento': fatura.data_vencimento,
+                        'status': fatura.status,
+                    },
+                )[1]
+                for fatura in novas
+            )
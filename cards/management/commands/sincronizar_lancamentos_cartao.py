@@ -0,0 +1,80 @@
+# cards/management/commands/sincronizar_lancamentos_cartao.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cards.models import LancamentoCartao, TransacaoCartao
+from cards.signals import (
+    dados_lancamento_transacao_cartao,
+    dados_lancamento_transaction,
+)
+from transactions.models import Transaction
+
+CAMPOS_ATUALIZAVEIS = ['usuario', 'cartao', 'credit_card', 'descricao', 'categoria', 'valor', 'data']
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstrói o ledger unificado de cartões (LancamentoCartao) a partir de '
+        'cards.TransacaoCartao e das transações vinculadas a accounts.CreditCard. '
+        'Idempotente; use após importações em massa ou para consolidar dados antigos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Quantidade de registros processados por lote (padrão: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        self.stdout.write('Sincronizando transações de cartão (cards)...')
+        total = self.sincronizar(
+            TransacaoCartao.objects.select_related('cartao'),
+            LancamentoCartao.Origem.CARTAO,
+            dados_lancamento_transacao_cartao,
+            batch_size,
+        )
+        self.stdout.write(f'  ✓ {total} lançamento(s)')
+
+        self.stdout.write('Sincronizando transações com cartão de crédito (accounts)...')
+        total = self.sincronizar(
+            Transaction.objects.filter(
+                credit_card__isnull=False,
+                transaction_type=Transaction.TransactionType.EXPENSE,
+            ).select_related('account', 'category'),
+            LancamentoCartao.Origem.CREDIT_CARD,
+            dados_lancamento_transaction,
+            batch_size,
+        )
+        self.stdout.write(f'  ✓ {total} lançamento(s)')
+
+        self.stdout.write(self.style.SUCCESS('✅ Ledger de cartões sincronizado!'))
+
+    def sincronizar(self, queryset, origem, dados, batch_size):
+        """Upsert em lotes pela chave (origem, origem_id) e remove órfãos"""
+        total = 0
+        ultimo_id = 0
+
+        while True:
+            lote = list(queryset.filter(pk__gt=ultimo_id).order_by('pk')[:batch_size])
+            if not lote:
+                break
+            ultimo_id = lote[-1].pk
+
+            LancamentoCartao.objects.bulk_create(
+                [LancamentoCartao(origem=origem, origem_id=obj.pk, **dados(obj)) for obj in lote],
+                update_conflicts=True,
+                unique_fields=['origem', 'origem_id'],
+                update_fields=CAMPOS_ATUALIZAVEIS,
+            )
+            total += len(lote)
+
+        with transaction.atomic():
+            LancamentoCartao.objects.filter(origem=origem).exclude(
+                origem_id__in=queryset.values('pk')
+            ).delete()
+
+        return total
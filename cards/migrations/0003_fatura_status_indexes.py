@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0002_alter_cartao_conta_delete_conta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['status', 'data_fechamento'], name='cards_fatur_status_413dca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['status', 'data_vencimento'], name='cards_fatur_status_a23321_idx'),
+        ),
+    ]
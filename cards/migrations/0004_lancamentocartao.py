@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_budget_creditcard'),
+        ('cards', '0003_fatura_status_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LancamentoCartao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origem', models.CharField(choices=[('cartao', 'Cartões (cards)'), ('credit_card', 'Cartão de Crédito (accounts)')], max_length=20)),
+                ('origem_id', models.BigIntegerField(help_text='ID do registro de origem')),
+                ('descricao', models.CharField(blank=True, max_length=200)),
+                ('categoria', models.CharField(help_text='Nome da categoria para agregação', max_length=100)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('data', models.DateField()),
+                ('cartao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos', to='cards.cartao')),
+                ('credit_card', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos', to='accounts.creditcard')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos_cartao', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lançamento de Cartão',
+                'verbose_name_plural': 'Lançamentos de Cartão',
+                'ordering': ['-data'],
+                'indexes': [models.Index(fields=['usuario', 'data'], name='cards_lanca_usuario_8a6ab7_idx'), models.Index(fields=['usuario', 'categoria', 'data'], name='cards_lanca_usuario_f77ddb_idx')],
+                'constraints': [models.UniqueConstraint(fields=('origem', 'origem_id'), name='lancamento_cartao_origem_unico')],
+            },
+        ),
+    ]
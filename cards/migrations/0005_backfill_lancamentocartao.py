@@ -0,0 +1,61 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def popular_lancamentos(apps, schema_editor):
+    '''Consolida os dados existentes das duas origens no ledger unificado'''
+    LancamentoCartao = apps.get_model('cards', 'LancamentoCartao')
+    TransacaoCartao = apps.get_model('cards', 'TransacaoCartao')
+    Transaction = apps.get_model('transactions', 'Transaction')
+
+    categorias = dict(TransacaoCartao._meta.get_field('categoria').choices)
+
+    lote = []
+    for t in TransacaoCartao.objects.select_related('cartao').iterator(chunk_size=BATCH_SIZE):
+        lote.append(LancamentoCartao(
+            origem='cartao',
+            origem_id=t.pk,
+            usuario_id=t.cartao.usuario_id,
+            cartao_id=t.cartao_id,
+            descricao=t.descricao[:200],
+            categoria=categorias.get(t.categoria, t.categoria),
+            valor=t.valor,
+            data=t.data,
+        ))
+        if len(lote) >= BATCH_SIZE:
+            LancamentoCartao.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+
+    transacoes = Transaction.objects.filter(
+        credit_card__isnull=False,
+        transaction_type='EXPENSE',
+    ).select_related('account', 'category')
+    for t in transacoes.iterator(chunk_size=BATCH_SIZE):
+        lote.append(LancamentoCartao(
+            origem='credit_card',
+            origem_id=t.pk,
+            usuario_id=t.account.user_id,
+            credit_card_id=t.credit_card_id,
+            descricao=(t.description or '')[:200],
+            categoria=t.category.name,
+            valor=t.amount,
+            data=t.transaction_date,
+        ))
+        if len(lote) >= BATCH_SIZE:
+            LancamentoCartao.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+
+    LancamentoCartao.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0004_lancamentocartao'),
+        ('transactions', '0002_transaction_credit_card'),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_lancamentos, migrations.RunPython.noop),
+    ]
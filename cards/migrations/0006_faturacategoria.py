@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def popular_resumos(apps, schema_editor):
+    '''Calcula quantidade_transacoes e o resumo por categoria das faturas existentes'''
+    from django.db.models import Count, Sum
+
+    Fatura = apps.get_model('cards', 'Fatura')
+    FaturaCategoria = apps.get_model('cards', 'FaturaCategoria')
+    TransacaoCartao = apps.get_model('cards', 'TransacaoCartao')
+
+    resumos = (
+        TransacaoCartao.objects.values('fatura_id', 'categoria')
+        .annotate(total=Sum('valor'), quantidade=Count('id'))
+        .order_by('fatura_id')
+    )
+
+    lote = []
+    quantidades = {}
+    for resumo in resumos.iterator(chunk_size=1000):
+        lote.append(FaturaCategoria(**resumo))
+        quantidades[resumo['fatura_id']] = quantidades.get(resumo['fatura_id'], 0) + resumo['quantidade']
+        if len(lote) >= 1000:
+            FaturaCategoria.objects.bulk_create(lote)
+            lote = []
+    FaturaCategoria.objects.bulk_create(lote)
+
+    for fatura_id, quantidade in quantidades.items():
+        Fatura.objects.filter(pk=fatura_id).update(quantidade_transacoes=quantidade)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0005_backfill_lancamentocartao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatura',
+            name='quantidade_transacoes',
+            field=models.IntegerField(default=0, help_text='Mantido por signals junto com valor_total'),
+        ),
+        migrations.CreateModel(
+            name='FaturaCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(choices=[('alimentacao', 'Alimentação'), ('transporte', 'Transporte'), ('moradia', 'Moradia'), ('saude', 'Saúde'), ('educacao', 'Educação'), ('lazer', 'Lazer'), ('compras', 'Compras'), ('outros', 'Outros')], max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('fatura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='categorias', to='cards.fatura')),
+            ],
+            options={
+                'verbose_name': 'Resumo de Fatura por Categoria',
+                'verbose_name_plural': 'Resumos de Fatura por Categoria',
+                'ordering': ['-total'],
+                'unique_together': {('fatura', 'categoria')},
+            },
+        ),
+        migrations.RunPython(popular_resumos, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 from accounts.models import Account  # ← IMPORTA O Account QUE JÁ EXISTE
 
@@ -76,6 +78,52 @@ class Cartao(models.Model):
             return (self.limite_usado / self.limite_total) * 100
         return 0
     
+    def reservar_limite(self, valor):
+        """
+        Reserva limite do cartão com um único UPDATE condicional.
+
+        Equivale a ``UPDATE ... SET limite_disponivel = limite_disponivel - valor
+        WHERE id = ... AND limite_disponivel >= valor``, então compras
+        simultâneas no mesmo cartão nunca perdem atualização nem deixam o
+        limite negativo. A instância em memória não é recarregada.
+
+        Returns:
+            bool: True se havia limite e a reserva foi aplicada
+        """
+        atualizados = Cartao.objects.filter(
+            pk=self.pk,
+            limite_disponivel__gte=valor
+        ).update(
+            limite_disponivel=F('limite_disponivel') - valor,
+            atualizado_em=timezone.now()
+        )
+        return atualizados == 1
+
+    def liberar_limite(self, valor):
+        """
+        Devolve limite ao cartão (estorno, exclusão ou pagamento de fatura).
+
+        Usa F() para somar no banco, sem ler e regravar a linha inteira.
+        """
+        Cartao.objects.filter(pk=self.pk).update(
+            limite_disponivel=F('limite_disponivel') + valor,
+            atualizado_em=timezone.now()
+        )
+
+    def ajustar_limite_total(self, novo_limite):
+        """
+        Altera o limite total mantendo o valor já usado.
+
+        O limite disponível é deslocado pela diferença calculada no próprio
+        UPDATE (novo_limite - limite_total), evitando sobrescrever reservas
+        feitas por outras requisições entre a leitura e a gravação.
+        """
+        Cartao.objects.filter(pk=self.pk).update(
+            limite_disponivel=F('limite_disponivel') + novo_limite - F('limite_total'),
+            limite_total=novo_limite,
+            atualizado_em=timezone.now()
+        )
+
     @property
     def fatura_atual(self):
         """Retorna a fatura do mês atual"""
@@ -136,6 +184,7 @@ class Fatura(models.Model):
     # Valores
     valor_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     valor_pago = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    quantidade_transacoes = models.IntegerField(default=0, help_text="Mantido por signals junto com valor_total")
     
     # Datas
     data_fechamento = models.DateField()
@@ -153,6 +202,10 @@ class Fatura(models.Model):
         verbose_name_plural = 'Faturas'
         ordering = ['-ano', '-mes']
         unique_together = ['cartao', 'mes', 'ano']
+        indexes = [
+            models.Index(fields=['status', 'data_fechamento']),
+            models.Index(fields=['status', 'data_vencimento']),
+        ]
     
     def __str__(self):
         return f"Fatura {self.mes}/{self.ano} - {self.cartao.nome}"
@@ -168,10 +221,51 @@ class Fatura(models.Model):
         return self.valor_pago >= self.valor_total
     
     def atualizar_total(self):
-        """Recalcula o total da fatura baseado nas transações"""
-        total = sum(t.valor for t in self.transacoes.all())
-        self.valor_total = total
-        self.save()
+        """
+        Recalcula do zero valor_total, quantidade_transacoes e o resumo por
+        categoria a partir das transações.
+
+        No fluxo normal esses valores são mantidos incrementalmente pelos
+        signals (ver registrar_movimento); use este método só para reparo.
+        """
+        from django.db.models import Count, Sum
+
+        por_categoria = list(
+            self.transacoes.values('categoria').annotate(total=Sum('valor'), quantidade=Count('id'))
+        )
+
+        self.valor_total = sum((c['total'] for c in por_categoria), Decimal('0'))
+        self.quantidade_transacoes = sum(c['quantidade'] for c in por_categoria)
+        self.save(update_fields=['valor_total', 'quantidade_transacoes', 'atualizado_em'])
+
+        self.categorias.exclude(categoria__in=[c['categoria'] for c in por_categoria]).delete()
+        FaturaCategoria.objects.bulk_create(
+            [FaturaCategoria(fatura=self, **c) for c in por_categoria],
+            update_conflicts=True,
+            unique_fields=['fatura', 'categoria'],
+            update_fields=['total', 'quantidade'],
+        )
+
+    @staticmethod
+    def registrar_movimento(fatura_id, categoria, valor, quantidade=1):
+        """
+        Aplica um lançamento (ou estorno, com valores negativos) na fatura.
+
+        Atualiza valor_total, quantidade_transacoes e o resumo da categoria
+        com UPDATEs usando F(), sem reler as transações da fatura.
+        """
+        Fatura.objects.filter(pk=fatura_id).update(
+            valor_total=F('valor_total') + valor,
+            quantidade_transacoes=F('quantidade_transacoes') + quantidade,
+            atualizado_em=timezone.now()
+        )
+
+        resumo = FaturaCategoria.objects.filter(fatura_id=fatura_id, categoria=categoria)
+        atualizados = resumo.update(total=F('total') + valor, quantidade=F('quantidade') + quantidade)
+        # Estornos nunca criam linha: em exclusões em cascata o resumo já pode ter sido removido
+        if not atualizados and quantidade > 0:
+            FaturaCategoria.objects.get_or_create(fatura_id=fatura_id, categoria=categoria)
+            resumo.update(total=F('total') + valor, quantidade=F('quantidade') + quantidade)
 
 
 class TransacaoCartao(models.Model):
@@ -216,4 +310,96 @@ class TransacaoCartao(models.Model):
     @property
     def valor_total_parcelado(self):
         """Retorna o valor total se for parcelado"""
-        return self.valor * self.parcelas
\ No newline at end of file
+        return self.valor * self.parcelas
+
+class FaturaCategoria(models.Model):
+    """
+    Resumo pré-calculado de uma fatura por categoria.
+
+    Mantido incrementalmente (Fatura.registrar_movimento) pelos signals de
+    TransacaoCartao, para que fatura_detail e o endpoint de analytics não
+    precisem agrupar transações em Python a cada requisição.
+    """
+    fatura = models.ForeignKey(Fatura, on_delete=models.CASCADE, related_name='categorias')
+    categoria = models.CharField(max_length=50, choices=TransacaoCartao.CATEGORIAS)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Resumo de Fatura por Categoria'
+        verbose_name_plural = 'Resumos de Fatura por Categoria'
+        ordering = ['-total']
+        unique_together = ['fatura', 'categoria']
+
+    def __str__(self):
+        return f"{self.fatura} - {self.get_categoria_display()}: R$ {self.total}"
+
+
+class LancamentoCartao(models.Model):
+    """
+    Ledger unificado de gastos em cartão de crédito.
+
+    Existem dois caminhos de dados para cartão: ``cards.TransacaoCartao``
+    (com Fatura própria) e ``transactions.Transaction`` vinculada a um
+    ``accounts.CreditCard``. Esta tabela espelha os dois com colunas comuns,
+    mantida por signals em cards/signals.py, para que dashboards, analytics,
+    orçamentos e chatbot somem gasto em cartão com uma única consulta indexada.
+
+    Nunca escreva aqui diretamente: use os models de origem. Para reconstruir
+    a tabela rode ``python manage.py sincronizar_lancamentos_cartao``.
+    """
+
+    class Origem(models.TextChoices):
+        CARTAO = 'cartao', 'Cartões (cards)'
+        CREDIT_CARD = 'credit_card', 'Cartão de Crédito (accounts)'
+
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lancamentos_cartao')
+    origem = models.CharField(max_length=20, choices=Origem.choices)
+    origem_id = models.BigIntegerField(help_text="ID do registro de origem")
+
+    # Apenas um dos dois é preenchido, conforme a origem
+    cartao = models.ForeignKey(Cartao, on_delete=models.CASCADE, null=True, blank=True, related_name='lancamentos')
+    credit_card = models.ForeignKey(
+        'accounts.CreditCard', on_delete=models.CASCADE, null=True, blank=True, related_name='lancamentos'
+    )
+
+    descricao = models.CharField(max_length=200, blank=True)
+    categoria = models.CharField(max_length=100, help_text="Nome da categoria para agregação")
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    data = models.DateField()
+
+    class Meta:
+        verbose_name = 'Lançamento de Cartão'
+        verbose_name_plural = 'Lançamentos de Cartão'
+        ordering = ['-data']
+        constraints = [
+            models.UniqueConstraint(fields=['origem', 'origem_id'], name='lancamento_cartao_origem_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'data']),
+            models.Index(fields=['usuario', 'categoria', 'data']),
+        ]
+
+    def __str__(self):
+        return f"{self.descricao} - R$ {self.valor} ({self.data})"
+
+    @classmethod
+    def gastos_por_categoria(cls, usuario, data_inicio, data_fim):
+        """Total de gasto em cartão por categoria no período (uma consulta)"""
+        from django.db.models import Sum
+
+        return (
+            cls.objects.filter(usuario=usuario, data__gte=data_inicio, data__lte=data_fim)
+            .values('categoria')
+            .annotate(total=Sum('valor'))
+            .order_by('-total')
+        )
+
+    @classmethod
+    def total_gasto(cls, usuario, data_inicio, data_fim):
+        """Total de gasto em cartão no período, somando as duas origens"""
+        from django.db.models import Sum
+
+        return cls.objects.filter(
+            usuario=usuario, data__gte=data_inicio, data__lte=data_fim
+        ).aggregate(total=Sum('valor'))['total'] or Decimal('0')
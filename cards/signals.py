@@ -0,0 +1,147 @@
+'''
+Signal handlers que mantêm dados derivados dos cartões:
+
+- os totais pré-calculados da fatura (valor_total, quantidade_transacoes e
+  FaturaCategoria), atualizados incrementalmente a cada TransacaoCartao;
+- o ledger unificado de cartões (LancamentoCartao).
+
+Ledger:
+
+Cada TransacaoCartao e cada Transaction de despesa vinculada a um
+accounts.CreditCard tem exatamente um LancamentoCartao espelho, identificado
+por (origem, origem_id). Criar/editar a origem faz upsert do espelho;
+excluir a origem (ou desvincular o cartão) remove o espelho. Renomear uma
+categories.Category reescreve o nome guardado nos espelhos das suas
+Transactions.
+
+Operações em massa que não disparam signals (bulk_create, update) devem
+chamar ``python manage.py sincronizar_lancamentos_cartao`` depois.
+'''
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from categories.models import Category
+from transactions.models import Transaction
+
+from .models import Fatura, LancamentoCartao, TransacaoCartao
+
+
+def dados_lancamento_transacao_cartao(transacao):
+    '''Colunas do ledger para uma cards.TransacaoCartao'''
+    return {
+        'usuario_id': transacao.cartao.usuario_id,
+        'cartao_id': transacao.cartao_id,
+        'credit_card_id': None,
+        'descricao': transacao.descricao[:200],
+        'categoria': transacao.get_categoria_display(),
+        'valor': transacao.valor,
+        'data': transacao.data,
+    }
+
+
+def dados_lancamento_transaction(transaction):
+    '''Colunas do ledger para uma transactions.Transaction com credit_card'''
+    return {
+        'usuario_id': transaction.account.user_id,
+        'cartao_id': None,
+        'credit_card_id': transaction.credit_card_id,
+        'descricao': (transaction.description or '')[:200],
+        'categoria': transaction.category.name,
+        'valor': transaction.amount,
+        'data': transaction.transaction_date,
+    }
+
+
+def transaction_e_gasto_cartao(transaction):
+    '''Só despesas pagas com accounts.CreditCard entram no ledger'''
+    return (
+        transaction.credit_card_id is not None
+        and transaction.transaction_type == Transaction.TransactionType.EXPENSE
+    )
+
+
+@receiver(pre_save, sender=TransacaoCartao)
+def guardar_estado_anterior_transacao_cartao(sender, instance, **kwargs):
+    '''Guarda (fatura, categoria, valor) anteriores para estornar na edição'''
+    instance._estado_anterior = None
+    if instance.pk:
+        instance._estado_anterior = (
+            TransacaoCartao.objects.filter(pk=instance.pk)
+            .values_list('fatura_id', 'categoria', 'valor')
+            .first()
+        )
+
+
+@receiver(post_save, sender=TransacaoCartao)
+def atualizar_totais_fatura_on_save(sender, instance, created, **kwargs):
+    novo = (instance.fatura_id, instance.categoria, instance.valor)
+    anterior = getattr(instance, '_estado_anterior', None)
+
+    if created or anterior is None:
+        Fatura.registrar_movimento(*novo)
+    elif anterior != novo:
+        fatura_id, categoria, valor = anterior
+        Fatura.registrar_movimento(fatura_id, categoria, -valor, quantidade=-1)
+        Fatura.registrar_movimento(*novo)
+
+
+@receiver(post_delete, sender=TransacaoCartao)
+def atualizar_totais_fatura_on_delete(sender, instance, **kwargs):
+    Fatura.registrar_movimento(instance.fatura_id, instance.categoria, -instance.valor, quantidade=-1)
+
+
+@receiver(post_save, sender=TransacaoCartao)
+def sincronizar_lancamento_transacao_cartao(sender, instance, **kwargs):
+    LancamentoCartao.objects.update_or_create(
+        origem=LancamentoCartao.Origem.CARTAO,
+        origem_id=instance.pk,
+        defaults=dados_lancamento_transacao_cartao(instance),
+    )
+
+
+@receiver(post_delete, sender=TransacaoCartao)
+def remover_lancamento_transacao_cartao(sender, instance, **kwargs):
+    LancamentoCartao.objects.filter(
+        origem=LancamentoCartao.Origem.CARTAO,
+        origem_id=instance.pk,
+    ).delete()
+
+
+@receiver(post_save, sender=Transaction)
+def sincronizar_lancamento_transaction(sender, instance, created, **kwargs):
+    if transaction_e_gasto_cartao(instance):
+        LancamentoCartao.objects.update_or_create(
+            origem=LancamentoCartao.Origem.CREDIT_CARD,
+            origem_id=instance.pk,
+            defaults=dados_lancamento_transaction(instance),
+        )
+    elif not created:
+        # Cartão desvinculado ou tipo alterado para receita
+        remover_lancamento_transaction(sender, instance)
+
+
+@receiver(post_delete, sender=Transaction)
+def remover_lancamento_transaction(sender, instance, **kwargs):
+    LancamentoCartao.objects.filter(
+        origem=LancamentoCartao.Origem.CREDIT_CARD,
+        origem_id=instance.pk,
+    ).delete()
+
+
+@receiver(pre_save, sender=Category)
+def guardar_nome_anterior_categoria(sender, instance, **kwargs):
+    '''Guarda o nome anterior para atualizar o ledger só quando ele muda'''
+    instance._nome_anterior = None
+    if instance.pk:
+        instance._nome_anterior = Category.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+def renomear_categoria_lancamentos(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_nome_anterior', None)
+    if created or anterior is None or anterior == instance.name:
+        return
+    LancamentoCartao.objects.filter(
+        origem=LancamentoCartao.Origem.CREDIT_CARD,
+        origem_id__in=Transaction.objects.filter(category=instance).values('pk'),
+    ).update(categoria=instance.name)
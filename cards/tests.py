@@ -0,0 +1,387 @@
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from accounts.models import Account, CreditCard
+from notifications.models import Notification
+from transactions.models import Transaction
+
+from .models import Cartao, Fatura, FaturaCategoria, LancamentoCartao, TransacaoCartao
+
+
+class LimiteConcorrenteTests(TransactionTestCase):
+    """reservar_limite/liberar_limite com muitas threads no mesmo cartão"""
+
+    THREADS = 16
+    OPERACOES = 25
+    VALOR = Decimal('10.00')
+    LIMITE = Decimal('1000.00')
+
+    def setUp(self):
+        usuario = get_user_model().objects.create_user(email='cartao@teste.com', password='x')
+        self.cartao = Cartao.objects.create(
+            usuario=usuario,
+            nome='Teste',
+            ultimos_digitos='1234',
+            limite_total=self.LIMITE,
+            limite_disponivel=self.LIMITE,
+            dia_fechamento=5,
+            dia_vencimento=15
+        )
+
+    def _com_repeticao(self, operacao):
+        # SQLite serializa as escritas e pode recusar com "locked"; a
+        # operação em si é um único UPDATE, então repetir não muda o resultado
+        while True:
+            try:
+                return operacao()
+            except OperationalError:
+                time.sleep(0.001)
+
+    def _disparar(self, trabalho):
+        erros = []
+
+        def executar():
+            try:
+                trabalho()
+            except Exception as e:  # pragma: no cover - reportado no assert abaixo
+                erros.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=executar) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(erros, [])
+
+    def test_reservas_simultaneas_nunca_deixam_limite_negativo(self):
+        aceitas = []
+        lock = threading.Lock()
+
+        def trabalho():
+            cartao = Cartao.objects.get(pk=self.cartao.pk)
+            for _ in range(self.OPERACOES):
+                if self._com_repeticao(lambda: cartao.reservar_limite(self.VALOR)):
+                    with lock:
+                        aceitas.append(self.VALOR)
+
+        self._disparar(trabalho)
+
+        self.cartao.refresh_from_db()
+        # 16 x 25 x R$ 10 = R$ 4.000 pedidos para R$ 1.000 de limite
+        self.assertEqual(self.cartao.limite_disponivel, Decimal('0.00'))
+        self.assertEqual(sum(aceitas), self.LIMITE)
+        self.assertEqual(self.cartao.limite_usado, sum(aceitas))
+
+    def test_reservas_e_liberacoes_mantem_total_consistente(self):
+        reservado = []
+        lock = threading.Lock()
+
+        def trabalho():
+            cartao = Cartao.objects.get(pk=self.cartao.pk)
+            for indice in range(self.OPERACOES):
+                if self._com_repeticao(lambda: cartao.reservar_limite(self.VALOR)):
+                    with lock:
+                        reservado.append(self.VALOR)
+                    if indice % 2:
+                        self._com_repeticao(lambda: cartao.liberar_limite(self.VALOR))
+                        with lock:
+                            reservado.append(-self.VALOR)
+                disponivel = Cartao.objects.values_list('limite_disponivel', flat=True).get(pk=cartao.pk)
+                with lock:
+                    minimos.append(disponivel)
+
+        minimos = []
+        self._disparar(trabalho)
+
+        self.cartao.refresh_from_db()
+        self.assertGreaterEqual(min(minimos), Decimal('0.00'))
+        self.assertGreaterEqual(self.cartao.limite_disponivel, Decimal('0.00'))
+        self.assertEqual(self.cartao.limite_usado, sum(reservado))
+
+
+class FecharFaturasTests(TestCase):
+    """Comando fechar_faturas: transições, notificações e idempotência"""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(email='faturas@teste.com', password='x')
+        self.cartao = self._cartao('Principal')
+
+    def _cartao(self, nome, ativo=True):
+        return Cartao.objects.create(
+            usuario=self.usuario,
+            nome=nome,
+            ultimos_digitos='1234',
+            limite_total=Decimal('1000.00'),
+            limite_disponivel=Decimal('1000.00'),
+            dia_fechamento=5,
+            dia_vencimento=15,
+            ativo=ativo
+        )
+
+    def _fatura(self, cartao, mes, valor_total, status='aberta', valor_pago=Decimal('0.00')):
+        return Fatura.objects.create(
+            cartao=cartao,
+            mes=mes,
+            ano=2024,
+            data_fechamento=date(2024, mes, 5),
+            data_vencimento=date(2024, mes + 1, 15),
+            valor_total=valor_total,
+            valor_pago=valor_pago,
+            status=status
+        )
+
+    def _executar(self, data):
+        call_command('fechar_faturas', '--data', data, '--batch-size', '1', stdout=StringIO())
+
+    def test_fecha_e_marca_atrasadas_com_uma_notificacao_cada(self):
+        fechar = self._fatura(self.cartao, 3, Decimal('150.00'))
+        atrasar = self._fatura(self.cartao, 2, Decimal('200.00'), status='fechada', valor_pago=Decimal('50.00'))
+        quitada = self._fatura(self.cartao, 1, Decimal('80.00'), status='fechada', valor_pago=Decimal('80.00'))
+
+        self._executar('2024-03-20')
+        self._executar('2024-03-20')
+
+        fechar.refresh_from_db()
+        atrasar.refresh_from_db()
+        quitada.refresh_from_db()
+        self.assertEqual(fechar.status, 'fechada')
+        self.assertEqual(atrasar.status, 'atrasada')
+        self.assertEqual(quitada.status, 'fechada')
+        self.assertEqual(Notification.objects.filter(user=self.usuario).count(), 2)
+
+    def test_faturas_zeradas_e_de_cartao_inativo_nao_notificam(self):
+        inativo = self._cartao('Antigo', ativo=False)
+        zerada = self._fatura(self.cartao, 3, Decimal('0.00'))
+        do_inativo = self._fatura(inativo, 3, Decimal('90.00'))
+
+        self._executar('2024-03-20')
+
+        zerada.refresh_from_db()
+        do_inativo.refresh_from_db()
+        self.assertEqual(zerada.status, 'fechada')
+        self.assertEqual(do_inativo.status, 'fechada')
+        self.assertFalse(Notification.objects.filter(user=self.usuario).exists())
+
+    def test_cria_fatura_do_ciclo_para_cada_cartao_ativo(self):
+        outros = [self._cartao(f'Cartão {indice}') for indice in range(3)]
+        inativo = self._cartao('Antigo', ativo=False)
+
+        self._executar('2024-03-20')
+        self._executar('2024-03-20')
+
+        for cartao in [self.cartao, *outros]:
+            fatura = Fatura.objects.get(cartao=cartao)
+            self.assertEqual((fatura.mes, fatura.ano, fatura.status), (4, 2024, 'aberta'))
+            self.assertEqual(fatura.data_fechamento, date(2024, 4, 5))
+            self.assertEqual(fatura.data_vencimento, date(2024, 5, 15))
+        self.assertFalse(Fatura.objects.filter(cartao=inativo).exists())
+
+
+class LancamentoCartaoTests(TestCase):
+    """Ledger unificado espelhando TransacaoCartao e Transaction com CreditCard"""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(email='ledger@teste.com', password='x')
+        self.cartao = Cartao.objects.create(
+            usuario=self.usuario,
+            nome='Cards',
+            ultimos_digitos='1234',
+            limite_total=Decimal('1000.00'),
+            limite_disponivel=Decimal('1000.00'),
+            dia_fechamento=5,
+            dia_vencimento=15
+        )
+        self.fatura = Fatura.objects.create(
+            cartao=self.cartao,
+            mes=3,
+            ano=2024,
+            data_fechamento=date(2024, 3, 5),
+            data_vencimento=date(2024, 4, 15)
+        )
+        self.conta = Account.objects.create(user=self.usuario, name='Conta', bank_name='Banco')
+        self.credit_card = CreditCard.objects.create(
+            account=self.conta,
+            name='Accounts',
+            card_number='5678',
+            credit_limit=Decimal('2000.00'),
+            closing_day=5,
+            due_day=15
+        )
+        self.categoria = self.usuario.categories.filter(category_type='EXPENSE').first()
+
+    def _transacao_cartao(self, valor):
+        return TransacaoCartao.objects.create(
+            cartao=self.cartao,
+            fatura=self.fatura,
+            descricao='Mercado',
+            categoria='alimentacao',
+            valor=valor,
+            data=date(2024, 3, 1)
+        )
+
+    def _transaction(self, valor):
+        return Transaction.objects.create(
+            account=self.conta,
+            credit_card=self.credit_card,
+            category=self.categoria,
+            transaction_type='EXPENSE',
+            amount=valor,
+            transaction_date=date(2024, 3, 2),
+            description='Farmácia'
+        )
+
+    def test_total_soma_as_duas_origens(self):
+        self._transacao_cartao(Decimal('100.00'))
+        self._transaction(Decimal('40.00'))
+
+        total = LancamentoCartao.total_gasto(self.usuario, date(2024, 3, 1), date(2024, 3, 31))
+        self.assertEqual(total, Decimal('140.00'))
+
+    def test_edicao_e_exclusao_atualizam_o_espelho(self):
+        transacao = self._transacao_cartao(Decimal('100.00'))
+        transacao.valor = Decimal('75.00')
+        transacao.save()
+
+        self.assertEqual(LancamentoCartao.objects.get().valor, Decimal('75.00'))
+        transacao.delete()
+        self.assertFalse(LancamentoCartao.objects.exists())
+
+    def test_desvincular_cartao_remove_o_espelho(self):
+        transaction = self._transaction(Decimal('40.00'))
+        transaction.credit_card = None
+        transaction.save()
+
+        self.assertFalse(LancamentoCartao.objects.exists())
+
+    def test_renomear_categoria_atualiza_o_espelho(self):
+        self._transaction(Decimal('40.00'))
+        self.categoria.name = 'Saúde e bem-estar'
+        self.categoria.save()
+
+        self.assertEqual(LancamentoCartao.objects.get().categoria, 'Saúde e bem-estar')
+
+    def test_sincronizar_reconstroi_e_e_idempotente(self):
+        transacao = self._transacao_cartao(Decimal('100.00'))
+        self._transaction(Decimal('40.00'))
+        LancamentoCartao.objects.filter(origem=LancamentoCartao.Origem.CARTAO).delete()
+        LancamentoCartao.objects.create(
+            usuario=self.usuario,
+            origem=LancamentoCartao.Origem.CARTAO,
+            origem_id=transacao.pk + 1000,
+            categoria='Órfão',
+            valor=Decimal('1.00'),
+            data=date(2024, 3, 1)
+        )
+
+        for _ in range(2):
+            call_command('sincronizar_lancamentos_cartao', '--batch-size', '1', stdout=StringIO())
+
+        self.assertEqual(
+            set(LancamentoCartao.objects.values_list('origem', 'origem_id', 'valor')),
+            {
+                (LancamentoCartao.Origem.CARTAO, transacao.pk, Decimal('100.00')),
+                (LancamentoCartao.Origem.CREDIT_CARD, Transaction.objects.get().pk, Decimal('40.00')),
+            }
+        )
+
+
+class TotaisFaturaTests(TestCase):
+    """Totais pré-calculados da fatura e endpoint de analytics"""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(email='totais@teste.com', password='x')
+        self.cartao = Cartao.objects.create(
+            usuario=self.usuario,
+            nome='Totais',
+            ultimos_digitos='1234',
+            limite_total=Decimal('1000.00'),
+            limite_disponivel=Decimal('1000.00'),
+            dia_fechamento=5,
+            dia_vencimento=15
+        )
+        self.fevereiro = self._fatura(2)
+        self.marco = self._fatura(3)
+
+    def _fatura(self, mes):
+        return Fatura.objects.create(
+            cartao=self.cartao,
+            mes=mes,
+            ano=2024,
+            data_fechamento=date(2024, mes, 5),
+            data_vencimento=date(2024, mes + 1, 15)
+        )
+
+    def _transacao(self, fatura, categoria, valor):
+        return TransacaoCartao.objects.create(
+            cartao=self.cartao,
+            fatura=fatura,
+            descricao=categoria,
+            categoria=categoria,
+            valor=valor,
+            data=date(2024, fatura.mes, 1)
+        )
+
+    def _resumo(self, fatura):
+        fatura.refresh_from_db()
+        return (
+            fatura.valor_total,
+            fatura.quantidade_transacoes,
+            {c.categoria: (c.total, c.quantidade) for c in fatura.categorias.filter(quantidade__gt=0)},
+        )
+
+    def test_totais_incrementais_batem_com_recalculo(self):
+        self._transacao(self.marco, 'alimentacao', Decimal('50.00'))
+        mover = self._transacao(self.marco, 'alimentacao', Decimal('30.00'))
+        remover = self._transacao(self.marco, 'lazer', Decimal('20.00'))
+
+        mover.categoria = 'transporte'
+        mover.valor = Decimal('35.00')
+        mover.save()
+        remover.delete()
+
+        incremental = self._resumo(self.marco)
+        self.assertEqual(incremental, (
+            Decimal('85.00'), 2,
+            {'alimentacao': (Decimal('50.00'), 1), 'transporte': (Decimal('35.00'), 1)},
+        ))
+        FaturaCategoria.objects.filter(fatura=self.marco).delete()
+        self.marco.atualizar_total()
+        self.assertEqual(self._resumo(self.marco), incremental)
+
+    def test_mudar_de_fatura_estorna_a_anterior(self):
+        transacao = self._transacao(self.fevereiro, 'lazer', Decimal('40.00'))
+        transacao.fatura = self.marco
+        transacao.save()
+
+        self.assertEqual(self._resumo(self.fevereiro), (Decimal('0.00'), 0, {}))
+        self.assertEqual(self._resumo(self.marco), (Decimal('40.00'), 1, {'lazer': (Decimal('40.00'), 1)}))
+
+    def test_analytics_em_ordem_cronologica_com_variacao(self):
+        self._transacao(self.fevereiro, 'lazer', Decimal('100.00'))
+        self._transacao(self.marco, 'alimentacao', Decimal('150.00'))
+        self.client.force_login(self.usuario)
+
+        response = self.client.get(reverse('cards:cartao_analytics', args=[self.cartao.id]))
+
+        faturas = response.json()['faturas']
+        self.assertEqual([(f['mes'], f['valor_total']) for f in faturas], [(2, 100.0), (3, 150.0)])
+        self.assertEqual([f['variacao_percentual'] for f in faturas], [None, 50.0])
+        self.assertEqual(faturas[1]['categorias'][0]['nome'], 'Alimentação')
+
+    def test_analytics_de_outro_usuario_e_404(self):
+        outro = get_user_model().objects.create_user(email='outro@teste.com', password='x')
+        self.client.force_login(outro)
+
+        response = self.client.get(reverse('cards:cartao_analytics', args=[self.cartao.id]))
+        self.assertEqual(response.status_code, 404)
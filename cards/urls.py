@@ -10,6 +10,7 @@ urlpatterns = [
     path('<int:cartao_id>/', views.cartao_detail, name='cartao_detail'),
     path('<int:cartao_id>/editar/', views.cartao_edit, name='cartao_edit'),
     path('<int:cartao_id>/deletar/', views.cartao_delete, name='cartao_delete'),
+    path('<int:cartao_id>/analytics/', views.cartao_analytics, name='cartao_analytics'),
     
     # Transações
     path('<int:cartao_id>/transacao/nova/', views.transacao_create, name='transacao_create'),
@@ -1,6 +1,8 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
+from django.db import transaction as db_transaction
 from django.db.models import Sum, Q
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -116,18 +118,22 @@ def cartao_detail(request, cartao_id):
     """Mostra detalhes de um cartão específico"""
     cartao = get_object_or_404(Cartao, id=cartao_id, usuario=request.user)
     
-    # Busca faturas do cartão (últimos 6 meses)
-    faturas = cartao.faturas.all()[:6]
+    # Busca faturas do cartão (últimos 6 meses) com os totais pré-calculados
+    faturas = list(cartao.faturas.all()[:6])
     
-    # Fatura atual
-    fatura_atual = cartao.fatura_atual
+    # Fatura atual (reaproveita a lista quando possível)
+    hoje = date.today()
+    fatura_atual = next(
+        (f for f in faturas if f.mes == hoje.month and f.ano == hoje.year),
+        None
+    ) or cartao.fatura_atual
     transacoes_recentes = []
     if fatura_atual:
         transacoes_recentes = fatura_atual.transacoes.all()[:10]
     
     # Estatísticas
     stats = {
-        'total_transacoes': cartao.transacoes.count(),
+        'total_transacoes': cartao.faturas.aggregate(total=Sum('quantidade_transacoes'))['total'] or 0,
         'valor_fatura_atual': fatura_atual.valor_total if fatura_atual else 0,
         'proxima_fatura': calcular_proxima_data_fechamento(cartao),
         'proximo_vencimento': calcular_proxima_data_vencimento(cartao),
@@ -158,9 +164,6 @@ def cartao_edit(request, cartao_id):
             cartao.ultimos_digitos = request.POST.get('ultimos_digitos')
             
             novo_limite = Decimal(request.POST.get('limite_total', 0))
-            diferenca = novo_limite - cartao.limite_total
-            cartao.limite_total = novo_limite
-            cartao.limite_disponivel += diferenca
             
             cartao.dia_fechamento = int(request.POST.get('dia_fechamento'))
             cartao.dia_vencimento = int(request.POST.get('dia_vencimento'))
@@ -168,7 +171,13 @@ def cartao_edit(request, cartao_id):
             conta_id = request.POST.get('conta')
             cartao.conta_id = conta_id if conta_id else None
             
-            cartao.save()
+            # Limites ficam fora do save() para não sobrescrever reservas concorrentes
+            with db_transaction.atomic():
+                cartao.save(update_fields=[
+                    'nome', 'banco', 'bandeira', 'ultimos_digitos',
+                    'dia_fechamento', 'dia_vencimento', 'conta', 'atualizado_em'
+                ])
+                cartao.ajustar_limite_total(novo_limite)
             
             messages.success(request, 'Cartão atualizado com sucesso!')
             return redirect('cards:cartao_detail', cartao_id=cartao.id)
@@ -194,7 +203,7 @@ def cartao_delete(request, cartao_id):
     
     if request.method == 'POST':
         cartao.ativo = False
-        cartao.save()
+        cartao.save(update_fields=['ativo', 'atualizado_em'])
         messages.success(request, f'Cartão {cartao.nome} removido com sucesso!')
         return redirect('cards:cartoes_list') 
     
@@ -217,36 +226,34 @@ def transacao_create(request, cartao_id):
             
             data = datetime.strptime(data_str, '%Y-%m-%d').date()
             
-            # Verifica se tem limite disponível
-            valor_total = valor * parcelas if parcelas > 1 else valor
-            if cartao.limite_disponivel < valor:
-                messages.error(request, 'Limite insuficiente!')
+            if valor <= 0:
+                messages.error(request, 'Informe um valor válido!')
                 return redirect('cards:cartao_detail', cartao_id=cartao.id)
             
-            # Determina a fatura
-            fatura = obter_ou_criar_fatura(cartao, data)
-            
-            # Cria a transação
-            if parcelas > 1:
-                # Cria transações parceladas
-                criar_transacoes_parceladas(cartao, descricao, categoria, valor, data, parcelas)
-            else:
-                # Transação única
-                TransacaoCartao.objects.create(
-                    cartao=cartao,
-                    fatura=fatura,
-                    descricao=descricao,
-                    categoria=categoria,
-                    valor=valor,
-                    data=data
-                )
-            
-            # Atualiza limite disponível
-            cartao.limite_disponivel -= valor
-            cartao.save()
-            
-            # Atualiza total da fatura
-            fatura.atualizar_total()
+            with db_transaction.atomic():
+                # Reserva o limite atomicamente (UPDATE ... WHERE limite_disponivel >= valor)
+                if not cartao.reservar_limite(valor):
+                    messages.error(request, 'Limite insuficiente!')
+                    return redirect('cards:cartao_detail', cartao_id=cartao.id)
+                
+                # Determina a fatura
+                fatura = obter_ou_criar_fatura(cartao, data)
+                
+                # Cria a transação
+                if parcelas > 1:
+                    # Cria transações parceladas
+                    criar_transacoes_parceladas(cartao, descricao, categoria, valor, data, parcelas)
+                else:
+                    # Transação única
+                    TransacaoCartao.objects.create(
+                        cartao=cartao,
+                        fatura=fatura,
+                        descricao=descricao,
+                        categoria=categoria,
+                        valor=valor,
+                        data=data
+                    )
+                # Total e resumo da fatura são atualizados pelos signals (cards/signals.py)
             
             messages.success(request, 'Transação adicionada com sucesso!')
             return redirect('cards:cartao_detail', cartao_id=cartao.id)
@@ -267,17 +274,14 @@ def fatura_detail(request, fatura_id):
     fatura = get_object_or_404(Fatura, id=fatura_id, cartao__usuario=request.user)
     transacoes = fatura.transacoes.all()
     
-    # Agrupa transações por categoria e calcula totais
-    por_categoria = {}
-    for transacao in transacoes:
-        categoria = transacao.get_categoria_display()
-        if categoria not in por_categoria:
-            por_categoria[categoria] = {
-                'transacoes': [],
-                'total': 0
-            }
-        por_categoria[categoria]['transacoes'].append(transacao)
-        por_categoria[categoria]['total'] += transacao.valor
+    # Resumo por categoria pré-calculado (FaturaCategoria)
+    por_categoria = {
+        resumo.get_categoria_display(): {
+            'total': resumo.total,
+            'quantidade': resumo.quantidade,
+        }
+        for resumo in fatura.categorias.filter(quantidade__gt=0)
+    }
     
     context = {
         'fatura': fatura,
@@ -288,6 +292,51 @@ def fatura_detail(request, fatura_id):
     return render(request, 'cartoes/fatura_detail.html', context)
 
 
+@login_required
+def cartao_analytics(request, cartao_id):
+    """
+    Tendência mês a mês do cartão em JSON: total, variação e categorias
+    de cada fatura, servidos a partir dos totais pré-calculados.
+    """
+    cartao = get_object_or_404(Cartao, id=cartao_id, usuario=request.user)
+    
+    try:
+        meses = min(max(int(request.GET.get('meses', 12)), 1), 36)
+    except ValueError:
+        meses = 12
+    
+    faturas = list(cartao.faturas.prefetch_related('categorias')[:meses])
+    faturas.reverse()  # Ordem cronológica
+    
+    data = []
+    anterior = None
+    for fatura in faturas:
+        variacao = None
+        if anterior is not None and anterior.valor_total > 0:
+            variacao = round(float((fatura.valor_total - anterior.valor_total) / anterior.valor_total * 100), 1)
+        
+        data.append({
+            'mes': fatura.mes,
+            'ano': fatura.ano,
+            'status': fatura.status,
+            'valor_total': float(fatura.valor_total),
+            'quantidade_transacoes': fatura.quantidade_transacoes,
+            'variacao_percentual': variacao,
+            'categorias': [
+                {
+                    'categoria': resumo.categoria,
+                    'nome': resumo.get_categoria_display(),
+                    'total': float(resumo.total),
+                    'quantidade': resumo.quantidade,
+                }
+                for resumo in fatura.categorias.all() if resumo.quantidade > 0
+            ],
+        })
+        anterior = fatura
+    
+    return JsonResponse({'cartao': cartao.id, 'faturas': data})
+
+
 @login_required
 def fatura_pagar(request, fatura_id):
     """Registra pagamento de uma fatura"""
@@ -302,18 +351,24 @@ def fatura_pagar(request, fatura_id):
                 messages.error(request, 'Informe um valor válido!')
                 return redirect('fatura_detail', fatura_id=fatura.id)
             
-            # Registra o pagamento
-            fatura.valor_pago += valor_pago
-            fatura.data_pagamento = datetime.strptime(data_pagamento_str, '%Y-%m-%d').date()
+            data_pagamento = datetime.strptime(data_pagamento_str, '%Y-%m-%d').date()
             
-            # Atualiza status
-            if fatura.esta_paga:
-                fatura.status = 'paga'
-                # Devolve limite ao cartão
-                fatura.cartao.limite_disponivel += fatura.valor_total
-                fatura.cartao.save()
-            
-            fatura.save()
+            with db_transaction.atomic():
+                # Relê com lock: valor_total e quantidade_transacoes são
+                # atualizados por F() em registrar_movimento enquanto isso
+                fatura = Fatura.objects.select_for_update().get(pk=fatura.pk)
+                
+                # Registra o pagamento
+                fatura.valor_pago += valor_pago
+                fatura.data_pagamento = data_pagamento
+                
+                # Atualiza status (o limite só volta uma vez, na quitação)
+                if fatura.esta_paga and fatura.status != 'paga':
+                    fatura.status = 'paga'
+                    # Devolve limite ao cartão
+                    fatura.cartao.liberar_limite(fatura.valor_total)
+                
+                fatura.save(update_fields=['valor_pago', 'data_pagamento', 'status', 'atualizado_em'])
             
             messages.success(request, 'Pagamento registrado com sucesso!')
             return redirect('fatura_detail', fatura_id=fatura.id)
@@ -414,9 +469,6 @@ def criar_transacoes_parceladas(cartao, descricao, categoria, valor, data_inicia
             parcelas=parcelas,
             parcela_atual=i + 1
         )
-        
-        # Atualiza o total da fatura
-        fatura.atualizar_total()
 
 
 def calcular_proxima_data_fechamento(cartao):
@@ -482,19 +534,22 @@ def transacao_edit(request, transacao_id):
         valor_antigo = transacao.valor
         diferenca = novo_valor - valor_antigo
         
-        # Atualiza a transação
-        transacao.descricao = descricao
-        transacao.categoria = categoria
-        transacao.valor = novo_valor
-        transacao.data = data
-        transacao.save()
-        
-        # Atualiza o total da fatura
-        fatura.atualizar_total()
-        
-        # Atualiza o limite disponível do cartão
-        cartao.limite_disponivel -= diferenca
-        cartao.save()
+        with db_transaction.atomic():
+            # Atualiza o limite disponível do cartão
+            if diferenca > 0:
+                if not cartao.reservar_limite(diferenca):
+                    messages.error(request, 'Limite insuficiente!')
+                    return redirect('cards:fatura_detail', fatura_id=fatura.id)
+            elif diferenca < 0:
+                cartao.liberar_limite(-diferenca)
+            
+            # Atualiza a transação
+            transacao.descricao = descricao
+            transacao.categoria = categoria
+            transacao.valor = novo_valor
+            transacao.data = data
+            # Signals estornam o valor antigo e aplicam o novo no total da fatura
+            transacao.save()
         
         messages.success(request, 'Transação atualizada com sucesso!')
         return redirect('cards:fatura_detail', fatura_id=fatura.id)
@@ -517,15 +572,12 @@ def transacao_delete(request, transacao_id):
     fatura_id = fatura.id
     
     if request.method == 'POST':
-        # Devolve o limite pro cartão
-        cartao.limite_disponivel += transacao.valor
-        cartao.save()
-        
-        # Deleta a transação
-        transacao.delete()
-        
-        # Recalcula o total da fatura
-        fatura.atualizar_total()
+        with db_transaction.atomic():
+            # Devolve o limite pro cartão
+            cartao.liberar_limite(transacao.valor)
+            
+            # Deleta a transação (signals estornam o total da fatura)
+            transacao.delete()
         
         messages.success(request, 'Transação excluída com sucesso!')
         return redirect('cards:fatura_detail', fatura_id=fatura_id)
@@ -0,0 +1,140 @@
+'''
+Keyword-based transaction categorizer.
+
+All keyword groups and the user's own category names are compiled into a
+single alternation regex per transaction type, so categorizing a
+description is one linear scan instead of nested loops over keywords and
+categories. Compiled categorizers are kept per process and rebuilt when the
+user's categories change (detected by a cheap count/max(updated_at) query),
+which also keeps every gunicorn worker consistent.
+
+Used by the OFX import; manual entry and the chatbot can share it:
+
+    categorizer = Categorizer.for_user(request.user)
+    category_id = categorizer.categorize('UBER *TRIP', 'EXPENSE')
+'''
+import re
+from collections import OrderedDict
+
+from django.db.models import Count, Max
+
+from transactions.fingerprints import normalize_description
+
+from .models import Category
+
+# Keyword groups in priority order; a group maps to the first user category
+# whose (accent-insensitive) name contains the group name.
+EXPENSE_KEYWORDS = {
+    'ALIMENTACAO': ['MERCADO', 'SUPERMERCADO', 'PADARIA', 'RESTAURANTE', 'LANCHONETE', 'IFOOD', 'UBER EATS', 'RAPPI'],
+    'TRANSPORTE': ['POSTO', 'COMBUSTIVEL', 'UBER', '99', 'METRO', 'ONIBUS', 'ESTACIONAMENTO', 'PEDAGIO'],
+    'SAUDE': ['FARMACIA', 'DROGARIA', 'HOSPITAL', 'CLINICA', 'MEDICO', 'LABORATORIO', 'CONSULTA'],
+    'MORADIA': ['ALUGUEL', 'CONDOMINIO', 'IPTU', 'LUZ', 'AGUA', 'GAS', 'ENERGIA', 'INTERNET'],
+    'EDUCACAO': ['ESCOLA', 'FACULDADE', 'CURSO', 'LIVRO', 'MATERIAL ESCOLAR', 'UNIVERSIDADE'],
+    'LAZER': ['CINEMA', 'TEATRO', 'NETFLIX', 'SPOTIFY', 'AMAZON', 'STREAMING', 'INGRESSO'],
+    'VESTUARIO': ['ROUPA', 'CALCADO', 'LOJA', 'MAGAZINE', 'SHOPPING', 'ZARA', 'C&A'],
+}
+
+INCOME_KEYWORDS = {
+    'SALARIO': ['SALARIO', 'PAGAMENTO', 'FOLHA', 'VENCIMENTO', 'REMUNERACAO'],
+    'FREELANCE': ['FREELANCE', 'FREELA', 'AUTONOMO', 'SERVICO', 'PRESTACAO'],
+    'INVESTIMENTO': ['DIVIDENDO', 'RENDIMENTO', 'JUROS', 'RESGATE', 'APLICACAO'],
+}
+
+MAX_CACHED_USERS = 1024
+
+_compiled = OrderedDict()
+
+
+class _TypeMatcher:
+    '''Compiled regex plus keyword -> (priority, category_id) for one type.'''
+
+    def __init__(self, keyword_groups, categories):
+        self.targets = {}
+
+        for priority, (group, keywords) in enumerate(keyword_groups.items()):
+            category_id = next(
+                (pk for pk, name in categories if group in name),
+                None
+            )
+            if category_id is None:
+                continue
+            for keyword in keywords:
+                self.targets.setdefault(keyword, (priority, category_id))
+
+        # Category names mentioned in the description rank after every group
+        name_priority = len(keyword_groups)
+        for pk, name in categories:
+            if name:
+                self.targets.setdefault(name, (name_priority, pk))
+
+        # Longest first so 'UBER EATS' wins over 'UBER' at the same position
+        alternatives = sorted(self.targets, key=len, reverse=True)
+        self.regex = re.compile('|'.join(map(re.escape, alternatives))) if alternatives else None
+
+    def match(self, text):
+        if self.regex is None:
+            return None
+
+        best = None
+        for found in self.regex.finditer(text):
+            target = self.targets[found.group()]
+            if best is None or target[0] < best[0]:
+                best = target
+                if best[0] == 0:
+                    break
+        return best[1] if best else None
+
+
+class Categorizer:
+    '''
+    Suggests a category id for a description, per user.
+
+    Use Categorizer.for_user() to get the cached instance.
+    '''
+
+    def __init__(self, categories):
+        '''
+        Args:
+            categories: iterable of (id, name, category_type)
+        '''
+        by_type = {Category.CategoryType.INCOME: [], Category.CategoryType.EXPENSE: []}
+        for pk, name, category_type in categories:
+            by_type.setdefault(category_type, []).append((pk, normalize_description(name)))
+
+        self.matchers = {
+            Category.CategoryType.INCOME: _TypeMatcher(INCOME_KEYWORDS, by_type[Category.CategoryType.INCOME]),
+            Category.CategoryType.EXPENSE: _TypeMatcher(EXPENSE_KEYWORDS, by_type[Category.CategoryType.EXPENSE]),
+        }
+
+    @classmethod
+    def for_user(cls, user):
+        '''Return the compiled categorizer for the user, rebuilding it if stale.'''
+        categories = Category.objects.filter(user=user)
+        stamp = tuple(categories.aggregate(count=Count('id'), changed=Max('updated_at')).values())
+
+        cached = _compiled.get(user.pk)
+        if cached and cached[0] == stamp:
+            _compiled.move_to_end(user.pk)
+            return cached[1]
+
+        categorizer = cls(categories.values_list('id', 'name', 'category_type'))
+        _compiled[user.pk] = (stamp, categorizer)
+        _compiled.move_to_end(user.pk)
+        if len(_compiled) > MAX_CACHED_USERS:
+            _compiled.popitem(last=False)
+        return categorizer
+
+    def categorize(self, description, transaction_type):
+        '''
+        Return the best matching category id, or None when nothing matches.
+
+        Args:
+            description: Free text (payee, memo, user input)
+            transaction_type: 'INCOME' or 'EXPENSE'
+        '''
+        if not description:
+            return None
+        matcher = self.matchers.get(transaction_type)
+        if matcher is None:
+            return None
+        return matcher.match(normalize_description(description))
@@ -0,0 +1,149 @@
+'''
+Per-user learned categorization (multinomial naive Bayes).
+
+Each user's model is trained from the transactions they already
+categorized and kept up to date by signals on every save/delete (see
+categories/signals.py). The state is a small JSON document stored in
+CategoryClassifier:
+
+    {
+        "v": {token: occurrences},                   # vocabulary
+        "c": {"<category_id>": {"t": "EXPENSE",       # category type
+                                "d": documents,
+                                "w": tokens,
+                                "k": {token: occurrences}}}
+    }
+
+Prediction is O(categories x tokens) over in-memory dicts, a few
+microseconds per description, with no external service.
+
+CategorySuggester combines it with the keyword Categorizer:
+
+    suggester = CategorySuggester(request.user)
+    category_id = suggester.suggest('PADARIA REAL', 'EXPENSE', Decimal('12.50'))
+'''
+import math
+import re
+
+from transactions.fingerprints import normalize_description
+
+from .categorizer import Categorizer
+
+# Below this posterior the keyword rules are used instead
+MIN_CONFIDENCE = 0.6
+
+_WORD_RE = re.compile(r'[A-Z]{3,}')
+
+
+def tokenize(description, amount=None):
+    '''
+    Distinct words (3+ letters, accent-insensitive) plus an amount bucket.
+
+    The bucket is the power of two of the amount, so R$ 45 and R$ 60 share
+    '$5' while R$ 1.200 falls into '$10'.
+    '''
+    tokens = set(_WORD_RE.findall(normalize_description(description)))
+    if amount and math.isfinite(amount):
+        tokens.add(f'${int(math.log2(max(float(amount), 1)))}')
+    return tokens
+
+
+class NaiveBayesClassifier:
+    '''Learn/forget/predict over the JSON state described in the module docstring.'''
+
+    def __init__(self, data=None):
+        self.data = data or {'v': {}, 'c': {}}
+
+    def learn(self, tokens, category_id, category_type, weight=1):
+        '''
+        Add (weight=1) or remove (weight=-1) one categorized description.
+        '''
+        if not tokens:
+            return
+
+        vocabulary = self.data['v']
+        categories = self.data['c']
+        key = str(category_id)
+        category = categories.setdefault(key, {'t': category_type, 'd': 0, 'w': 0, 'k': {}})
+        category['t'] = category_type
+
+        category['d'] += weight
+        for token in tokens:
+            category['w'] += weight
+            _increment(category['k'], token, weight)
+            _increment(vocabulary, token, weight)
+
+        if category['d'] <= 0:
+            del categories[key]
+
+    def forget(self, tokens, category_id, category_type):
+        self.learn(tokens, category_id, category_type, weight=-1)
+
+    def predict(self, tokens, transaction_type):
+        '''
+        Return (category_id, posterior) of the most likely category, or None
+        when no word of the description was ever seen (the amount bucket
+        alone is not enough evidence).
+        '''
+        vocabulary = self.data['v']
+        known = [token for token in tokens if token in vocabulary]
+        if not any(not token.startswith('$') for token in known):
+            return None
+
+        candidates = [
+            (key, category) for key, category in self.data['c'].items()
+            if category['t'] == transaction_type and category['d'] > 0
+        ]
+        if not candidates:
+            return None
+
+        vocabulary_size = len(vocabulary)
+        total_documents = sum(category['d'] for _, category in candidates)
+
+        scores = []
+        for key, category in candidates:
+            counts = category['k']
+            denominator = category['w'] + vocabulary_size
+            score = math.log(category['d'] / total_documents)
+            for token in known:
+                score += math.log((counts.get(token, 0) + 1) / denominator)
+            scores.append((score, key))
+
+        best_score, best_key = max(scores)
+        normalizer = sum(math.exp(score - best_score) for score, _ in scores)
+        return int(best_key), 1 / normalizer
+
+
+def _increment(counts, token, weight):
+    value = counts.get(token, 0) + weight
+    if value > 0:
+        counts[token] = value
+    else:
+        counts.pop(token, None)
+
+
+class CategorySuggester:
+    '''
+    Suggests a category id for a new transaction of the user.
+
+    Tries the learned classifier first and falls back to the keyword rules.
+    Only ids of the user's current categories are returned.
+    '''
+
+    def __init__(self, user, min_confidence=MIN_CONFIDENCE):
+        from .models import CategoryClassifier
+
+        self.classifier = CategoryClassifier.for_user(user)
+        self.categorizer = Categorizer.for_user(user)
+        self.min_confidence = min_confidence
+        self.valid_ids = set(user.categories.values_list('id', flat=True))
+
+    def suggest(self, description, transaction_type, amount=None):
+        prediction = self.classifier.predict(tokenize(description, amount), transaction_type)
+        if prediction:
+            category_id, confidence = prediction
+            if confidence >= self.min_confidence and category_id in self.valid_ids:
+                return category_id
+
+        category_id = self.categorizer.categorize(description, transaction_type)
+        return category_id if category_id in self.valid_ids else None
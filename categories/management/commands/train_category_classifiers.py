@@ -0,0 +1,33 @@
+# categories/management/commands/train_category_classifiers.py
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from categories.models import CategoryClassifier
+
+
+class Command(BaseCommand):
+    help = (
+        'Retreina o classificador de categorias de cada usuário a partir do '
+        'histórico de transações. Use após importações ou alterações em massa '
+        'que não disparam signals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            default=None,
+            help='E-mail de um usuário específico (padrão: todos)'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(is_active=True)
+        if options['user']:
+            users = users.filter(email=options['user'])
+
+        total = 0
+        for user in users.iterator():
+            CategoryClassifier.train(user)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} classificador(es) treinado(s)!'))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_category_categories__user_id_f0c68e_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClassifier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='category_classifier', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Category classifier',
+                'verbose_name_plural': 'Category classifiers',
+            },
+        ),
+    ]
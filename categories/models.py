@@ -1,5 +1,12 @@
+import threading
+from contextlib import contextmanager
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+# Buffer of CategoryClassifier.deferred(), per thread
+_deferred = threading.local()
 
 
 class Category(models.Model):
@@ -94,21 +101,138 @@ def processar_gamificacao_categoria(sender, instance, created, **kwargs):
         return
     
     try:
+        from gamification.achievements import CATEGORIA_CRIADA
         from gamification.services import GamificationService
         
-        # 20 pontos por criar categoria
-        GamificationService.adicionar_pontos(
-            user=instance.user,
+        # 20 pontos por criar categoria + conquistas de categorias
+        GamificationService.registrar_evento(
+            instance.user,
+            CATEGORIA_CRIADA,
             pontos=20,
             tipo='categoria',
             descricao=f'🏷️ Categoria criada: {instance.name}'
         )
         
-        # Verifica conquistas
-        total_categorias = Category.objects.filter(user=instance.user).count()
-        
-        if total_categorias >= 10:  # 10 categorias personalizadas
-            GamificationService.verificar_e_desbloquear_conquista(instance.user, 'organizador_expert')
-        
     except Exception as e:
-        print(f"Erro gamificação categoria: {e}")
\ No newline at end of file
+        print(f"Erro gamificação categoria: {e}")
+
+class CategoryClassifier(models.Model):
+    '''
+    Learned categorization state of one user (see categories/classifier.py).
+
+    Created lazily by for_user() from the user's transaction history, then
+    updated incrementally by the Transaction signals in categories/signals.py.
+
+    Attributes:
+        user: One-to-one with CustomUser (CASCADE on delete)
+        data: NaiveBayesClassifier JSON state
+        updated_at: Timestamp of the last learn/forget
+    '''
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='category_classifier'
+    )
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Category classifier'
+        verbose_name_plural = 'Category classifiers'
+
+    def __str__(self):
+        return f'Classifier of {self.user}'
+
+    @classmethod
+    def for_user(cls, user):
+        '''
+        Return the user's NaiveBayesClassifier, training it from history on
+        first use.
+        '''
+        from .classifier import NaiveBayesClassifier
+
+        state = cls.objects.filter(user=user).values_list('data', flat=True).first()
+        if state is None:
+            return cls.train(user)
+        return NaiveBayesClassifier(state)
+
+    @classmethod
+    def train(cls, user):
+        '''Rebuild the classifier from all of the user's transactions.'''
+        from transactions.models import Transaction
+
+        from .classifier import NaiveBayesClassifier, tokenize
+
+        classifier = NaiveBayesClassifier()
+        history = Transaction.objects.filter(account__user=user).values_list(
+            'description', 'amount', 'category_id', 'category__category_type'
+        )
+        for description, amount, category_id, category_type in history.iterator(chunk_size=2000):
+            classifier.learn(tokenize(description, amount), category_id, category_type)
+
+        cls.objects.update_or_create(user=user, defaults={'data': classifier.data})
+        return classifier
+
+    @classmethod
+    def learn(cls, user_id, description, amount, category_id, category_type, weight=1):
+        '''
+        Incrementally add (weight=1) or remove (weight=-1) one transaction.
+
+        Users without a stored state are skipped: for_user() will train them
+        from history, which already includes this transaction. Inside
+        deferred() the change is buffered instead of written.
+        '''
+        from .classifier import tokenize
+
+        tokens = tokenize(description, amount)
+        if not tokens:
+            return
+
+        pending = getattr(_deferred, 'pending', None)
+        if pending is not None:
+            pending.setdefault(user_id, []).append((tokens, category_id, category_type, weight))
+            return
+        cls._apply({user_id: [(tokens, category_id, category_type, weight)]})
+
+    @classmethod
+    @contextmanager
+    def deferred(cls):
+        '''
+        Buffer learn() calls and write them on exit, one UPDATE per user.
+
+        Used by bulk imports, where the signals would otherwise lock and
+        rewrite the same row once per created transaction. Nested blocks
+        share the outer buffer; nothing is written if the block raises.
+        '''
+        if getattr(_deferred, 'pending', None) is not None:
+            yield
+            return
+
+        _deferred.pending = {}
+        try:
+            yield
+            pending = _deferred.pending
+        finally:
+            _deferred.pending = None
+        cls._apply(pending)
+
+    @classmethod
+    def _apply(cls, samples):
+        '''Apply {user_id: [(tokens, category_id, category_type, weight)]} under the row locks.'''
+        from .classifier import NaiveBayesClassifier
+
+        if not samples:
+            return
+
+        with transaction.atomic():
+            states = dict(
+                cls.objects.select_for_update()
+                .filter(user_id__in=list(samples))
+                .order_by('user_id')
+                .values_list('user_id', 'data')
+            )
+            for user_id, state in states.items():
+                classifier = NaiveBayesClassifier(state)
+                for tokens, category_id, category_type, weight in samples[user_id]:
+                    classifier.learn(tokens, category_id, category_type, weight)
+                cls.objects.filter(user_id=user_id).update(data=classifier.data, updated_at=timezone.now())
@@ -4,12 +4,18 @@ Signal handlers for category management.
 This module automatically creates default transaction categories when a new
 user registers. This provides a better onboarding experience by giving users
 a starter set of categories.
+
+It also keeps each user's learned CategoryClassifier in sync with their
+transactions: every create/edit/delete of a Transaction is learned or
+forgotten incrementally.
 '''
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import Category
+from transactions.models import Transaction
+
+from .models import Category, CategoryClassifier
 
 User = get_user_model()
 
@@ -76,3 +82,62 @@ def create_default_categories(sender, instance, created, **kwargs):
                 category_type=category['category_type'],
                 color=category['color']
             )
+
+
+# Fields a Transaction save must touch for the classifier to change
+CLASSIFIER_FIELDS = frozenset({'account', 'account_id', 'description', 'amount', 'category', 'category_id'})
+
+
+def _classifier_sample(transaction):
+    '''(user_id, description, amount, category_id, category_type) of a Transaction'''
+    return (
+        transaction.account.user_id,
+        transaction.description,
+        transaction.amount,
+        transaction.category_id,
+        transaction.category.category_type,
+    )
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_classifier_sample(sender, instance, **kwargs):
+    '''
+    Signal handler: Store what the classifier learned from the previous
+    version of an edited transaction, so it can be forgotten after saving.
+    '''
+    instance._classifier_previous = None
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not CLASSIFIER_FIELDS.intersection(update_fields):
+        return
+    if instance.pk:
+        previous = Transaction.objects.select_related('account', 'category').filter(pk=instance.pk).first()
+        if previous:
+            instance._classifier_previous = _classifier_sample(previous)
+
+
+@receiver(post_save, sender=Transaction)
+def learn_transaction_category(sender, instance, created, **kwargs):
+    '''
+    Signal handler: Teach the user's classifier the category of a saved
+    transaction (forgetting the previous version on edits).
+    '''
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not CLASSIFIER_FIELDS.intersection(update_fields):
+        return
+
+    current = _classifier_sample(instance)
+    previous = getattr(instance, '_classifier_previous', None)
+
+    if previous == current:
+        return
+    if previous:
+        CategoryClassifier.learn(*previous, weight=-1)
+    CategoryClassifier.learn(*current)
+
+
+@receiver(post_delete, sender=Transaction)
+def forget_transaction_category(sender, instance, **kwargs):
+    '''
+    Signal handler: Remove a deleted transaction from the user's classifier.
+    '''
+    CategoryClassifier.learn(*_classifier_sample(instance), weight=-1)
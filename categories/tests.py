@@ -1 +1,107 @@
-# Create your tests here.
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import Account
+from transactions.models import Transaction
+
+from .categorizer import Categorizer
+from .models import Category, CategoryClassifier
+
+
+class CategoryClassifierTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='classifier@test.com', password='x')
+        self.account = Account.objects.create(user=self.user, name='Conta', bank_name='Banco')
+        self.category = self.user.categories.filter(category_type='EXPENSE').first()
+        CategoryClassifier.train(self.user)
+
+    def _create(self, description):
+        return Transaction.objects.create(
+            account=self.account,
+            category=self.category,
+            transaction_type='EXPENSE',
+            amount=Decimal('12.50'),
+            transaction_date=date(2024, 1, 10),
+            description=description
+        )
+
+    def test_deferred_writes_once_per_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            with CategoryClassifier.deferred():
+                for index in range(20):
+                    self._create(f'PADARIA REAL {index}')
+
+        writes = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "categories_categoryclassifier"')]
+        self.assertEqual(len(writes), 1)
+        classifier = CategoryClassifier.for_user(self.user)
+        self.assertEqual(classifier.data['c'][str(self.category.pk)]['d'], 20)
+
+    def test_deferred_discards_buffer_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with CategoryClassifier.deferred():
+                self._create('PADARIA REAL')
+                raise RuntimeError
+
+        self.assertEqual(CategoryClassifier.for_user(self.user).data['c'], {})
+
+    def test_update_fields_without_classified_fields_skip_the_classifier(self):
+        transaction = self._create('PADARIA REAL')
+        transaction.transaction_date = date(2024, 1, 11)
+
+        with CaptureQueriesContext(connection) as queries:
+            transaction.save(update_fields=['transaction_date'])
+
+        self.assertFalse([q for q in queries if 'categories_categoryclassifier' in q['sql']])
+
+    def test_suggestion_rejects_non_finite_amount(self):
+        self.client.force_login(self.user)
+        url = reverse('transactions:suggest_category')
+
+        for amount in ('inf', '-Infinity', 'nan'):
+            response = self.client.get(url, {'description': 'PADARIA', 'transaction_type': 'EXPENSE', 'amount': amount})
+            self.assertEqual(response.status_code, 400, amount)
+
+        response = self.client.get(url, {'description': 'PADARIA', 'transaction_type': 'EXPENSE', 'amount': '12.50'})
+        self.assertEqual(response.status_code, 200)
+
+
+class CategorizerTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='categorizer@test.com', password='x')
+
+    def _category(self, name):
+        return self.user.categories.get(name=name).pk
+
+    def test_longest_keyword_wins(self):
+        categorizer = Categorizer.for_user(self.user)
+
+        self.assertEqual(categorizer.categorize('UBER EATS CENTRO', 'EXPENSE'), self._category('Alimentação'))
+        self.assertEqual(categorizer.categorize('Uber trip', 'EXPENSE'), self._category('Transporte'))
+
+    def test_keyword_group_ranks_before_category_name(self):
+        categorizer = Categorizer.for_user(self.user)
+
+        self.assertEqual(categorizer.categorize('COMPRAS NETFLIX.COM', 'EXPENSE'), self._category('Lazer'))
+        self.assertEqual(categorizer.categorize('COMPRAS DIVERSAS', 'EXPENSE'), self._category('Compras'))
+
+    def test_matches_only_categories_of_the_transaction_type(self):
+        categorizer = Categorizer.for_user(self.user)
+
+        self.assertEqual(categorizer.categorize('SALÁRIO MENSAL', 'INCOME'), self._category('Salário'))
+        self.assertIsNone(categorizer.categorize('SALÁRIO MENSAL', 'EXPENSE'))
+        self.assertIsNone(categorizer.categorize('', 'EXPENSE'))
+
+    def test_cached_matcher_is_rebuilt_when_categories_change(self):
+        categorizer = Categorizer.for_user(self.user)
+        self.assertIs(Categorizer.for_user(self.user), categorizer)
+        self.assertIsNone(categorizer.categorize('ZARA SHOPPING', 'EXPENSE'))
+
+        vestuario = Category.objects.create(user=self.user, name='Vestuário', category_type='EXPENSE')
+
+        self.assertEqual(Categorizer.for_user(self.user).categorize('ZARA SHOPPING', 'EXPENSE'), vestuario.pk)
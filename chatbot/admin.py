@@ -1,10 +1,10 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import CachedResponse, Conversation, Message
 
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
-    list_display = ['user', 'title', 'is_active', 'created_at', 'updated_at']
+    list_display = ['user', 'title', 'is_active', 'created_at', 'updated_at', 'compacted_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['user__email', 'title']
     date_hierarchy = 'created_at'
@@ -20,3 +20,10 @@ class MessageAdmin(admin.ModelAdmin):
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Conteúdo'
+
+
+@admin.register(CachedResponse)
+class CachedResponseAdmin(admin.ModelAdmin):
+    list_display = ['user', 'question', 'hits', 'created_at', 'last_hit_at']
+    search_fields = ['question', 'user__email']
+    date_hierarchy = 'created_at'
@@ -1,14 +1,19 @@
-import json
-import os
-from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
-from django.conf import settings
 
 from transactions.models import Transaction
 from categories.models import Category
 from accounts.models import Account
+from analytics.snapshot import get_financial_snapshot
+
+from .prompt import PromptBuilder, rolling_summary
+from .intents import INTENT_OPEN, get_intent_router, route_metrics
+from .response_cache import ResponseCache
+from .llm import (
+    LLMAuthError, LLMCircuitOpen, LLMError, LLMNotConfigured, LLMRateLimited,
+    LLMTimeout, LLMUnavailable, get_llm_client,
+)
 
 
 class FinancialAssistant:
@@ -17,14 +22,15 @@ class FinancialAssistant:
     Focado em precisão, sem alucinações, baseado em dados reais.
     """
     
+    MAX_RESPONSE_LENGTH = 1000
+    
     def __init__(self, user):
         self.user = user
         self.today = timezone.now().date()
-        self.api_key = self._get_api_key()
-    
-    def _get_api_key(self):
-        """Busca API key de forma segura"""
-        return getattr(settings, 'GROQ_API_KEY', None) or os.environ.get('GROQ_API_KEY')
+        self._context = None
+        self._response_cache = None
+        self._expense_category_names = None
+        self.prompt_tokens = None
     
     def get_system_prompt(self):
         """Prompt do sistema com regras RÍGIDAS contra alucinações"""
@@ -58,124 +64,53 @@ Ajudar o usuário a tomar decisões financeiras inteligentes com base em DADOS R
 """
     
     def get_context_data(self):
-        """Coleta dados financeiros REAIS do usuário de forma robusta"""
-        current_month_start = self.today.replace(day=1)
-        last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
-        
-        # Transações do mês atual
-        current_month_transactions = Transaction.objects.filter(
-            account__user=self.user,
-            transaction_date__gte=current_month_start,
-            transaction_date__lte=self.today
-        )
-        
-        # Gastos mês atual
-        month_expenses = current_month_transactions.filter(
-            transaction_type=Transaction.TransactionType.EXPENSE
-        ).aggregate(
-            total=Sum('amount'),
-            count=Count('id')
-        )
+        """
+        Dados financeiros REAIS do usuário.
+
+        Vem do snapshot pré-calculado (analytics/snapshot.py), recalculado
+        só quando as transações/contas mudam: em geral uma única consulta.
+        """
+        if self._context is None:
+            self._context = get_financial_snapshot(self.user)
+        return self._context
+    
+    def _get_response_cache(self):
+        if self._response_cache is None:
+            self._response_cache = ResponseCache(self.user, self.get_context_data())
+        return self._response_cache
+    
+    def cached_response(self, user_message, conversation_history=None):
+        """Resposta já dada a esta pergunta com os mesmos dados e histórico, ou None"""
+        return self._get_response_cache().lookup(user_message, conversation_history)
+    
+    def remember_response(self, user_message, assistant_response, conversation_history=None):
+        """Guarda uma resposta completa da IA para perguntas repetidas"""
+        self._get_response_cache().store(user_message, assistant_response, conversation_history)
+    
+    def quick_response(self, user_message, conversation_history=None):
+        """
+        Resposta que dispensa a chamada à IA, ou None.
         
-        # Receitas mês atual
-        month_income = current_month_transactions.filter(
-            transaction_type=Transaction.TransactionType.INCOME
-        ).aggregate(
-            total=Sum('amount'),
-            count=Count('id')
+        Nesta ordem: mensagem inválida, pergunta factual respondida com os
+        dados (chatbot/intents.py), resposta em cache e IA não configurada.
+        As respostas locais funcionam mesmo sem GROQ_API_KEY.
+        """
+        return (
+            self._validate_content(user_message)
+            or self.local_response(user_message)
+            or self.cached_response(user_message, conversation_history)
+            or self._validate_configuration()
         )
-        
-        # Gastos mês anterior
-        last_month_expenses = Transaction.objects.filter(
-            account__user=self.user,
-            transaction_type=Transaction.TransactionType.EXPENSE,
-            transaction_date__gte=last_month_start,
-            transaction_date__lt=current_month_start
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Saldo total de contas ativas
-        accounts = Account.objects.filter(user=self.user, is_active=True)
-        total_balance = accounts.aggregate(total=Sum('balance'))['total'] or Decimal('0')
-        
-        # Top 5 categorias de gastos
-        top_categories = Transaction.objects.filter(
-            account__user=self.user,
-            transaction_type=Transaction.TransactionType.EXPENSE,
-            transaction_date__gte=current_month_start
-        ).values(
-            'category__name'
-        ).annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        ).order_by('-total')[:5]
-        
-        # Calcular porcentagem de cada categoria
-        total_expenses = month_expenses['total'] or Decimal('0')
-        categories_with_percentage = []
-        for cat in top_categories:
-            percentage = (float(cat['total']) / float(total_expenses) * 100) if total_expenses > 0 else 0
-            categories_with_percentage.append({
-                'nome': cat['category__name'],
-                'total': float(cat['total']),
-                'quantidade_transacoes': cat['count'],
-                'porcentagem': round(percentage, 1)
-            })
-        
-        # Comparação com mês anterior
-        variation = 0
-        if last_month_expenses > 0:
-            current = month_expenses['total'] or Decimal('0')
-            variation = float((current - last_month_expenses) / last_month_expenses * 100)
-        
-        # Contas individuais
-        accounts_list = [
-            {
-                'nome': acc.name,
-                'tipo': acc.get_account_type_display(),
-                'saldo': float(acc.balance)
-            }
-            for acc in accounts
-        ]
-        
-        context = {
-            'data_atual': self.today.strftime('%d/%m/%Y'),
-            'mes_atual': {
-                'gastos': float(month_expenses['total'] or 0),
-                'quantidade_gastos': month_expenses['count'],
-                'receitas': float(month_income['total'] or 0),
-                'quantidade_receitas': month_income['count'],
-                'balanco': float((month_income['total'] or 0) - (month_expenses['total'] or 0)),
-            },
-            'mes_anterior': {
-                'gastos': float(last_month_expenses),
-            },
-            'comparacao': {
-                'variacao_percentual': round(variation, 1),
-                'aumentou': variation > 0
-            },
-            'contas': {
-                'saldo_total': float(total_balance),
-                'quantidade': accounts.count(),
-                'detalhes': accounts_list
-            },
-            'categorias_top_5': categories_with_percentage,
-        }
-        
-        return context
     
-    def process_message(self, user_message, conversation_history):
-        """Processa mensagem do usuário com validações robustas"""
-        
-        # Validação 1: Biblioteca instalada
+    def _validate_configuration(self):
+        # Validações 1 e 2: biblioteca instalada e API key configurada
         try:
-            from groq import Groq
-        except ImportError:
-            return "❌ **Erro técnico**: Biblioteca Groq não instalada.\n\n💡 Solução: `pip install groq`"
-        
-        # Validação 2: API Key configurada
-        if not self.api_key:
-            return "❌ **Configuração ausente**: API Key do Groq não encontrada.\n\n💡 Adicione `GROQ_API_KEY` no arquivo `.env`"
-        
+            get_llm_client().check_configured()
+        except LLMNotConfigured as e:
+            return f"❌ **Configuração ausente**: {e}.\n\n💡 {e.hint}"
+        return None
+    
+    def _validate_content(self, user_message):
         # Validação 3: Mensagem não vazia
         if not user_message or not user_message.strip():
             return "🤔 Você não disse nada! Como posso ajudar?"
@@ -184,95 +119,114 @@ Ajudar o usuário a tomar decisões financeiras inteligentes com base em DADOS R
         if len(user_message) > 500:
             return "⚠️ Mensagem muito longa! Por favor, seja mais objetivo (máximo 500 caracteres)."
         
-        # Obter contexto financeiro real
-        context = self.get_context_data()
+        return None
+    
+    def local_response(self, user_message):
+        """Resposta montada com os dados para perguntas factuais, ou None (vai para a IA)"""
+        router = get_intent_router()
+        account_names = [conta['nome'] for conta in self.get_context_data()['contas']['detalhes']]
+        intent = router.classify(user_message, self.expense_category_names(), account_names)
+        route_metrics.record(intent)
+        if intent == INTENT_OPEN:
+            return None
+        return router.answer(intent, user_message, self)
+    
+    def expense_category_names(self):
+        """Nomes das categorias de despesa do usuário"""
+        if self._expense_category_names is None:
+            self._expense_category_names = list(Category.objects.filter(
+                user=self.user,
+                category_type=Category.CategoryType.EXPENSE
+            ).values_list('name', flat=True))
+        return self._expense_category_names
+    
+    def build_messages(self, user_message, conversation_history, conversation_id=None):
+        """
+        Monta as mensagens (system + user com contexto) enviadas ao modelo.
         
-        # Formatar histórico (últimas 5 mensagens apenas)
-        formatted_history = self._format_history(conversation_history)
+        O prompt respeita CHAT_PROMPT_TOKEN_BUDGET (chatbot/prompt.py); com
+        ``conversation_id`` as perguntas fora da janela de histórico entram
+        como resumo. Os tokens estimados ficam em ``self.prompt_tokens``.
+        """
+        summary = rolling_summary(conversation_id, conversation_history) if conversation_id else ''
+        prompt = PromptBuilder(self.get_system_prompt()).build(
+            self.get_context_data(), user_message, conversation_history, summary
+        )
+        self.prompt_tokens = prompt.tokens
+        return prompt.messages
+    
+    def _completion_options(self):
+        return {
+            'model': "llama-3.3-70b-versatile",  # Modelo ATUALIZADO (2024)
+            'temperature': 0.3,  # Baixa temperatura = menos criatividade = mais precisão
+            'max_tokens': 400,  # Limitar resposta
+            'top_p': 0.9,  # Foco em respostas mais prováveis
+            'stop': None,
+        }
+    
+    def process_message(self, user_message, conversation_history, conversation_id=None):
+        """Processa mensagem do usuário com validações robustas"""
+        quick = self.quick_response(user_message, conversation_history)
+        if quick:
+            return quick
         
-        # System prompt com regras rígidas
-        system_prompt = self.get_system_prompt()
+        messages = self.build_messages(user_message, conversation_history, conversation_id)
         
-        # User prompt com contexto estruturado
-        user_prompt = f"""📊 DADOS FINANCEIROS REAIS (use APENAS estes dados):
-```json
-{json.dumps(context, indent=2, ensure_ascii=False)}
-```
-
-💬 HISTÓRICO RECENTE:
-{formatted_history}
-
-❓ PERGUNTA DO USUÁRIO:
-{user_message}
-
-⚠️ LEMBRE-SE: 
-- Use APENAS os dados acima
-- Seja BREVE (3-4 linhas no máximo)
-- Não invente informações
-- Se não tiver dados para responder, seja honesto"""
-
         try:
-            client = Groq(api_key=self.api_key)
-            
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                model="llama-3.3-70b-versatile",  # Modelo ATUALIZADO (2024)
-                temperature=0.3,  # Baixa temperatura = menos criatividade = mais precisão
-                max_tokens=400,  # Limitar resposta
-                top_p=0.9,  # Foco em respostas mais prováveis
-                stream=False,
-                stop=None,
-            )
-            
-            assistant_response = chat_completion.choices[0].message.content.strip()
-            
-            # Validação da resposta
-            if not assistant_response:
-                return "🤔 Desculpe, não consegui processar sua pergunta. Tente reformular!"
-            
-            # Limitar tamanho da resposta (segurança extra)
-            if len(assistant_response) > 1000:
-                assistant_response = assistant_response[:1000] + "..."
-            
-            return assistant_response
-            
-        except Exception as e:
-            error_message = str(e)
-            
-            # Tratamento de erros específicos
-            if 'authentication' in error_message.lower() or 'api key' in error_message.lower():
-                return "❌ **Erro de autenticação**: API Key inválida.\n\n💡 Verifique se a chave está correta no `.env`"
-            elif 'rate limit' in error_message.lower():
-                return "⏰ **Limite atingido**: Muitas requisições.\n\n💡 Aguarde alguns segundos e tente novamente."
-            elif 'timeout' in error_message.lower():
-                return "⏱️ **Timeout**: Servidor demorou para responder.\n\n💡 Tente novamente."
-            else:
-                return f"❌ **Erro inesperado**: {error_message[:100]}\n\n💡 Tente novamente ou contate o suporte."
+            reply = get_llm_client().complete(messages, **self._completion_options())
+        except LLMError as e:
+            return self.error_response(e)
+        
+        response = self.finalize_response(reply)
+        # Resposta vazia vira mensagem de erro: não vale guardar
+        if reply.strip():
+            self.remember_response(user_message, response, conversation_history)
+        return response
+    
+    async def stream_completion(self, messages):
+        """
+        Gera os trechos da resposta conforme o modelo os produz.
+        
+        Para após MAX_RESPONSE_LENGTH caracteres; LLMError é propagado
+        (use error_response para a mensagem ao usuário).
+        """
+        length = 0
+        async for delta in get_llm_client().astream(messages, **self._completion_options()):
+            remaining = self.MAX_RESPONSE_LENGTH - length
+            if len(delta) > remaining:
+                if remaining:
+                    yield delta[:remaining]
+                yield "..."
+                break
+            yield delta
+            length += len(delta)
     
-    def _format_history(self, history):
-        """Formata histórico de forma concisa"""
-        if not history:
-            return "Primeira interação com o usuário."
+    def finalize_response(self, assistant_response):
+        """Aplica as validações finais ao texto completo da resposta"""
+        assistant_response = assistant_response.strip()
         
-        # Pegar últimas 5 mensagens apenas
-        recent_history = history[-5:]
+        # Validação da resposta
+        if not assistant_response:
+            return "🤔 Desculpe, não consegui processar sua pergunta. Tente reformular!"
         
-        formatted = []
-        for msg in recent_history:
-            role = "👤 Usuário" if msg['role'] == 'user' else "🤖 Nebue"
-            content = msg['content'][:80] + "..." if len(msg['content']) > 80 else msg['content']
-            formatted.append(f"{role}: {content}")
+        # Limitar tamanho da resposta (segurança extra)
+        if len(assistant_response) > self.MAX_RESPONSE_LENGTH:
+            assistant_response = assistant_response[:self.MAX_RESPONSE_LENGTH] + "..."
         
-        return "\n".join(formatted) if formatted else "Primeira interação."
+        return assistant_response
+    
+    def error_response(self, error):
+        """Mensagem amigável para um LLMError"""
+        if isinstance(error, LLMAuthError):
+            return "❌ **Erro de autenticação**: API Key inválida.\n\n💡 Verifique se a chave está correta no `.env`"
+        elif isinstance(error, LLMRateLimited):
+            return "⏰ **Limite atingido**: Muitas requisições.\n\n💡 Aguarde alguns segundos e tente novamente."
+        elif isinstance(error, LLMTimeout):
+            return "⏱️ **Timeout**: Servidor demorou para responder.\n\n💡 Tente novamente."
+        elif isinstance(error, (LLMCircuitOpen, LLMUnavailable)):
+            return "🔌 **IA indisponível**: O serviço de IA está fora do ar no momento.\n\n💡 Tente novamente em alguns instantes."
+        else:
+            return f"❌ **Erro inesperado**: {str(error)[:100]}\n\n💡 Tente novamente ou contate o suporte."
     
     def _get_expenses_summary(self):
         """Resumo de gastos do mês"""
@@ -340,7 +294,7 @@ Ajudar o usuário a tomar decisões financeiras inteligentes com base em DADOS R
                 'nome': cat['category__name'],
                 'total': float(cat['total']),
                 'quantidade': cat['count'],
-                'porcentagem': round(float(cat['total']) / total_expenses * 100, 1) if total_expenses > 0 else 0
+                'porcentagem': round(float(cat['total'] / total_expenses * 100), 1) if total_expenses > 0 else 0
             }
             for cat in categories
         ]
@@ -0,0 +1,329 @@
+"""
+Roteador de intenções: perguntas factuais respondidas sem a IA.
+
+Boa parte das mensagens é "qual meu saldo?", "quanto gastei este mês?" ou
+"quanto foi em alimentação?", cuja resposta já está no snapshot financeiro.
+IntentRouter.classify identifica a intenção em dois passos:
+
+1. Regras (expressões regulares sobre o texto normalizado) de alta
+   precisão. Pedidos de conselho ("como economizar", "devo investir")
+   vão sempre para a IA, assim como perguntas com palavras fora do
+   vocabulário conhecido ("gastos com uber") ou sobre o que as respostas
+   prontas não cobrem: dívidas, um período específico ("quanto gastei
+   hoje", "em janeiro"), uma conta pelo nome ("saldo do nubank") e
+   receitas fora do resumo do mês ("minha receita do mês passado"). A
+   resposta pronta ignoraria justamente o detalhe pedido.
+2. Sem regra aplicável, um naive Bayes (o mesmo de categories/classifier.py)
+   treinado com as frases de TRAINING_PHRASES. Abaixo de
+   INTENT_MIN_CONFIDENCE, ou na dúvida entre intenções, a pergunta vai
+   para a IA.
+
+As respostas são montadas a partir dos dados (IntentRouter.answer), sem
+chamada ao provedor:
+
+    router = get_intent_router()
+    intent = router.classify(pergunta, nomes_das_categorias, nomes_das_contas)
+    if intent != INTENT_OPEN:
+        resposta = router.answer(intent, pergunta, assistant)
+"""
+import re
+import threading
+
+from categories.classifier import NaiveBayesClassifier
+from users.templatetags.currency_filters import currency
+
+from .response_cache import normalize_question, question_terms
+
+INTENT_BALANCE = 'saldo'
+INTENT_MONTH_EXPENSES = 'gastos_mes'
+INTENT_CATEGORY = 'categoria'
+INTENT_COMPARISON = 'comparacao'
+INTENT_OPEN = 'aberta'
+
+INTENTS = [INTENT_BALANCE, INTENT_MONTH_EXPENSES, INTENT_CATEGORY, INTENT_COMPARISON, INTENT_OPEN]
+
+# Tamanho de categorias_top_5 no snapshot financeiro
+TOP_CATEGORIES = 5
+
+# Abaixo desta probabilidade do modelo a pergunta vai para a IA
+INTENT_MIN_CONFIDENCE = 0.75
+
+# Radical usado pelo modelo: "comparar", "compare" e "comparação" viram "compa"
+STEM_LENGTH = 5
+
+# Pedidos de opinião/conselho: sempre a IA
+ADVICE_RE = re.compile(
+    r'\b(dicas?|devo|deveria|conselho|recomend\w*|sugest\w*|suger\w*|economiz\w*|'
+    r'invest\w*|planej\w*|melhor\w*|reduzir|diminuir|cortar|ajud\w*|por que|porque|'
+    r'vale a pena|como (posso|faco|fazer|consigo))\b'
+)
+
+# Assuntos sem resposta pronta: sempre a IA
+DEBT_RE = re.compile(r'\b(dividas?|devendo|emprestimos?|financiamentos?|parcelas?|faturas?)\b')
+PERIOD_RE = re.compile(
+    r'\b(hoje|ontem|dias?|semanas?|semanal|quinzena|anos?|anual|trimestre|semestre|'
+    r'janeiro|fevereiro|marco|abril|maio|junho|julho|agosto|setembro|outubro|novembro|dezembro|'
+    r'\d+)\b'
+)
+
+# Receitas só aparecem no resumo do mês atual (INTENT_MONTH_EXPENSES)
+INCOME_RE = re.compile(r'\b(receitas?|recebi|ganhei|ganhos?|entrou|entradas?|salario|renda)\b')
+
+RULES = [
+    (INTENT_COMPARISON, re.compile(
+        r'\b(compar\w*|mes (passado|anterior)|ultimo mes|aumentou|aumentaram|'
+        r'diminuiu|diminuiram|variacao|em relacao|'
+        r'(estou|to|tou) gastando (mais|menos)|gast\w* (mais|menos) (que|do que))\b'
+    )),
+    (INTENT_CATEGORY, re.compile(
+        r'\b(categorias?|onde (eu )?(mais )?gast\w*|com o que (eu )?(mais )?gast\w*|'
+        r'em que (eu )?(mais )?gast\w*|maior(es)? gastos?)\b'
+    )),
+    (INTENT_BALANCE, re.compile(
+        r'\b(saldos?|quanto (eu )?tenho|dinheiro (eu )?tenho|tenho (de )?dinheiro|'
+        r'minhas contas)\b'
+    )),
+    (INTENT_MONTH_EXPENSES, re.compile(
+        r'\b(gastei|gastos?|gastando|despesas?|receitas?|recebi|balanco|sobrou|resumo do mes)\b'
+    )),
+]
+
+# Sem nomes de categoria: esses vêm das categorias do próprio usuário
+TRAINING_PHRASES = {
+    INTENT_BALANCE: [
+        'qual meu saldo', 'qual o saldo atual das minhas contas', 'quanto dinheiro eu tenho',
+        'quanto tenho na conta agora', 'saldo total', 'quanto tenho guardado',
+        'quanto sobrou nas contas', 'valor disponivel nas contas', 'meu dinheiro',
+        'quanto tem na minha carteira', 'saldo da poupanca', 'saldo da conta corrente',
+        'tenho dinheiro', 'quanto tenho ao todo', 'quanto tenho no banco',
+    ],
+    INTENT_MONTH_EXPENSES: [
+        'quanto gastei este mes', 'quanto gastei no mes atual', 'total de gastos do mes',
+        'minhas despesas do mes', 'quanto ja gastei', 'gastos ate agora',
+        'quanto recebi este mes', 'quanto entrou este mes', 'resumo do mes',
+        'balanco do mes', 'quantas compras fiz', 'quanto saiu da conta este mes',
+        'estou gastando muito', 'minhas receitas', 'quanto sobrou no mes',
+        'total gasto', 'valor das despesas', 'meu gasto mensal',
+    ],
+    INTENT_CATEGORY: [
+        'onde gasto mais', 'qual categoria gastei mais', 'gastos por categoria',
+        'maior gasto do mes', 'com o que mais gasto', 'divisao dos gastos',
+        'em que estou gastando', 'maiores gastos', 'principais categorias',
+        'porcentagem de cada categoria', 'percentual por categoria', 'para onde vai meu dinheiro',
+    ],
+    INTENT_COMPARISON: [
+        'gastei mais que no mes passado', 'comparar com mes anterior', 'comparacao mensal',
+        'meus gastos aumentaram', 'meus gastos diminuiram', 'variacao dos gastos',
+        'estou gastando mais', 'estou gastando menos', 'quanto gastei no mes passado',
+        'diferenca para o mes anterior', 'evolucao dos gastos', 'gastos em relacao ao ultimo mes',
+        'aumentou ou diminuiu',
+    ],
+    INTENT_OPEN: [
+        'como posso economizar', 'devo investir', 'me de dicas financeiras',
+        'o que e reserva de emergencia', 'vale a pena pagar a vista', 'como sair das dividas',
+        'onde investir meu dinheiro', 'me ajuda a montar um orcamento', 'o que voce acha',
+        'como melhorar minhas financas', 'quem e voce', 'obrigado', 'bom dia',
+        'explique juros compostos', 'conte uma historia', 'qual a taxa selic',
+    ],
+}
+
+
+class IntentRouter:
+    """Classifica perguntas e responde as factuais a partir dos dados"""
+
+    def __init__(self, min_confidence=INTENT_MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self.model = NaiveBayesClassifier()
+        for intent, phrases in TRAINING_PHRASES.items():
+            for phrase in phrases:
+                self.model.learn(_tokens(phrase), INTENTS.index(intent), 'CHAT')
+
+    def classify(self, question, category_names=(), account_names=()):
+        """Intenção da pergunta; INTENT_OPEN quando deve ir para a IA"""
+        text = normalize_question(question)
+        if ADVICE_RE.search(text) or DEBT_RE.search(text) or PERIOD_RE.search(text):
+            return INTENT_OPEN
+        if _mentioned(text, account_names):
+            return INTENT_OPEN
+
+        intent = self._classify(text, category_names)
+        if intent != INTENT_MONTH_EXPENSES and INCOME_RE.search(text):
+            return INTENT_OPEN
+        return intent
+
+    def _classify(self, text, category_names):
+
+        category_terms = set().union(*(_tokens(name) for name in category_names))
+        vocabulary = self.model.data['v']
+        if any(term not in vocabulary and term not in category_terms for term in _tokens(text)):
+            return INTENT_OPEN
+
+        matched = {intent for intent, pattern in RULES if pattern.search(text)}
+        mentioned = _mentioned(text, category_names)
+        if len(mentioned) > 1:
+            return INTENT_OPEN
+        if mentioned:
+            matched.add(INTENT_CATEGORY)
+        # "gastos" aparece junto das intenções mais específicas
+        if len(matched) > 1:
+            matched.discard(INTENT_MONTH_EXPENSES)
+        if len(matched) == 1:
+            return matched.pop()
+        if matched:
+            # Pergunta composta ("saldo e gastos por categoria"): a IA responde melhor
+            return INTENT_OPEN
+
+        prediction = self.model.predict(_tokens(text), 'CHAT')
+        if prediction is None:
+            return INTENT_OPEN
+        index, confidence = prediction
+        return INTENTS[index] if confidence >= self.min_confidence else INTENT_OPEN
+
+    def answer(self, intent, question, assistant):
+        """Resposta pronta para uma intenção factual, ou None se a IA deve responder (ver FinancialAssistant.local_response)"""
+        context = assistant.get_context_data()
+        if intent == INTENT_BALANCE:
+            return _answer_balance(context)
+        if intent == INTENT_MONTH_EXPENSES:
+            return _answer_month_expenses(context)
+        if intent == INTENT_COMPARISON:
+            return _answer_comparison(context)
+        if intent == INTENT_CATEGORY:
+            return _answer_category(question, context, assistant.expense_category_names())
+        return None
+
+
+def _tokens(text):
+    return {term[:STEM_LENGTH] for term in question_terms(normalize_question(text))}
+
+
+def _mentioned(text, names):
+    """Nomes (de categoria ou conta) citados na pergunta (texto normalizado)"""
+    mentioned = []
+    for name in names:
+        normalized = normalize_question(name)
+        if normalized and re.search(rf'\b{re.escape(normalized)}\b', text):
+            mentioned.append(name)
+    return mentioned
+
+
+def _answer_balance(context):
+    contas = context['contas']
+    if not contas['quantidade']:
+        return "💰 Você ainda não tem contas ativas cadastradas. Cadastre uma conta para eu acompanhar seu saldo."
+
+    lines = [f"💰 Seu saldo total é **{currency(contas['saldo_total'])}** em {_plural(contas['quantidade'], 'conta', 'contas')}:"]
+    for conta in contas['detalhes'][:5]:
+        lines.append(f"- {conta['nome']} ({conta['tipo']}): {currency(conta['saldo'])}")
+    return '\n'.join(lines)
+
+
+def _answer_month_expenses(context):
+    mes = context['mes_atual']
+    if not mes['quantidade_gastos'] and not mes['quantidade_receitas']:
+        return "📊 Você ainda não registrou gastos nem receitas este mês."
+
+    return (
+        f"📊 Este mês você gastou **{currency(mes['gastos'])}** em "
+        f"{_plural(mes['quantidade_gastos'], 'transação', 'transações')} e recebeu "
+        f"{currency(mes['receitas'])}.\n"
+        f"Balanço do mês: {currency(mes['balanco'])}."
+    )
+
+
+def _answer_comparison(context):
+    atual = context['mes_atual']['gastos']
+    anterior = context['mes_anterior']['gastos']
+    if not anterior:
+        return (
+            f"📊 Este mês você gastou {currency(atual)}. "
+            "Não tenho gastos do mês anterior para comparar."
+        )
+
+    variacao = context['comparacao']['variacao_percentual']
+    if variacao > 0:
+        tendencia = f"⚠️ {_percent(variacao)} a mais"
+    elif variacao < 0:
+        tendencia = f"🎯 {_percent(abs(variacao))} a menos"
+    else:
+        tendencia = "o mesmo valor"
+    return (
+        f"📊 Este mês você gastou **{currency(atual)}**, {tendencia} que no mês "
+        f"anterior ({currency(anterior)})."
+    )
+
+
+def _answer_category(question, context, category_names):
+    """
+    Categorias do mês a partir do snapshot (só as 5 maiores); None quando
+    a categoria citada pode estar fora delas e a IA deve responder.
+    """
+    categorias = context['categorias_top_5']
+    citadas = _mentioned(normalize_question(question), category_names)
+
+    if citadas:
+        citada = citadas[0]
+        for categoria in categorias:
+            if categoria['nome'] == citada:
+                return (
+                    f"🎯 Você gastou **{currency(categoria['total'])}** com {citada} este mês: "
+                    f"{_percent(categoria['porcentagem'])} dos seus gastos, em "
+                    f"{_plural(categoria['quantidade_transacoes'], 'transação', 'transações')}."
+                )
+        if len(categorias) == TOP_CATEGORIES:
+            return None
+        return f"🎯 Você não teve gastos com {citada} este mês."
+
+    if not categorias:
+        return "📊 Você ainda não tem gastos categorizados este mês."
+
+    lines = ["📊 Suas maiores categorias de gasto este mês:"]
+    for posicao, categoria in enumerate(categorias[:3], start=1):
+        lines.append(f"{posicao}. {categoria['nome']}: {currency(categoria['total'])} ({_percent(categoria['porcentagem'])})")
+    return '\n'.join(lines)
+
+
+def _percent(value):
+    """12.5 -> '12,5%', 80.0 -> '80%'"""
+    return f"{value:.1f}".rstrip('0').rstrip('.').replace('.', ',') + '%'
+
+
+def _plural(count, singular, plural):
+    return f"{count} {singular if count == 1 else plural}"
+
+
+class RouteMetrics:
+    """Perguntas por intenção neste processo (aberta = enviada à IA)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {intent: 0 for intent in INTENTS}
+
+    def record(self, intent):
+        with self._lock:
+            self.counts[intent] += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = sum(self.counts.values())
+            local = total - self.counts[INTENT_OPEN]
+            return {
+                **self.counts,
+                'local_rate': round(local / total, 3) if total else None,
+            }
+
+
+route_metrics = RouteMetrics()
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router():
+    """Roteador do processo (o modelo é treinado uma vez, na primeira pergunta)"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter()
+    return _router
@@ -0,0 +1,482 @@
+"""
+Cliente LLM compartilhado pelo processo (FinancialAssistant e afins).
+
+Em vez de criar um ``Groq(api_key=...)`` por mensagem, o processo mantém um
+único LLMClient com:
+
+- pool de conexões HTTP keep-alive (httpx), um cliente síncrono e um
+  assíncrono por event loop, reaproveitados entre mensagens;
+- timeouts configuráveis (LLM_TIMEOUT, LLM_CONNECT_TIMEOUT);
+- retentativas com backoff exponencial (e Retry-After) para rate limit,
+  timeouts, falhas de conexão e erros 5xx (LLM_MAX_RETRIES);
+- circuit breaker: após LLM_CIRCUIT_FAILURES falhas seguidas as chamadas
+  falham na hora por LLM_CIRCUIT_RESET segundos, sem esperar o timeout;
+- métricas de latência por chamada (LLMMetrics), expostas em
+  /chat/llm-metrics/ para staff.
+
+Os erros chegam como subclasses de LLMError, sem depender do texto da
+mensagem da API.
+
+LLM_PROVIDER='stub' troca a API por StubProvider (resposta fixa, sem rede),
+para testes e desenvolvimento:
+
+    with override_settings(LLM_PROVIDER='stub', LLM_STUB_REPLY='Olá!'):
+        get_llm_client().complete(messages)
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 8.0
+
+
+class LLMError(Exception):
+    """Falha ao chamar o provedor de LLM"""
+    retryable = False
+
+
+class LLMNotConfigured(LLMError):
+    """Biblioteca ou API key ausentes"""
+
+    def __init__(self, message, hint=''):
+        super().__init__(message)
+        self.hint = hint
+
+
+class LLMAuthError(LLMError):
+    """API key inválida ou sem permissão"""
+
+
+class LLMRateLimited(LLMError):
+    retryable = True
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMTimeout(LLMError):
+    retryable = True
+
+
+class LLMUnavailable(LLMError):
+    """Falha de conexão ou erro 5xx do provedor"""
+    retryable = True
+
+
+class LLMCircuitOpen(LLMError):
+    """Provedor marcado como fora do ar pelo circuit breaker"""
+
+
+class CircuitBreaker:
+    """
+    closed -> open após ``failure_threshold`` falhas seguidas; depois de
+    ``reset_timeout`` segundos deixa passar uma chamada de teste (half-open):
+    sucesso fecha o circuito, falha o abre de novo. Uma chamada de teste que
+    nunca informou o resultado libera outra após ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def _trial_running(self):
+        return self._trial_started is not None and time.monotonic() - self._trial_started < self.reset_timeout
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self._trial_running()):
+                raise LLMCircuitOpen('Provedor de IA indisponível no momento')
+            if state == 'half-open':
+                self._trial_started = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_started = None
+
+    def release(self):
+        """Chamada sem resultado (cancelada): libera a chamada de teste sem mudar o estado"""
+        with self._lock:
+            self._trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_started = None
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LLMMetrics:
+    """Contadores e latências (janela das últimas chamadas) do processo"""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.outcomes = {}
+        self.latencies = deque(maxlen=window)
+        self.first_token = deque(maxlen=window)
+
+    def record(self, outcome, latency, first_token=None):
+        with self._lock:
+            self.calls += 1
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.latencies.append(latency)
+            if first_token is not None:
+                self.first_token.append(first_token)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'outcomes': dict(self.outcomes),
+                'latency_ms': _percentiles(self.latencies),
+                'first_token_ms': _percentiles(self.first_token),
+            }
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+    return {'p50': at(0.5), 'p95': at(0.95), 'max': round(ordered[-1] * 1000, 1), 'samples': len(ordered)}
+
+
+class GroqProvider:
+    """Chamadas à API do Groq com clientes HTTP reaproveitados"""
+    name = 'groq'
+
+    def __init__(self, api_key, base_url=None, timeout=30.0, connect_timeout=5.0, max_connections=20):
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self._sync_client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def check_configured(self):
+        try:
+            import groq  # noqa: F401
+        except ImportError:
+            raise LLMNotConfigured('Biblioteca Groq não instalada', 'Solução: `pip install groq`')
+        if not self.api_key:
+            raise LLMNotConfigured('API Key do Groq não encontrada', 'Adicione `GROQ_API_KEY` no arquivo `.env`')
+
+    def _client_options(self):
+        import httpx
+
+        return {
+            'api_key': self.api_key,
+            'base_url': self.base_url,
+            # Retentativas ficam com o LLMClient (backoff + circuit breaker)
+            'max_retries': 0,
+            'timeout': httpx.Timeout(self.timeout, connect=self.connect_timeout),
+        }
+
+    def _limits(self):
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=60,
+        )
+
+    def sync_client(self):
+        if self._sync_client is None:
+            with self._lock:
+                if self._sync_client is None:
+                    from groq import DefaultHttpxClient, Groq
+
+                    self._sync_client = Groq(
+                        http_client=DefaultHttpxClient(limits=self._limits()),
+                        **self._client_options()
+                    )
+        return self._sync_client
+
+    def async_client(self):
+        # httpx.AsyncClient fica preso ao event loop em que foi criado
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+            client = AsyncGroq(
+                http_client=DefaultAsyncHttpxClient(limits=self._limits()),
+                **self._client_options()
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def complete(self, messages, **options):
+        with _translate_errors():
+            completion = self.sync_client().chat.completions.create(
+                messages=messages, stream=False, **options
+            )
+        return completion.choices[0].message.content or ''
+
+    async def astream(self, messages, **options):
+        with _translate_errors():
+            stream = await self.async_client().chat.completions.create(
+                messages=messages, stream=True, **options
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+
+
+class _translate_errors:
+    """Converte exceções do SDK do Groq nas subclasses de LLMError"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None or isinstance(exc, LLMError) or not isinstance(exc, Exception):
+            return False
+
+        import groq
+
+        if isinstance(exc, groq.APITimeoutError):
+            raise LLMTimeout(str(exc)) from exc
+        if isinstance(exc, groq.APIConnectionError):
+            raise LLMUnavailable(str(exc)) from exc
+        if isinstance(exc, groq.RateLimitError):
+            raise LLMRateLimited(str(exc), _retry_after(exc.response)) from exc
+        if isinstance(exc, (groq.AuthenticationError, groq.PermissionDeniedError)):
+            raise LLMAuthError(str(exc)) from exc
+        if isinstance(exc, groq.APIStatusError) and exc.status_code >= 500:
+            raise LLMUnavailable(str(exc)) from exc
+        if isinstance(exc, groq.GroqError):
+            raise LLMError(str(exc)) from exc
+        return False
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class StubProvider:
+    """
+    Provedor falso, sem rede: responde ``reply`` em trechos de palavras.
+
+    ``failures`` é uma lista de exceções LLMError levantadas (uma por
+    chamada) antes de responder, para exercitar retentativas e o breaker.
+    """
+    name = 'stub'
+
+    def __init__(self, reply='Resposta de teste.', failures=None):
+        self.reply = reply
+        self.failures = list(failures or [])
+        self.calls = []
+
+    def check_configured(self):
+        pass
+
+    def _next_failure(self, messages):
+        self.calls.append(messages)
+        if self.failures:
+            raise self.failures.pop(0)
+
+    def complete(self, messages, **options):
+        self._next_failure(messages)
+        return self.reply
+
+    async def astream(self, messages, **options):
+        self._next_failure(messages)
+        words = self.reply.split(' ')
+        for index, word in enumerate(words):
+            yield word if index == len(words) - 1 else word + ' '
+
+
+class LLMClient:
+    """Aplica timeouts, retentativas, circuit breaker e métricas a um provedor"""
+
+    def __init__(self, provider, max_retries=3, backoff=0.5, breaker=None, metrics=None):
+        self.provider = provider
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or LLMMetrics()
+
+    def check_configured(self):
+        self.provider.check_configured()
+
+    def _delay(self, error, attempt):
+        delay = self.backoff * (2 ** attempt) * (1 + random.random() / 4)
+        if isinstance(error, LLMRateLimited) and error.retry_after:
+            delay = max(delay, error.retry_after)
+        return min(delay, MAX_BACKOFF)
+
+    def _should_retry(self, error, attempt):
+        return error.retryable and attempt < self.max_retries
+
+    def _failed(self, error, started, first_token=None):
+        self.metrics.record(type(error).__name__, time.perf_counter() - started, first_token)
+        if isinstance(error, LLMError) and not error.retryable:
+            # Erros do pedido (auth, 4xx) não indicam provedor fora do ar
+            self.breaker.record_success()
+        else:
+            # Inclui exceções inesperadas (resposta sem choices etc.), que
+            # senão deixariam a chamada de teste do half-open sem resultado
+            self.breaker.record_failure()
+
+    def _before_call(self):
+        try:
+            self.breaker.before_call()
+        except LLMCircuitOpen:
+            self.metrics.record('LLMCircuitOpen', 0.0)
+            raise
+
+    def complete(self, messages, **options):
+        """Resposta completa; levanta LLMError"""
+        self._before_call()
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                reply = self.provider.complete(messages, **options)
+            except LLMError as error:
+                if self._should_retry(error, attempt):
+                    self._log_retry(error, attempt)
+                    time.sleep(self._delay(error, attempt))
+                    attempt += 1
+                    continue
+                self._failed(error, started)
+                raise
+            except Exception as error:
+                self._failed(error, started)
+                raise
+            self.breaker.record_success()
+            self.metrics.record('ok', time.perf_counter() - started)
+            return reply
+
+    async def astream(self, messages, **options):
+        """
+        Trechos da resposta conforme chegam; levanta LLMError.
+
+        Só há retentativa antes do primeiro trecho: depois disso o texto já
+        foi entregue ao usuário.
+        """
+        self._before_call()
+        started = time.perf_counter()
+        first_token = None
+        attempt = 0
+        while True:
+            try:
+                async for delta in self.provider.astream(messages, **options):
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    yield delta
+            except LLMError as error:
+                if first_token is None and self._should_retry(error, attempt):
+                    self._log_retry(error, attempt)
+                    await asyncio.sleep(self._delay(error, attempt))
+                    attempt += 1
+                    continue
+                self._failed(error, started, first_token)
+                raise
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cliente desconectou ou o consumidor parou de ler (limite de tamanho)
+                self.metrics.record('closed', time.perf_counter() - started, first_token)
+                self.breaker.release()
+                raise
+            except Exception as error:
+                self._failed(error, started, first_token)
+                raise
+            self.breaker.record_success()
+            self.metrics.record('ok', time.perf_counter() - started, first_token)
+            return
+
+    def _log_retry(self, error, attempt):
+        self.metrics.record_retry()
+        logger.warning('LLM %s: %s (tentativa %d de %d)', self.provider.name, type(error).__name__, attempt + 1, self.max_retries)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _settings_key():
+    return (
+        getattr(settings, 'LLM_PROVIDER', 'groq'),
+        getattr(settings, 'GROQ_API_KEY', None) or os.environ.get('GROQ_API_KEY', ''),
+        getattr(settings, 'GROQ_BASE_URL', ''),
+        getattr(settings, 'LLM_TIMEOUT', 30.0),
+        getattr(settings, 'LLM_CONNECT_TIMEOUT', 5.0),
+        getattr(settings, 'LLM_MAX_RETRIES', 3),
+        getattr(settings, 'LLM_CIRCUIT_FAILURES', 5),
+        getattr(settings, 'LLM_CIRCUIT_RESET', 30.0),
+        getattr(settings, 'LLM_STUB_REPLY', StubProvider().reply),
+    )
+
+
+def get_llm_client():
+    """
+    LLMClient do processo para a configuração atual.
+
+    A chave inclui os settings relevantes, então override_settings (testes)
+    recebe um cliente próprio em vez de reaproveitar o de produção.
+    """
+    key = _settings_key()
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _build_client(*key)
+                _clients[key] = client
+    return client
+
+
+def _build_client(provider, api_key, base_url, timeout, connect_timeout, max_retries,
+                  circuit_failures, circuit_reset, stub_reply):
+    if provider == 'stub':
+        backend = StubProvider(stub_reply)
+    else:
+        backend = GroqProvider(api_key, base_url, timeout=timeout, connect_timeout=connect_timeout)
+    return LLMClient(
+        backend,
+        max_retries=max_retries,
+        breaker=CircuitBreaker(circuit_failures, circuit_reset),
+    )
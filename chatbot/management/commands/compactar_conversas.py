@@ -0,0 +1,73 @@
+# chatbot/management/commands/compactar_conversas.py
+from django.core.management.base import BaseCommand
+
+from chatbot.retention import (
+    DEFAULT_BATCH_SIZE,
+    compact_conversation,
+    conversations_to_compact,
+    delete_compacted_conversations,
+    purge_expired_cached_responses,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta conversas inativas do chatbot: as mensagens de cada conversa '
+        'viram uma única mensagem de resumo. Também remove respostas em cache '
+        'vencidas e, com --apagar-apos-dias, apaga conversas compactadas antigas. '
+        'Processa no máximo --limite conversas por execução; pode rodar via cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=30,
+            help='Compacta conversas inativas sem atividade há mais de N dias (padrão: 30)'
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=500,
+            help='Máximo de conversas compactadas/apagadas por execução (padrão: 500)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Registros apagados por comando DELETE (padrão: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--apagar-apos-dias',
+            type=int,
+            default=None,
+            help='Apaga de vez conversas compactadas sem atividade há mais de N dias (padrão: nunca)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas mostra quantas conversas seriam compactadas'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pendentes = conversations_to_compact(options['dias'], options['limite'])
+
+        if options['dry_run']:
+            self.stdout.write(f'🔍 {len(pendentes)} conversa(s) seriam compactadas.')
+            return
+
+        self.stdout.write(f'Compactando {len(pendentes)} conversa(s)...')
+        mensagens = 0
+        for conversation_id in pendentes:
+            mensagens += compact_conversation(conversation_id, batch_size)
+        self.stdout.write(f'  ✓ {mensagens} mensagem(ns) substituída(s) por resumos')
+
+        if options['apagar_apos_dias'] is not None:
+            apagadas = delete_compacted_conversations(options['apagar_apos_dias'], options['limite'], batch_size)
+            self.stdout.write(f'  ✓ {apagadas} conversa(s) compactada(s) apagada(s)')
+
+        respostas = purge_expired_cached_responses(batch_size)
+        self.stdout.write(f'  ✓ {respostas} resposta(s) em cache vencida(s) removida(s)')
+
+        self.stdout.write(self.style.SUCCESS('✅ Retenção do chatbot concluída!'))
@@ -0,0 +1,123 @@
+# chatbot/management/commands/fake_llm_server.py
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_REPLY = (
+    '💰 Resposta de teste do servidor LLM local. Seus dados financeiros '
+    'foram recebidos e esta mensagem chega em trechos, como na API real.'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Sobe um servidor local compatível com a API de chat do Groq/OpenAI '
+        '(POST /openai/v1/chat/completions, com e sem stream) que responde um '
+        'texto fixo palavra a palavra. Para usar no chatbot em desenvolvimento '
+        'e testes: GROQ_BASE_URL=http://127.0.0.1:8765 e qualquer GROQ_API_KEY.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0.05, help='Segundos entre trechos do stream')
+        parser.add_argument('--reply', default=DEFAULT_REPLY, help='Texto da resposta')
+        parser.add_argument('--status', type=int, default=200, help='Status HTTP (ex.: 429, 503 para simular falhas)')
+
+    def handle(self, *args, **options):
+        handler = type('FakeLLMHandler', (FakeLLMHandler,), {
+            'reply': options['reply'],
+            'delay': options['delay'],
+            'status': options['status'],
+        })
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        self.stdout.write(self.style.SUCCESS(
+            f'🤖 Servidor LLM falso em http://{options["host"]}:{options["port"]} (Ctrl+C para sair)'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    reply = DEFAULT_REPLY
+    delay = 0.0
+    status = 200
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            payload = {}
+
+        if not self.path.endswith('/chat/completions'):
+            return self._send_json(404, {'error': {'message': 'not found'}})
+        if self.status != 200:
+            return self._send_json(self.status, {'error': {'message': f'fake error {self.status}'}})
+
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:12]}'
+        model = payload.get('model', 'fake')
+        if payload.get('stream'):
+            return self._stream(completion_id, model)
+
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.reply},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        })
+
+    def _stream(self, completion_id, model):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        words = self.reply.split(' ')
+        for index, word in enumerate(words):
+            content = word if index == len(words) - 1 else word + ' '
+            self._event(self._chunk(completion_id, model, {'content': content}, None))
+            time.sleep(self.delay)
+        self._event(self._chunk(completion_id, model, {}, 'stop'))
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _chunk(self, completion_id, model, delta, finish_reason):
+        return {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+        }
+
+    def _event(self, data):
+        self.wfile.write(f'data: {json.dumps(data, ensure_ascii=False)}\n\n'.encode())
+        self.wfile.flush()
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
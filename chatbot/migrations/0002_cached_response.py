@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_hash', models.CharField(max_length=40, verbose_name='Hash da pergunta')),
+                ('question', models.TextField(verbose_name='Pergunta normalizada')),
+                ('data_version', models.CharField(max_length=40, verbose_name='Versão dos dados')),
+                ('response', models.TextField(verbose_name='Resposta')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Acertos')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True, verbose_name='Último acerto')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cached_responses', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Resposta em cache',
+                'verbose_name_plural': 'Respostas em cache',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='chatbot_cac_user_id_e795b1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'data_version', 'question_hash'), name='unique_cached_response')],
+            },
+        ),
+    ]
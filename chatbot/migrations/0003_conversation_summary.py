@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_cached_response'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='summary',
+            field=models.TextField(blank=True, default='', verbose_name='Resumo'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='summary_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Resumo até'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_conversation_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='compacted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Compactada em'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(condition=models.Q(('compacted_at__isnull', True), ('is_active', False)), fields=['updated_at'], name='chat_conv_pending_compaction'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_conversation_compaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='cachedresponse',
+            name='unique_cached_response',
+        ),
+        migrations.AddField(
+            model_name='cachedresponse',
+            name='history_hash',
+            field=models.CharField(blank=True, default='', max_length=40, verbose_name='Hash do histórico'),
+        ),
+        migrations.AddConstraint(
+            model_name='cachedresponse',
+            constraint=models.UniqueConstraint(fields=('user', 'data_version', 'history_hash', 'question_hash'), name='unique_cached_response'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -28,6 +29,21 @@ class Conversation(models.Model):
         default=True,
         verbose_name='Ativa'
     )
+    summary = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='Resumo'
+    )
+    summary_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Resumo até'
+    )
+    compacted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Compactada em'
+    )
 
     class Meta:
         verbose_name = 'Conversa'
@@ -35,11 +51,30 @@ class Conversation(models.Model):
         ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['user', '-updated_at']),
+            # Conversas inativas ainda não compactadas (chatbot/retention.py)
+            models.Index(
+                fields=['updated_at'],
+                name='chat_conv_pending_compaction',
+                condition=models.Q(is_active=False, compacted_at__isnull=True)
+            ),
         ]
 
     def __str__(self):
         return f'{self.user.email} - {self.title}'
 
+    @classmethod
+    def touch(cls, conversation_id, user, when=None):
+        """
+        Atualiza apenas updated_at (UPDATE de uma coluna, sem carregar a conversa).
+
+        Retorna False se a conversa não existe mais ou foi desativada.
+        """
+        return cls.objects.filter(
+            pk=conversation_id,
+            user=user,
+            is_active=True
+        ).update(updated_at=when or timezone.now()) > 0
+
 
 class Message(models.Model):
     class MessageType(models.TextChoices):
@@ -82,3 +117,90 @@ class Message(models.Model):
 
     def __str__(self):
         return f'{self.get_message_type_display()}: {self.content[:50]}'
+
+    @classmethod
+    def history(cls, conversation_id, limit=10):
+        """
+        Últimas ``limit`` mensagens da conversa, da mais antiga para a mais nova
+        (dicts com role, content e created_at).
+
+        Lê o índice (conversation, created_at) de trás para frente: o custo
+        não depende do tamanho da conversa.
+        """
+        recent = cls.objects.filter(
+            conversation_id=conversation_id
+        ).order_by('-created_at').values_list('message_type', 'content', 'created_at')[:limit]
+        return [
+            {
+                'role': 'user' if message_type == cls.MessageType.USER else 'assistant',
+                'content': content,
+                'created_at': created_at
+            }
+            for message_type, content, created_at in reversed(list(recent))
+        ]
+
+
+class CachedResponse(models.Model):
+    """
+    Resposta da IA reaproveitável (ver chatbot/response_cache.py).
+
+    Válida apenas para a mesma pergunta normalizada, os mesmos dados
+    financeiros (``data_version`` é o hash do snapshot enviado à IA) e, para
+    seguimentos da conversa, o mesmo histórico recente (``history_hash``,
+    vazio nas demais perguntas).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cached_responses',
+        verbose_name='Usuário'
+    )
+    question_hash = models.CharField(
+        max_length=40,
+        verbose_name='Hash da pergunta'
+    )
+    question = models.TextField(
+        verbose_name='Pergunta normalizada'
+    )
+    data_version = models.CharField(
+        max_length=40,
+        verbose_name='Versão dos dados'
+    )
+    history_hash = models.CharField(
+        max_length=40,
+        blank=True,
+        default='',
+        verbose_name='Hash do histórico'
+    )
+    response = models.TextField(
+        verbose_name='Resposta'
+    )
+    hits = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Acertos'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Criado em'
+    )
+    last_hit_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Último acerto'
+    )
+
+    class Meta:
+        verbose_name = 'Resposta em cache'
+        verbose_name_plural = 'Respostas em cache'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'data_version', 'history_hash', 'question_hash'],
+                name='unique_cached_response'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.user.email}: {self.question[:50]}'
@@ -0,0 +1,230 @@
+"""
+Montagem do prompt do chatbot dentro de um orçamento de tokens.
+
+O prompt enviado à IA tem o system prompt, os dados financeiros, o resumo
+da conversa, o histórico recente e a pergunta. PromptBuilder:
+
+- serializa os dados em JSON compacto (sem indentação nem espaços);
+- estima os tokens localmente (estimate_tokens, sem chamar a API) e, se
+  passar de CHAT_PROMPT_TOKEN_BUDGET, corta nesta ordem: mensagens mais
+  antigas do histórico (mantém as 2 últimas), o resumo, o detalhe das
+  contas (mantém as 5 de maior saldo) e o restante do histórico;
+- registra os tokens de cada prompt em prompt_metrics (/chat/llm-metrics/).
+
+As mensagens que saem da janela de histórico não são perdidas: viram um
+resumo curto das perguntas anteriores, guardado em Conversation.summary
+(rolling_summary), sem chamada extra à IA.
+
+Exemplo:
+    prompt = PromptBuilder(system_prompt).build(context, pergunta, history, summary)
+    prompt.messages, prompt.tokens
+"""
+import json
+import logging
+import math
+import re
+import threading
+from collections import deque, namedtuple
+
+from django.conf import settings
+
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+# Caracteres de cada mensagem do histórico no prompt
+HISTORY_MESSAGE_CHARS = 100
+
+# Resumo da conversa: perguntas anteriores, encurtadas
+SUMMARY_TOPIC_CHARS = 60
+SUMMARY_MAX_TOPICS = 12
+
+# Contas mantidas quando o detalhe precisa ser cortado
+MIN_ACCOUNT_DETAILS = 5
+
+USER_PROMPT_TEMPLATE = """📊 DADOS FINANCEIROS REAIS (use APENAS estes dados):
+```json
+{context}
+```
+{summary}
+💬 HISTÓRICO RECENTE:
+{history}
+
+❓ PERGUNTA DO USUÁRIO:
+{question}
+
+⚠️ LEMBRE-SE:
+- Use APENAS os dados acima
+- Seja BREVE (3-4 linhas no máximo)
+- Não invente informações
+- Se não tiver dados para responder, seja honesto"""
+
+Prompt = namedtuple('Prompt', ['messages', 'tokens', 'trimmed'])
+
+_PIECE_RE = re.compile(r'\w+|[^\w\s]|\s*\n\s*|\s{2,}')
+
+
+def estimate_tokens(text):
+    """
+    Estimativa local de tokens (tokenizadores BPE como o do Llama).
+
+    Cada palavra vale um token a cada 4 caracteres, cada símbolo
+    (pontuação, emoji) vale um e cada quebra de linha ou sequência de
+    espaços (indentação) vale um; o espaço simples entre palavras não
+    conta. Erra para mais em texto comum, o lado seguro para um orçamento.
+    """
+    total = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece[0].isalnum() or piece[0] == '_':
+            total += math.ceil(len(piece) / 4)
+        elif piece.isspace():
+            total += 1
+        else:
+            total += len(piece)
+    return total
+
+
+def compact_json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class PromptBuilder:
+    """Monta as mensagens (system + user) respeitando o orçamento de tokens"""
+
+    def __init__(self, system_prompt, budget=None):
+        self.system_prompt = system_prompt
+        self.budget = budget or getattr(settings, 'CHAT_PROMPT_TOKEN_BUDGET', 2000)
+
+    def build(self, context, question, history=(), summary=''):
+        history = list(history)
+        trimmed = []
+        system_tokens = estimate_tokens(self.system_prompt)
+
+        while True:
+            user_prompt = self._render(context, question, history, summary)
+            tokens = system_tokens + estimate_tokens(user_prompt)
+            if tokens <= self.budget:
+                break
+
+            if len(history) > 2:
+                history = history[1:]
+                step = 'history'
+            elif summary:
+                summary = ''
+                step = 'summary'
+            elif len(context['contas']['detalhes']) > MIN_ACCOUNT_DETAILS:
+                context = _with_top_accounts(context, MIN_ACCOUNT_DETAILS)
+                step = 'accounts'
+            elif history:
+                history = []
+                step = 'history'
+            else:
+                logger.warning('Prompt com %d tokens acima do orçamento de %d', tokens, self.budget)
+                break
+            if step not in trimmed:
+                trimmed.append(step)
+
+        prompt_metrics.record(tokens, trimmed)
+        messages = [
+            {'role': 'system', 'content': self.system_prompt},
+            {'role': 'user', 'content': user_prompt},
+        ]
+        return Prompt(messages, tokens, trimmed)
+
+    def _render(self, context, question, history, summary):
+        return USER_PROMPT_TEMPLATE.format(
+            context=compact_json(context),
+            summary=f"\n🧾 RESUMO DA CONVERSA (perguntas anteriores):\n{summary}\n" if summary else '',
+            history=_format_history(history),
+            question=question,
+        )
+
+
+def _format_history(history):
+    """Formata histórico de forma concisa"""
+    if not history:
+        return "Primeira interação com o usuário."
+
+    formatted = []
+    for msg in history:
+        role = "👤 Usuário" if msg['role'] == 'user' else "🤖 Nebue"
+        content = _shorten(msg['content'], HISTORY_MESSAGE_CHARS)
+        formatted.append(f"{role}: {content}")
+    return "\n".join(formatted)
+
+
+def _with_top_accounts(context, limit):
+    """Cópia do contexto só com as ``limit`` contas de maior saldo (o total continua valendo)"""
+    contas = dict(context['contas'])
+    contas['detalhes'] = sorted(contas['detalhes'], key=lambda conta: conta['saldo'], reverse=True)[:limit]
+    contas['detalhes_omitidos'] = contas['quantidade'] - limit
+    return {**context, 'contas': contas}
+
+
+def _shorten(text, limit):
+    text = ' '.join(text.split())
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def rolling_summary(conversation_id, history):
+    """
+    Resumo das perguntas que já saíram da janela de histórico.
+
+    ``history`` é a janela atual (Message.history). As perguntas anteriores
+    a ela que ainda não estão no resumo são acrescentadas e o resumo é
+    gravado na conversa; mantém só as SUMMARY_MAX_TOPICS mais recentes.
+    """
+    conversation = Conversation.objects.filter(pk=conversation_id).values('summary', 'summary_until').first()
+    if conversation is None:
+        return ''
+    summary = conversation['summary']
+    if not history:
+        return summary
+
+    dropped = Message.objects.filter(
+        conversation_id=conversation_id,
+        message_type=Message.MessageType.USER,
+        created_at__lt=history[0]['created_at']
+    )
+    if conversation['summary_until']:
+        dropped = dropped.filter(created_at__gt=conversation['summary_until'])
+    dropped = list(dropped.order_by('-created_at').values_list('content', 'created_at')[:SUMMARY_MAX_TOPICS])
+    if not dropped:
+        return summary
+
+    topics = [topic for topic in summary.split('\n') if topic]
+    topics.extend(f"- {_shorten(content, SUMMARY_TOPIC_CHARS)}" for content, _ in reversed(dropped))
+    summary = '\n'.join(topics[-SUMMARY_MAX_TOPICS:])
+    Conversation.objects.filter(pk=conversation_id).update(summary=summary, summary_until=dropped[0][1])
+    return summary
+
+
+class PromptMetrics:
+    """Tokens estimados dos prompts enviados por este processo"""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self.tokens = deque(maxlen=window)
+        self.trimmed = 0
+
+    def record(self, tokens, trimmed):
+        with self._lock:
+            self.tokens.append(tokens)
+            if trimmed:
+                self.trimmed += 1
+
+    def snapshot(self):
+        with self._lock:
+            if not self.tokens:
+                return None
+            ordered = sorted(self.tokens)
+            return {
+                'p50': ordered[len(ordered) // 2],
+                'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                'max': ordered[-1],
+                'samples': len(ordered),
+                'trimmed': self.trimmed,
+            }
+
+
+prompt_metrics = PromptMetrics()
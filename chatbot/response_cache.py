@@ -0,0 +1,233 @@
+"""
+Cache de respostas da IA para perguntas repetidas.
+
+"Quanto gastei este mês?" feita duas vezes com os mesmos dados financeiros
+tem a mesma resposta, então a segunda não precisa ir ao provedor. A chave
+é a pergunta normalizada (minúsculas, sem acentos nem pontuação) mais a
+versão dos dados: o hash do snapshot financeiro enviado à IA. Qualquer
+transação nova (ou a virada do dia) muda o snapshot e, com ele, a versão;
+as respostas antigas deixam de valer sem precisar de invalidação.
+
+Além da pergunta idêntica, perguntas quase iguais ("quanto eu gastei esse
+mês" x "quanto gastei este mês") são comparadas pelas palavras relevantes
+(Jaccard sobre os termos sem stopwords), a partir de CHAT_CACHE_SIMILARITY.
+
+Configuração (settings):
+    CHAT_CACHE_TTL          segundos de validade; 0 desliga o cache
+    CHAT_CACHE_MAX_ENTRIES  respostas guardadas por usuário
+    CHAT_CACHE_SIMILARITY   similaridade mínima (0 a 1); 0 desliga a
+                            busca por perguntas parecidas
+
+Seguimentos ("por quê?", "sim", "explique melhor isso") dependem da
+conversa, então para eles o hash das mensagens recentes
+(``history_version``) também entra na chave: só reaproveitam a resposta
+dada depois do mesmo histórico e ficam fora da busca por perguntas
+parecidas. Perguntas completas ("quanto gastei com mercado este mês?")
+têm a mesma resposta em qualquer conversa e são guardadas sem o
+histórico, senão cada mensagem nova da conversa mudaria a chave e o cache
+quase nunca acertaria (ver ``depends_on_history``).
+
+Exemplo:
+    cache = ResponseCache(user, context)
+    reply = cache.lookup(pergunta, historico)
+    if reply is None:
+        reply = ...
+        cache.store(pergunta, reply, historico)
+"""
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CachedResponse
+
+# Perguntas parecidas comparadas por lookup (as mais recentes do usuário)
+SIMILARITY_CANDIDATES = 50
+
+STOPWORDS = frozenset('''
+    a o as os um uma uns umas de do da dos das em no na nos nas ao aos
+    e ou que qual quais quanto quanta quantos quantas como onde quando
+    eu me meu minha meus minhas mim voce vc seu sua seus suas
+    por para pra pro com sem se ja ai la
+    este esta estes estas esse essa esses essas isso isto aquele aquela
+    foi ser sao tem ter tenho estou to ta tou
+    diga diz mostra mostre fala fale sabe saber favor pf pfv
+    oi ola ne entao
+'''.split())
+
+# Seguimentos: começam retomando a resposta anterior ou apontam para ela
+FOLLOW_UP_RE = re.compile(
+    r'^(e|mas|entao|sim|nao|ok|certo|beleza)\b|'
+    r'\b(por que|porque|isso|isto|disso|nisso|desse|dessa|deste|desta|'
+    r'ele|ela|eles|elas|dele|dela|explique melhor|mais detalhes|continue|continua)\b'
+)
+
+
+def normalize_question(text):
+    """Minúsculas, sem acentos, pontuação e espaços repetidos"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def question_terms(normalized):
+    """Palavras relevantes de uma pergunta normalizada"""
+    return frozenset(word for word in normalized.split() if word not in STOPWORDS)
+
+
+def similarity(terms, other):
+    if not terms or not other:
+        return 0.0
+    return len(terms & other) / len(terms | other)
+
+
+def data_version(context):
+    """Hash estável dos dados financeiros enviados à IA"""
+    payload = json.dumps(context, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def depends_on_history(normalized):
+    """Se a pergunta normalizada só faz sentido dentro da conversa"""
+    return bool(FOLLOW_UP_RE.search(normalized)) or len(question_terms(normalized)) < 2
+
+
+def history_version(history):
+    """Hash das mensagens recentes (papel e texto); '' sem histórico"""
+    if not history:
+        return ''
+    payload = json.dumps([[message['role'], message['content']] for message in history], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class CacheMetrics:
+    """Acertos e falhas do cache neste processo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            hits = self.exact_hits + self.similar_hits
+            return {
+                'lookups': lookups,
+                'exact_hits': self.exact_hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 3) if lookups else None,
+            }
+
+
+cache_metrics = CacheMetrics()
+
+
+class ResponseCache:
+    """Respostas em cache de um usuário para uma versão dos dados financeiros"""
+
+    def __init__(self, user, context):
+        self.user = user
+        self.version = data_version(context)
+        self.ttl = getattr(settings, 'CHAT_CACHE_TTL', 86400)
+        self.max_entries = getattr(settings, 'CHAT_CACHE_MAX_ENTRIES', 200)
+        self.min_similarity = getattr(settings, 'CHAT_CACHE_SIMILARITY', 0.8)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _entries(self):
+        return CachedResponse.objects.filter(
+            user=self.user,
+            data_version=self.version,
+            created_at__gte=timezone.now() - timedelta(seconds=self.ttl)
+        )
+
+    def lookup(self, question, history=None):
+        """Resposta guardada para a pergunta (ou uma parecida; seguimentos: após o mesmo histórico), ou None"""
+        if not self.enabled:
+            return None
+
+        normalized = normalize_question(question)
+        history_hash = _history_key(normalized, history)
+        entry = self._entries().filter(
+            history_hash=history_hash,
+            question_hash=_hash(normalized)
+        ).only('response').first()
+        outcome = 'exact_hits'
+        if entry is None and not history_hash:
+            entry = self._find_similar(normalized)
+            outcome = 'similar_hits'
+        if entry is None:
+            cache_metrics.record('misses')
+            return None
+
+        CachedResponse.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_hit_at=timezone.now())
+        cache_metrics.record(outcome)
+        return entry.response
+
+    def _find_similar(self, normalized):
+        terms = question_terms(normalized)
+        # Uma palavra só ("saldo", "gastos") é vaga demais para comparar
+        if not self.min_similarity or len(terms) < 2:
+            return None
+
+        best, best_score = None, self.min_similarity
+        candidates = self._entries().filter(history_hash='').only(
+            'question', 'response'
+        ).order_by('-created_at')[:SIMILARITY_CANDIDATES]
+        for entry in candidates:
+            score = similarity(terms, question_terms(entry.question))
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def store(self, question, response, history=None):
+        """Guarda a resposta e descarta as expiradas, de dados antigos e as excedentes"""
+        if not self.enabled or not response:
+            return
+
+        normalized = normalize_question(question)
+        try:
+            with transaction.atomic():
+                CachedResponse.objects.update_or_create(
+                    user=self.user,
+                    data_version=self.version,
+                    history_hash=_history_key(normalized, history),
+                    question_hash=_hash(normalized),
+                    defaults={'question': normalized, 'response': response}
+                )
+        except IntegrityError:
+            # Mesma pergunta respondida ao mesmo tempo em outra requisição
+            return
+
+        user_entries = CachedResponse.objects.filter(user=self.user)
+        user_entries.exclude(
+            data_version=self.version,
+            created_at__gte=timezone.now() - timedelta(seconds=self.ttl)
+        ).delete()
+        overflow = list(user_entries.order_by('-created_at').values_list('pk', flat=True)[self.max_entries:])
+        if overflow:
+            CachedResponse.objects.filter(pk__in=overflow).delete()
+
+
+def _history_key(normalized, history):
+    return history_version(history) if depends_on_history(normalized) else ''
+
+
+def _hash(normalized):
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
@@ -0,0 +1,139 @@
+"""
+Retenção das tabelas do chatbot (usada por ``manage.py compactar_conversas``).
+
+ClearConversationView só desativa a conversa; sem limpeza, as mensagens
+de conversas antigas ficam para sempre em chatbot_message. Aqui:
+
+- compact_conversation troca todas as mensagens de uma conversa inativa
+  por uma única Message SYSTEM com o resumo (período, quantidade e as
+  perguntas feitas) e marca ``compacted_at``. As mensagens são apagadas
+  em lotes de ``batch_size`` dentro da mesma transação, então uma falha
+  no meio não deixa a conversa pela metade;
+- delete_compacted_conversations apaga de vez conversas compactadas há
+  muito tempo (opcional);
+- purge_expired_cached_responses remove respostas em cache vencidas
+  (ver chatbot/response_cache.py), que só seriam limpas quando o mesmo
+  usuário fizesse outra pergunta.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import CachedResponse, Conversation, Message
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Perguntas listadas no resumo de uma conversa compactada
+COMPACTED_MAX_TOPICS = 20
+COMPACTED_TOPIC_CHARS = 80
+
+
+def conversations_to_compact(inactive_days, limit):
+    """Ids das conversas inativas, sem atividade há ``inactive_days`` dias, mais antigas primeiro"""
+    cutoff = timezone.now() - timedelta(days=inactive_days)
+    return list(Conversation.objects.filter(
+        is_active=False,
+        compacted_at__isnull=True,
+        updated_at__lt=cutoff
+    ).order_by('updated_at').values_list('pk', flat=True)[:limit])
+
+
+def compact_conversation(conversation_id, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Substitui as mensagens da conversa por uma mensagem de resumo.
+
+    Retorna quantas mensagens foram apagadas (0 se já estava compactada).
+    """
+    with transaction.atomic():
+        conversation = Conversation.objects.select_for_update().filter(
+            pk=conversation_id,
+            compacted_at__isnull=True
+        ).first()
+        if conversation is None:
+            return 0
+
+        messages = Message.objects.filter(conversation_id=conversation_id)
+        stats = messages.aggregate(first=Min('created_at'), last=Max('created_at'))
+        count = messages.count()
+
+        summary = Message.objects.create(
+            conversation_id=conversation_id,
+            message_type=Message.MessageType.SYSTEM,
+            content=_compacted_summary(conversation, count, stats['first'], stats['last']),
+            metadata={
+                'compacted': True,
+                'messages': count,
+                'first_message_at': stats['first'].isoformat() if stats['first'] else None,
+                'last_message_at': stats['last'].isoformat() if stats['last'] else None,
+            }
+        )
+
+        deleted = 0
+        while True:
+            batch = list(messages.exclude(pk=summary.pk).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            deleted += Message.objects.filter(pk__in=batch).delete()[0]
+
+        # update() para não mexer em updated_at (auto_now): é a idade da conversa
+        Conversation.objects.filter(pk=conversation_id).update(compacted_at=timezone.now())
+    return deleted
+
+
+def _compacted_summary(conversation, count, first, last):
+    questions = list(Message.objects.filter(
+        conversation_id=conversation.pk,
+        message_type=Message.MessageType.USER
+    ).order_by('-created_at').values_list('content', flat=True)[:COMPACTED_MAX_TOPICS])
+
+    lines = [f"🗂️ Conversa compactada: {count} mensagem(ns)"]
+    if first and last:
+        lines[0] += f" de {first:%d/%m/%Y} a {last:%d/%m/%Y}"
+    lines[0] += "."
+    if questions or conversation.summary:
+        lines.append("Perguntas do usuário:")
+    # Perguntas mais antigas que saíram do histórico já estão no resumo da conversa
+    if conversation.summary:
+        lines.append(conversation.summary)
+    lines.extend(f"- {_shorten(question)}" for question in reversed(questions))
+    return "\n".join(lines)
+
+
+def _shorten(text):
+    text = ' '.join(text.split())
+    return text[:COMPACTED_TOPIC_CHARS] + "..." if len(text) > COMPACTED_TOPIC_CHARS else text
+
+
+def delete_compacted_conversations(older_than_days, limit, batch_size=DEFAULT_BATCH_SIZE):
+    """Apaga conversas compactadas sem atividade há ``older_than_days`` dias; retorna quantas"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    ids = list(Conversation.objects.filter(
+        compacted_at__isnull=False,
+        updated_at__lt=cutoff
+    ).order_by('updated_at').values_list('pk', flat=True)[:limit])
+
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        with transaction.atomic():
+            Message.objects.filter(conversation_id__in=chunk).delete()
+            deleted += Conversation.objects.filter(pk__in=chunk).delete()[0]
+    return deleted
+
+
+def purge_expired_cached_responses(batch_size=DEFAULT_BATCH_SIZE):
+    """Remove respostas em cache mais velhas que CHAT_CACHE_TTL; retorna quantas"""
+    ttl = getattr(settings, 'CHAT_CACHE_TTL', 86400)
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    expired = CachedResponse.objects.filter(created_at__lt=cutoff)
+
+    deleted = 0
+    while True:
+        batch = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        deleted += CachedResponse.objects.filter(pk__in=batch).delete()[0]
+    return deleted
@@ -1 +1,546 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from decimal import Decimal
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Account
+from transactions.models import Transaction
+
+from .ai_assistant import FinancialAssistant
+from .intents import (
+    INTENT_BALANCE,
+    INTENT_CATEGORY,
+    INTENT_COMPARISON,
+    INTENT_MONTH_EXPENSES,
+    INTENT_OPEN,
+    get_intent_router,
+)
+from .llm import (
+    CircuitBreaker,
+    GroqProvider,
+    LLMAuthError,
+    LLMCircuitOpen,
+    LLMClient,
+    LLMUnavailable,
+    StubProvider,
+    get_llm_client,
+)
+from .management.commands.fake_llm_server import FakeLLMHandler
+from .models import CachedResponse, Conversation, Message
+from .prompt import SUMMARY_MAX_TOPICS, PromptBuilder, rolling_summary
+from .response_cache import ResponseCache, cache_metrics
+from .retention import (
+    compact_conversation,
+    conversations_to_compact,
+    purge_expired_cached_responses,
+)
+
+
+class ServidorLLMFalso:
+    """fake_llm_server numa thread, numa porta livre"""
+
+    def __init__(self, reply='Olá do servidor falso.', status=200):
+        handler = type('Handler', (FakeLLMHandler,), {'reply': reply, 'status': status})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, payload, path='/openai/v1/chat/completions'):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json'}
+        )
+        return urllib.request.urlopen(request, timeout=5)
+
+
+class ServidorLLMFalsoTests(TestCase):
+    def test_resposta_completa(self):
+        with ServidorLLMFalso() as servidor:
+            with servidor.post({'model': 'x', 'messages': []}) as resposta:
+                dados = json.load(resposta)
+
+        self.assertEqual(dados['choices'][0]['message']['content'], 'Olá do servidor falso.')
+
+    def test_stream_em_trechos(self):
+        with ServidorLLMFalso() as servidor:
+            with servidor.post({'model': 'x', 'messages': [], 'stream': True}) as resposta:
+                self.assertEqual(resposta.headers['Content-Type'], 'text/event-stream')
+                eventos = [linha[6:] for linha in resposta.read().decode().splitlines() if linha.startswith('data: ')]
+
+        self.assertEqual(eventos[-1], '[DONE]')
+        trechos = [json.loads(evento)['choices'][0]['delta'].get('content', '') for evento in eventos[:-1]]
+        self.assertEqual(trechos, ['Olá ', 'do ', 'servidor ', 'falso.', ''])
+
+    def test_status_de_erro(self):
+        with ServidorLLMFalso(status=503) as servidor:
+            with self.assertRaises(urllib.error.HTTPError) as erro:
+                servidor.post({'model': 'x', 'messages': []})
+
+        self.assertEqual(erro.exception.code, 503)
+
+
+class StreamMessageViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='chat@teste.com', password='x')
+
+    async def test_stream_repassa_trechos_e_salva_resposta(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+
+        with ServidorLLMFalso(reply='Guarde dez por cento.') as servidor:
+            with override_settings(LLM_PROVIDER='groq', GROQ_API_KEY='teste', GROQ_BASE_URL=servidor.url,
+                                   LLM_MAX_RETRIES=0):
+                response = await client.post(
+                    reverse('chatbot:stream_message'),
+                    json.dumps({'message': 'Como posso economizar mais?'}),
+                    content_type='application/json'
+                )
+                corpo = b''.join([trecho async for trecho in response.streaming_content]).decode()
+
+        eventos = [linha[7:] for linha in corpo.splitlines() if linha.startswith('event: ')]
+        self.assertEqual(eventos[0], 'start')
+        self.assertIn('token', eventos)
+        self.assertEqual(eventos[-1], 'done')
+        self.assertNotIn('error', eventos)
+
+        ultima = await Message.objects.filter(message_type=Message.MessageType.ASSISTANT).alast()
+        self.assertIn('Guarde dez por cento.', ultima.content)
+
+
+class ProvedorMalformado(StubProvider):
+    """Provedor cuja resposta não tem choices (IndexError fora de LLMError)"""
+
+    def complete(self, messages, **options):
+        self.calls.append(messages)
+        return [][0]
+
+
+class LLMClientTests(TestCase):
+    def _cliente(self, provider, falhas=2):
+        return LLMClient(provider, max_retries=2, backoff=0, breaker=CircuitBreaker(falhas, reset_timeout=60))
+
+    def _reabrir(self, cliente):
+        # Simula a passagem do reset_timeout
+        cliente.breaker.opened_at -= cliente.breaker.reset_timeout
+
+    def test_retenta_falhas_temporarias(self):
+        provider = StubProvider('ok', failures=[LLMUnavailable('503'), LLMUnavailable('503')])
+        cliente = self._cliente(provider)
+
+        self.assertEqual(cliente.complete([]), 'ok')
+        self.assertEqual(len(provider.calls), 3)
+        self.assertEqual(cliente.metrics.snapshot()['retries'], 2)
+        self.assertEqual(cliente.breaker.state, 'closed')
+
+    def test_erro_do_pedido_nao_abre_o_circuito(self):
+        cliente = self._cliente(StubProvider(failures=[LLMAuthError('401')] * 3), falhas=1)
+
+        with self.assertRaises(LLMAuthError):
+            cliente.complete([])
+        self.assertEqual(cliente.breaker.state, 'closed')
+
+    def test_circuito_abre_e_fecha_na_chamada_de_teste(self):
+        provider = StubProvider('ok', failures=[LLMUnavailable('503')] * 6)
+        cliente = self._cliente(provider)
+
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailable):
+                cliente.complete([])
+        with self.assertRaises(LLMCircuitOpen):
+            cliente.complete([])
+        self.assertEqual(len(provider.calls), 6)
+
+        self._reabrir(cliente)
+        self.assertEqual(cliente.complete([]), 'ok')
+        self.assertEqual(cliente.breaker.state, 'closed')
+
+    def test_excecao_inesperada_na_chamada_de_teste_nao_trava_o_circuito(self):
+        provider = ProvedorMalformado()
+        cliente = self._cliente(provider, falhas=1)
+
+        with self.assertRaises(IndexError):
+            cliente.complete([])
+        self.assertEqual(cliente.breaker.state, 'open')
+
+        self._reabrir(cliente)
+        with self.assertRaises(IndexError):
+            cliente.complete([])
+        self.assertEqual(cliente.breaker.state, 'open')
+
+        # A chamada de teste registrou a falha: a próxima janela testa de novo
+        cliente.provider = StubProvider('ok')
+        self._reabrir(cliente)
+        self.assertEqual(cliente.complete([]), 'ok')
+
+    def test_chamada_de_teste_sem_resultado_libera_outra(self):
+        cliente = self._cliente(StubProvider('ok'), falhas=1)
+        cliente.breaker.record_failure()
+        self._reabrir(cliente)
+        cliente.breaker.before_call()
+
+        with self.assertRaises(LLMCircuitOpen):
+            cliente.complete([])
+        cliente.breaker._trial_started -= cliente.breaker.reset_timeout
+        self.assertEqual(cliente.complete([]), 'ok')
+
+    def test_stream_cancelado_na_chamada_de_teste_nao_fecha_o_circuito(self):
+        cliente = self._cliente(StubProvider('um dois três'), falhas=1)
+        cliente.breaker.record_failure()
+        self._reabrir(cliente)
+
+        async def ler_um_trecho():
+            stream = cliente.astream([])
+            trecho = await stream.__anext__()
+            await stream.aclose()
+            return trecho
+
+        self.assertEqual(asyncio.run(ler_um_trecho()), 'um ')
+        self.assertEqual(cliente.breaker.state, 'half-open')
+        self.assertEqual(cliente.breaker.failures, 1)
+        # A vaga de teste foi liberada: a próxima chamada decide
+        self.assertEqual(cliente.complete([]), 'um dois três')
+        self.assertEqual(cliente.breaker.state, 'closed')
+
+    def test_stream_do_stub(self):
+        cliente = self._cliente(StubProvider('Olá de novo'))
+
+        async def ler():
+            return [trecho async for trecho in cliente.astream([])]
+
+        self.assertEqual(asyncio.run(ler()), ['Olá ', 'de ', 'novo'])
+
+    @override_settings(LLM_PROVIDER='stub', LLM_STUB_REPLY='Olá!')
+    def test_provider_stub_pelos_settings(self):
+        cliente = get_llm_client()
+
+        self.assertIsInstance(cliente.provider, StubProvider)
+        self.assertEqual(cliente.complete([{'role': 'user', 'content': 'oi'}]), 'Olá!')
+        self.assertIs(get_llm_client(), cliente)
+
+    def test_groq_5xx_vira_llm_unavailable(self):
+        with ServidorLLMFalso(status=503) as servidor:
+            cliente = self._cliente(GroqProvider('teste', servidor.url, timeout=5), falhas=1)
+            with self.assertRaises(LLMUnavailable):
+                cliente.complete([{'role': 'user', 'content': 'oi'}], model='x')
+
+        self.assertEqual(cliente.metrics.snapshot()['retries'], 2)
+        self.assertEqual(cliente.breaker.state, 'open')
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='cache@teste.com', password='x')
+        self.cache = ResponseCache(self.user, {'saldo': '100.00'})
+
+    def _historico(self, pergunta, resposta):
+        return [{'role': 'user', 'content': pergunta}, {'role': 'assistant', 'content': resposta}]
+
+    def test_pergunta_sem_historico_reaproveitada(self):
+        self.cache.store('Quanto gastei este mês?', 'R$ 100,00')
+
+        self.assertEqual(self.cache.lookup('quanto gastei este mes'), 'R$ 100,00')
+        self.assertEqual(self.cache.lookup('quanto eu gastei esse mês'), 'R$ 100,00')
+
+    def test_seguimento_depende_do_historico(self):
+        investir = self._historico('Devo investir?', 'Sim, com reserva.')
+        cortar = self._historico('Devo cortar lazer?', 'Não, está no orçamento.')
+        self.cache.store('Por quê?', 'Porque a reserva cobre 6 meses.', investir)
+
+        self.assertIsNone(self.cache.lookup('por quê?', cortar))
+        self.assertIsNone(self.cache.lookup('por quê?'))
+        self.assertEqual(self.cache.lookup('por quê?', investir), 'Porque a reserva cobre 6 meses.')
+
+    def test_pergunta_parecida_ignora_respostas_com_historico(self):
+        self.cache.store(
+            'explique melhor os gastos do mês',
+            'Mercado e aluguel.',
+            self._historico('Resumo?', 'Gastos altos.')
+        )
+
+        self.assertIsNone(self.cache.lookup('explique melhor gastos do mês'))
+
+    def test_pergunta_completa_reaproveitada_em_qualquer_conversa(self):
+        self.cache.store('Quanto gastei com mercado este mês?', 'R$ 300,00', self._historico('Oi', 'Olá!'))
+
+        self.assertEqual(self.cache.lookup('quanto gastei com mercado este mês?'), 'R$ 300,00')
+        self.assertEqual(
+            self.cache.lookup('Quanto gastei com mercado este mês?', self._historico('Saldo?', 'R$ 10,00')),
+            'R$ 300,00'
+        )
+
+    def test_taxa_de_acerto_com_historico_crescente(self):
+        perguntas = ['Quanto gastei com mercado este mês?', 'Qual a fatura do cartão Nubank?']
+        historico = []
+        antes = cache_metrics.snapshot()
+
+        # Mesmas duas perguntas repetidas numa conversa que não para de crescer
+        for rodada in range(5):
+            for pergunta in perguntas:
+                resposta = self.cache.lookup(pergunta, historico)
+                if resposta is None:
+                    resposta = f'Resposta para {pergunta}'
+                    self.cache.store(pergunta, resposta, historico)
+                historico = historico + self._historico(pergunta, resposta)
+
+        depois = cache_metrics.snapshot()
+        acertos = depois['exact_hits'] - antes['exact_hits']
+        consultas = depois['lookups'] - antes['lookups']
+        self.assertEqual((acertos, consultas), (8, 10))
+
+
+class IntentRouterTests(TestCase):
+    CATEGORIAS = ['Alimentação', 'Transporte', 'Lazer']
+    CONTAS = ['Nubank', 'Poupança']
+
+    def _rota(self, pergunta):
+        return get_intent_router().classify(pergunta, self.CATEGORIAS, self.CONTAS)
+
+    def test_perguntas_factuais(self):
+        casos = {
+            'Qual meu saldo?': INTENT_BALANCE,
+            'Quanto gastei este mês?': INTENT_MONTH_EXPENSES,
+            'Quanto recebi este mês?': INTENT_MONTH_EXPENSES,
+            'Gastei mais que no mês passado?': INTENT_COMPARISON,
+            'Quanto foi em alimentação?': INTENT_CATEGORY,
+        }
+        for pergunta, intencao in casos.items():
+            self.assertEqual(self._rota(pergunta), intencao, pergunta)
+
+    def test_perguntas_sem_resposta_pronta_vao_para_a_ia(self):
+        for pergunta in [
+            'Quanto tenho de dívida?',
+            'Quanto estou devendo no cartão?',
+            'Qual minha receita do mês passado?',
+            'Quanto ganhei a mais que no mês anterior?',
+            'Quanto gastei hoje?',
+            'Quanto gastei em janeiro?',
+            'Quanto gastei nos últimos 3 meses?',
+            'Qual o saldo do Nubank?',
+            'Quanto tenho na poupança?',
+            'Qual o valor da fatura?',
+        ]:
+            self.assertEqual(self._rota(pergunta), INTENT_OPEN, pergunta)
+
+
+class RespostaCategoriaTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='categoria@teste.com', password='x')
+        self.account = Account.objects.create(user=self.user, name='Conta', bank_name='Banco')
+
+    def _gasto(self, categoria, valor):
+        Transaction.objects.create(
+            account=self.account,
+            category=self.user.categories.get(name=categoria),
+            transaction_type='EXPENSE',
+            amount=valor,
+            transaction_date=timezone.now().date(),
+            description=categoria
+        )
+
+    def _resposta(self, pergunta):
+        return FinancialAssistant(self.user).local_response(pergunta)
+
+    def test_categoria_citada_vem_do_snapshot(self):
+        self._gasto('Alimentação', Decimal('75.00'))
+        self._gasto('Lazer', Decimal('25.00'))
+
+        with mock.patch.object(FinancialAssistant, '_get_categories_summary') as resumo_ao_vivo:
+            resposta = self._resposta('Quanto foi em alimentação?')
+        resumo_ao_vivo.assert_not_called()
+        self.assertIn('R$ 75,00', resposta)
+        self.assertIn('75%', resposta)
+        self.assertIn('Você não teve gastos com Transporte', self._resposta('Quanto foi em transporte?'))
+
+    def test_categoria_fora_das_cinco_maiores_vai_para_a_ia(self):
+        for valor, categoria in enumerate(['Alimentação', 'Transporte', 'Moradia', 'Saúde', 'Lazer'], start=2):
+            self._gasto(categoria, Decimal(valor))
+
+        self.assertIsNone(self._resposta('Quanto foi em educação?'))
+
+
+class HistoricoTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='historico@teste.com', password='x')
+        self.conversa = Conversation.objects.create(user=self.user)
+        for indice in range(30):
+            Message.objects.create(
+                conversation=self.conversa,
+                message_type=Message.MessageType.USER if indice % 2 == 0 else Message.MessageType.ASSISTANT,
+                content=f'mensagem {indice}'
+            )
+
+    def test_janela_das_ultimas_mensagens_em_ordem(self):
+        with CaptureQueriesContext(connection) as queries:
+            historico = Message.history(self.conversa.pk, 6)
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([m['content'] for m in historico], [f'mensagem {i}' for i in range(24, 30)])
+        self.assertEqual([m['role'] for m in historico[:2]], ['user', 'assistant'])
+
+
+class PromptBuilderTests(TestCase):
+    SYSTEM = 'Você é um assistente financeiro.'
+
+    def setUp(self):
+        self.contexto = {
+            'mes_atual': {'gastos': 100.0},
+            'contas': {
+                'saldo_total': 800.0,
+                'quantidade': 8,
+                'detalhes': [{'nome': f'Conta {i}', 'tipo': 'Corrente', 'saldo': float(i * 100)} for i in range(8)],
+            },
+        }
+        self.historico = [
+            {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'mensagem número {i} ' * 5}
+            for i in range(6)
+        ]
+        self.resumo = '- pergunta antiga sobre orçamento\n- pergunta antiga sobre metas'
+
+    def _tokens(self, historico, resumo, contexto=None):
+        return PromptBuilder(self.SYSTEM, budget=10 ** 6).build(
+            contexto or self.contexto, 'Quanto posso gastar?', historico, resumo
+        ).tokens
+
+    def _montar(self, budget):
+        return PromptBuilder(self.SYSTEM, budget=budget).build(
+            self.contexto, 'Quanto posso gastar?', self.historico, self.resumo
+        )
+
+    def test_dentro_do_orcamento_nada_e_cortado(self):
+        prompt = self._montar(self._tokens(self.historico, self.resumo))
+
+        self.assertEqual(prompt.trimmed, [])
+        self.assertIn('mensagem número 0', prompt.messages[1]['content'])
+
+    def test_corta_primeiro_o_historico_antigo(self):
+        prompt = self._montar(self._tokens(self.historico[-2:], self.resumo))
+
+        texto = prompt.messages[1]['content']
+        self.assertEqual(prompt.trimmed, ['history'])
+        self.assertNotIn('mensagem número 3', texto)
+        self.assertIn('mensagem número 4', texto)
+        self.assertIn('pergunta antiga sobre metas', texto)
+
+    def test_depois_o_resumo(self):
+        prompt = self._montar(self._tokens(self.historico[-2:], ''))
+
+        self.assertEqual(prompt.trimmed, ['history', 'summary'])
+        self.assertNotIn('pergunta antiga', prompt.messages[1]['content'])
+        self.assertIn('Conta 0', prompt.messages[1]['content'])
+
+    def test_depois_as_contas_e_por_fim_todo_o_historico(self):
+        prompt = self._montar(1)
+
+        texto = prompt.messages[1]['content']
+        self.assertEqual(prompt.trimmed, ['history', 'summary', 'accounts'])
+        self.assertIn('"detalhes_omitidos":3', texto)
+        self.assertIn('Conta 7', texto)
+        self.assertNotIn('Conta 2', texto)
+        self.assertIn('Primeira interação', texto)
+        # O contexto original não é alterado
+        self.assertEqual(len(self.contexto['contas']['detalhes']), 8)
+
+
+    def test_resumo_acumula_perguntas_fora_da_janela_uma_vez(self):
+        usuario = get_user_model().objects.create_user(email='resumo@teste.com', password='x')
+        conversa = Conversation.objects.create(user=usuario)
+        for indice in range(32):
+            Message.objects.create(
+                conversation=conversa,
+                message_type=Message.MessageType.USER if indice % 2 == 0 else Message.MessageType.ASSISTANT,
+                content=f'mensagem {indice}'
+            )
+        historico = Message.history(conversa.pk, 6)
+
+        resumo = rolling_summary(conversa.pk, historico)
+        self.assertEqual(rolling_summary(conversa.pk, historico), resumo)
+        topicos = resumo.split('\n')
+        self.assertEqual(len(topicos), SUMMARY_MAX_TOPICS)
+        self.assertEqual(topicos[-1], '- mensagem 24')
+
+        Message.objects.create(conversation=conversa, message_type=Message.MessageType.USER, content='nova')
+        Message.objects.create(conversation=conversa, message_type=Message.MessageType.ASSISTANT, content='ok')
+        topicos = rolling_summary(conversa.pk, Message.history(conversa.pk, 6)).split('\n')
+        self.assertEqual(topicos[-1], '- mensagem 26')
+        self.assertEqual(len(topicos), SUMMARY_MAX_TOPICS)
+
+
+class RetencaoTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='retencao@teste.com', password='x')
+
+    def _conversa(self, mensagens, dias_inativa, ativa=False):
+        conversa = Conversation.objects.create(user=self.user, is_active=ativa)
+        for indice in range(mensagens):
+            Message.objects.create(
+                conversation=conversa,
+                message_type=Message.MessageType.USER if indice % 2 == 0 else Message.MessageType.ASSISTANT,
+                content=f'pergunta {indice}'
+            )
+        Conversation.objects.filter(pk=conversa.pk).update(updated_at=timezone.now() - timedelta(days=dias_inativa))
+        return conversa
+
+    def test_compacta_so_inativas_antigas_e_e_idempotente(self):
+        antiga = self._conversa(7, dias_inativa=40)
+        recente = self._conversa(4, dias_inativa=5)
+        ativa = self._conversa(4, dias_inativa=40, ativa=True)
+
+        self.assertEqual(conversations_to_compact(30, 10), [antiga.pk])
+        self.assertEqual(compact_conversation(antiga.pk, batch_size=2), 7)
+        self.assertEqual(compact_conversation(antiga.pk, batch_size=2), 0)
+
+        resumo = Message.objects.get(conversation=antiga)
+        self.assertEqual(resumo.message_type, Message.MessageType.SYSTEM)
+        self.assertEqual(resumo.metadata['messages'], 7)
+        self.assertIn('- pergunta 6', resumo.content)
+        self.assertEqual(Message.objects.filter(conversation=recente).count(), 4)
+        self.assertEqual(Message.objects.filter(conversation=ativa).count(), 4)
+        self.assertEqual(conversations_to_compact(30, 10), [])
+
+    def test_comando_respeita_o_limite_e_apaga_so_compactadas_antigas(self):
+        conversas = [self._conversa(3, dias_inativa=100 - 5 * i) for i in range(3)]
+
+        call_command('compactar_conversas', '--limite', '2', stdout=io.StringIO())
+        self.assertEqual(Conversation.objects.filter(compacted_at__isnull=False).count(), 2)
+
+        call_command('compactar_conversas', '--limite', '2', '--apagar-apos-dias', '99', stdout=io.StringIO())
+        self.assertEqual(
+            list(Conversation.objects.order_by('pk').values_list('pk', flat=True)),
+            [conversa.pk for conversa in conversas[1:]]
+        )
+        self.assertEqual(Conversation.objects.filter(compacted_at__isnull=True).count(), 0)
+
+    @override_settings(CHAT_CACHE_TTL=3600)
+    def test_remove_so_respostas_em_cache_vencidas(self):
+        cache = ResponseCache(self.user, {'saldo': '1.00'})
+        cache.store('quanto gastei com mercado', 'R$ 1,00')
+        cache.store('quanto gastei com lazer', 'R$ 2,00')
+        CachedResponse.objects.filter(question__contains='lazer').update(
+            created_at=timezone.now() - timedelta(hours=2)
+        )
+
+        self.assertEqual(purge_expired_cached_responses(batch_size=1), 1)
+        self.assertEqual(list(CachedResponse.objects.values_list('question', flat=True)), ['quanto gastei com mercado'])
@@ -2,9 +2,11 @@ from django.urls import path
 from .views import (
     ChatView,
     SendMessageView,
+    StreamMessageView,
     ClearConversationView,
     DeleteConversationView,
-    DeleteMessageView
+    DeleteMessageView,
+    LLMMetricsView
 )
 
 app_name = 'chatbot'
@@ -12,7 +14,9 @@ app_name = 'chatbot'
 urlpatterns = [
     path('', ChatView.as_view(), name='chat'),
     path('send/', SendMessageView.as_view(), name='send_message'),
+    path('stream/', StreamMessageView.as_view(), name='stream_message'),
     path('clear/', ClearConversationView.as_view(), name='clear_conversation'),
     path('conversation/<int:pk>/delete/', DeleteConversationView.as_view(), name='delete_conversation'),
     path('message/<int:pk>/delete/', DeleteMessageView.as_view(), name='delete_message'),
-]
\ No newline at end of file
+    path('llm-metrics/', LLMMetricsView.as_view(), name='llm_metrics'),
+]
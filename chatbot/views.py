@@ -1,7 +1,10 @@
+import asyncio
 import json
-from django.contrib.auth.mixins import LoginRequiredMixin
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import TemplateView
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
@@ -9,6 +12,10 @@ from django.shortcuts import get_object_or_404
 
 from .models import Conversation, Message
 from .ai_assistant import FinancialAssistant
+from .llm import get_llm_client
+from .intents import route_metrics
+from .prompt import prompt_metrics
+from .response_cache import cache_metrics
 
 
 class ChatView(LoginRequiredMixin, TemplateView):
@@ -30,6 +37,7 @@ class ChatView(LoginRequiredMixin, TemplateView):
             )
         
         messages = conversation.messages.all()
+        self.request.session[ACTIVE_CONVERSATION_SESSION_KEY] = conversation.pk
         
         context['conversation'] = conversation
         context['messages'] = messages
@@ -37,6 +45,68 @@ class ChatView(LoginRequiredMixin, TemplateView):
         return context
 
 
+# Sessão: id da conversa ativa, para não buscá-la a cada mensagem
+ACTIVE_CONVERSATION_SESSION_KEY = 'chat_conversation_id'
+
+# Mensagens anteriores enviadas ao FinancialAssistant (as mais antigas viram resumo)
+HISTORY_WINDOW = 6
+
+
+def _get_active_conversation(user):
+    """Busca ou cria a conversa ativa do usuário"""
+    conversation = Conversation.objects.filter(
+        user=user,
+        is_active=True
+    ).first()
+    
+    if not conversation:
+        conversation = Conversation.objects.create(
+            user=user,
+            title='Nova Conversa'
+        )
+    return conversation
+
+
+def _active_conversation_id(request, user):
+    """
+    Id da conversa ativa, guardado na sessão.
+    
+    O id da sessão é validado pelo próprio UPDATE de updated_at (uma
+    consulta, sem carregar a conversa); se ela foi desativada ou apagada
+    (por exemplo em outro dispositivo), busca ou cria a conversa ativa.
+    """
+    conversation_id = request.session.get(ACTIVE_CONVERSATION_SESSION_KEY)
+    if conversation_id and Conversation.touch(conversation_id, user):
+        return conversation_id
+    
+    conversation_id = _get_active_conversation(user).pk
+    request.session[ACTIVE_CONVERSATION_SESSION_KEY] = conversation_id
+    return conversation_id
+
+
+def _save_assistant_message(user, conversation_id, content, prompt_tokens=None):
+    """Salva a resposta do assistente e atualiza o timestamp da conversa"""
+    assistant_msg = Message.objects.create(
+        conversation_id=conversation_id,
+        message_type=Message.MessageType.ASSISTANT,
+        content=content,
+        # Tokens estimados do prompt, quando a resposta veio da IA
+        metadata={'prompt_tokens': prompt_tokens} if prompt_tokens else {}
+    )
+    
+    Conversation.touch(conversation_id, user, when=assistant_msg.created_at)
+    return assistant_msg
+
+
+def _message_payload(message):
+    return {
+        'id': message.id,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+        'type': 'user' if message.message_type == Message.MessageType.USER else 'assistant'
+    }
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class SendMessageView(LoginRequiredMixin, View):
     
@@ -48,63 +118,30 @@ class SendMessageView(LoginRequiredMixin, View):
             if not user_message:
                 return JsonResponse({'error': 'Mensagem vazia'}, status=400)
             
-            # Buscar ou criar conversa ativa
-            conversation = Conversation.objects.filter(
-                user=request.user,
-                is_active=True
-            ).first()
-            
-            if not conversation:
-                conversation = Conversation.objects.create(
-                    user=request.user,
-                    title='Nova Conversa'
-                )
+            # Conversa ativa (id em sessão) e histórico recente, antes da nova pergunta
+            conversation_id = _active_conversation_id(request, request.user)
+            conversation_history = Message.history(conversation_id, HISTORY_WINDOW)
             
             # Salvar mensagem do usuário
             user_msg = Message.objects.create(
-                conversation=conversation,
+                conversation_id=conversation_id,
                 message_type=Message.MessageType.USER,
                 content=user_message
             )
             
-            # Buscar histórico da conversa
-            conversation_history = [
-                {
-                    'role': 'user' if msg.message_type == Message.MessageType.USER else 'assistant',
-                    'content': msg.content
-                }
-                for msg in conversation.messages.all().order_by('created_at')[:10]
-            ]
-            
             # Processar com IA
             assistant = FinancialAssistant(request.user)
-            assistant_response = assistant.process_message(user_message, conversation_history)
+            assistant_response = assistant.process_message(user_message, conversation_history, conversation_id)
             
             # Salvar resposta do assistente
-            assistant_msg = Message.objects.create(
-                conversation=conversation,
-                message_type=Message.MessageType.ASSISTANT,
-                content=assistant_response
+            assistant_msg = _save_assistant_message(
+                request.user, conversation_id, assistant_response, assistant.prompt_tokens
             )
             
-            # Atualizar timestamp da conversa
-            conversation.updated_at = assistant_msg.created_at
-            conversation.save()
-            
             return JsonResponse({
                 'success': True,
-                'user_message': {
-                    'id': user_msg.id,
-                    'content': user_msg.content,
-                    'created_at': user_msg.created_at.isoformat(),
-                    'type': 'user'
-                },
-                'assistant_message': {
-                    'id': assistant_msg.id,
-                    'content': assistant_msg.content,
-                    'created_at': assistant_msg.created_at.isoformat(),
-                    'type': 'assistant'
-                }
+                'user_message': _message_payload(user_msg),
+                'assistant_message': _message_payload(assistant_msg)
             })
             
         except json.JSONDecodeError:
@@ -117,6 +154,105 @@ class SendMessageView(LoginRequiredMixin, View):
             }, status=500)
 
 
+def _sse(event, data):
+    """Formata um evento Server-Sent Events"""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def _prepare_stream(request, user, user_message):
+    """
+    Parte síncrona antes do streaming: salva a pergunta e monta o prompt.
+    
+    ``reply`` já vem preenchido (sem prompt) quando a IA não é necessária:
+    mensagem inválida, pergunta factual ou resposta em cache.
+    """
+    conversation_id = _active_conversation_id(request, user)
+    conversation_history = Message.history(conversation_id, HISTORY_WINDOW)
+    user_msg = Message.objects.create(
+        conversation_id=conversation_id,
+        message_type=Message.MessageType.USER,
+        content=user_message
+    )
+    
+    assistant = FinancialAssistant(user)
+    reply = assistant.quick_response(user_message, conversation_history)
+    messages = None if reply else assistant.build_messages(user_message, conversation_history, conversation_id)
+    return assistant, conversation_id, conversation_history, user_msg, reply, messages
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StreamMessageView(View):
+    """
+    Versão em streaming do SendMessageView (Server-Sent Events).
+    
+    Repassa os trechos da resposta ao navegador conforme o modelo os gera e
+    salva a Message do assistente quando o stream termina. A view é async:
+    rodando sob ASGI (core/asgi.py), uma geração longa não ocupa uma thread
+    do servidor enquanto espera a API.
+    
+    Eventos: ``start`` (mensagem do usuário), ``token`` (trecho da resposta),
+    ``error`` (falha da API) e ``done`` (mensagem do assistente salva).
+    
+    LoginRequiredMixin acessa request.user de forma síncrona, por isso a
+    autenticação é feita com request.auser().
+    """
+    
+    async def post(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'error': 'Não autenticado'}, status=401)
+        
+        try:
+            user_message = json.loads(request.body).get('message', '').strip()
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'JSON inválido'}, status=400)
+        
+        if not user_message:
+            return JsonResponse({'error': 'Mensagem vazia'}, status=400)
+        
+        assistant, conversation_id, history, user_msg, reply, messages = await sync_to_async(_prepare_stream)(
+            request, user, user_message
+        )
+        
+        response = StreamingHttpResponse(
+            self._events(assistant, user, conversation_id, history, user_msg, reply, messages),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Desliga o buffer de proxies (nginx) para os eventos chegarem na hora
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    async def _events(self, assistant, user, conversation_id, history, user_msg, reply, messages):
+        yield _sse('start', {'user_message': _message_payload(user_msg)})
+        
+        parts = []
+        content = reply
+        if content is None:
+            try:
+                async for delta in assistant.stream_completion(messages):
+                    parts.append(delta)
+                    yield _sse('token', {'content': delta})
+                content = assistant.finalize_response(''.join(parts))
+                if parts:
+                    await sync_to_async(assistant.remember_response)(user_msg.content, content, history)
+            except asyncio.CancelledError:
+                # Cliente desconectou: guarda o que já foi gerado
+                if parts:
+                    await asyncio.shield(sync_to_async(_save_assistant_message)(
+                        user, conversation_id, assistant.finalize_response(''.join(parts)), assistant.prompt_tokens
+                    ))
+                raise
+            except Exception as e:
+                content = assistant.error_response(e)
+                yield _sse('error', {'content': content})
+        
+        assistant_msg = await sync_to_async(_save_assistant_message)(
+            user, conversation_id, content, assistant.prompt_tokens
+        )
+        yield _sse('done', {'assistant_message': _message_payload(assistant_msg)})
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ClearConversationView(LoginRequiredMixin, View):
     """Desativa conversa atual e cria uma nova"""
@@ -134,6 +270,7 @@ class ClearConversationView(LoginRequiredMixin, View):
                 user=request.user,
                 title='Nova Conversa'
             )
+            request.session[ACTIVE_CONVERSATION_SESSION_KEY] = new_conversation.pk
             
             return JsonResponse({
                 'success': True,
@@ -202,4 +339,22 @@ class DeleteMessageView(LoginRequiredMixin, View):
         except Exception as e:
             return JsonResponse({
                 'error': str(e)
-            }, status=500)
\ No newline at end of file
+            }, status=500)
+
+
+class LLMMetricsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Métricas do cliente LLM deste processo (latência, retentativas, circuit breaker, cache)"""
+    
+    def test_func(self):
+        return self.request.user.is_staff
+    
+    def get(self, request):
+        client = get_llm_client()
+        return JsonResponse({
+            'provider': client.provider.name,
+            'circuit': client.breaker.state,
+            **client.metrics.snapshot(),
+            'response_cache': cache_metrics.snapshot(),
+            'intents': route_metrics.snapshot(),
+            'prompt_tokens': prompt_metrics.snapshot(),
+        })
@@ -222,6 +222,35 @@ X_FRAME_OPTIONS = 'DENY'
 # Get your free API key at: https://console.groq.com/keys
 GROQ_API_KEY = config('GROQ_API_KEY', default='')
 
+# Optional API base URL (e.g. http://127.0.0.1:8765 for `manage.py fake_llm_server`)
+GROQ_BASE_URL = config('GROQ_BASE_URL', default='')
+
+# LLM client policy (chatbot/llm.py): 'groq' or 'stub' (canned reply, no network)
+LLM_PROVIDER = config('LLM_PROVIDER', default='groq')
+LLM_TIMEOUT = config('LLM_TIMEOUT', default=30.0, cast=float)
+LLM_CONNECT_TIMEOUT = config('LLM_CONNECT_TIMEOUT', default=5.0, cast=float)
+LLM_MAX_RETRIES = config('LLM_MAX_RETRIES', default=3, cast=int)
+# Consecutive failures that open the circuit, and seconds before a new attempt
+LLM_CIRCUIT_FAILURES = config('LLM_CIRCUIT_FAILURES', default=5, cast=int)
+LLM_CIRCUIT_RESET = config('LLM_CIRCUIT_RESET', default=30.0, cast=float)
+
+# Cache de respostas do chatbot (chatbot/response_cache.py); TTL 0 desliga
+CHAT_CACHE_TTL = config('CHAT_CACHE_TTL', default=86400, cast=int)
+CHAT_CACHE_MAX_ENTRIES = config('CHAT_CACHE_MAX_ENTRIES', default=200, cast=int)
+CHAT_CACHE_SIMILARITY = config('CHAT_CACHE_SIMILARITY', default=0.8, cast=float)
+
+# Limite de tokens (estimados) do prompt enviado à IA (chatbot/prompt.py)
+CHAT_PROMPT_TOKEN_BUDGET = config('CHAT_PROMPT_TOKEN_BUDGET', default=2000, cast=int)
+
+# Segundos até recarregar níveis/conquistas em memória (gamification/reference.py)
+GAMIFICATION_REFERENCE_TTL = config('GAMIFICATION_REFERENCE_TTL', default=60, cast=int)
+
+# Segundos que o painel de gamificação de cada usuário fica em cache (gamification/estatisticas.py)
+GAMIFICATION_STATS_TTL = config('GAMIFICATION_STATS_TTL', default=300, cast=int)
+
+# Segundos até um ranking ser refeito na leitura, sem o cron de atualizar_rankings (gamification/leaderboard.py)
+GAMIFICATION_RANKING_STALE = config('GAMIFICATION_RANKING_STALE', default=300, cast=int)
+
 # ========================================
 # CONFIGURAÇÃO DE MEDIA (Upload de Arquivos)
 # ========================================
@@ -0,0 +1,163 @@
+"""
+Motor de regras das conquistas, orientado a eventos.
+
+As conquistas eram verificadas em vários lugares (transações, streak,
+orçamentos, cartões, categorias), cada um com metas fixas no código e uma
+contagem no banco a cada evento. Aqui as regras saem das próprias linhas
+de Conquista (cache de referência, reference.py), pelos campos de meta:
+
+    meta_dias_consecutivos   streak atual (qualquer tipo)
+    meta_valor               valor economizado (qualquer tipo)
+    meta_quantidade          contador do tipo: transacoes, categorias,
+                             orcamentos ou cartoes
+
+mais as conquistas especiais de CONQUISTAS_ESPECIAIS (cadastro, nível,
+horário da transação). Conquistas inativas ou sem meta não viram regra.
+
+Quem gera o evento chama ``publicar`` com o valor atual do contador (os
+contadores ficam no PerfilGamificacao e são somados pelo ledger no mesmo
+UPDATE dos pontos) e o anterior. Só as regras daquele evento cuja meta
+foi cruzada são avaliadas, em memória; consulta ao banco só acontece
+quando alguma conquista é de fato desbloqueada, e todas as desbloqueadas
+no evento são gravadas juntas (um bulk_create e um crédito no ledger).
+
+Exemplo:
+    publicar(user, TRANSACAO_CRIADA, perfil.transacoes_registradas,
+             perfil.transacoes_registradas - 1, hora=transacao.created_at.hour)
+"""
+import logging
+from collections import defaultdict, namedtuple
+
+from django.db import IntegrityError, transaction
+
+from .ledger import Lancamento, creditar
+from .models import ConquistaUsuario, PerfilGamificacao
+from .reference import referencia
+
+logger = logging.getLogger(__name__)
+
+CADASTRO = 'cadastro'
+TRANSACAO_CRIADA = 'transacao_criada'
+CATEGORIA_CRIADA = 'categoria_criada'
+ORCAMENTO_CRIADO = 'orcamento_criado'
+CARTAO_CRIADO = 'cartao_criado'
+STREAK_ATUALIZADO = 'streak_atualizado'
+ECONOMIA_ATINGIDA = 'economia_atingida'
+NIVEL_ALCANCADO = 'nivel_alcancado'
+
+# Categoria do tipo da conquista -> evento que conta para meta_quantidade
+EVENTOS_POR_CATEGORIA = {
+    'transacoes': TRANSACAO_CRIADA,
+    'categorias': CATEGORIA_CRIADA,
+    'orcamentos': ORCAMENTO_CRIADO,
+    'cartoes': CARTAO_CRIADO,
+}
+
+# Campo do PerfilGamificacao incrementado a cada evento de contagem
+CONTADORES = {
+    TRANSACAO_CRIADA: 'transacoes_registradas',
+    CATEGORIA_CRIADA: 'categorias_criadas',
+    ORCAMENTO_CRIADO: 'orcamentos_criados',
+    CARTAO_CRIADO: 'cartoes_cadastrados',
+}
+
+# Conquistas sem meta configurável: código -> (evento, meta, condição extra)
+CONQUISTAS_ESPECIAIS = {
+    'bem_vindo': (CADASTRO, 0, None),
+    'nivel_5': (NIVEL_ALCANCADO, 5, None),
+    'madrugador': (TRANSACAO_CRIADA, 0, lambda contexto: contexto.get('hora') is not None and contexto['hora'] < 6),
+}
+
+Regra = namedtuple('Regra', ['conquista', 'meta', 'condicao'])
+
+_indice = (None, {})
+
+
+def regras(evento):
+    """Regras do evento, recalculadas só quando o cache de referência muda"""
+    global _indice
+    dados = referencia()
+    if _indice[0] is not dados:
+        _indice = (dados, _montar_indice(dados.conquistas.values()))
+    return _indice[1].get(evento, [])
+
+
+def _montar_indice(conquistas):
+    indice = defaultdict(list)
+    for conquista in conquistas:
+        if not conquista.ativa:
+            continue
+        if conquista.codigo in CONQUISTAS_ESPECIAIS:
+            evento, meta, condicao = CONQUISTAS_ESPECIAIS[conquista.codigo]
+            indice[evento].append(Regra(conquista, meta, condicao))
+            continue
+        if conquista.meta_dias_consecutivos is not None:
+            indice[STREAK_ATUALIZADO].append(Regra(conquista, conquista.meta_dias_consecutivos, None))
+        elif conquista.meta_valor is not None:
+            indice[ECONOMIA_ATINGIDA].append(Regra(conquista, conquista.meta_valor, None))
+        elif conquista.meta_quantidade is not None and conquista.tipo.categoria in EVENTOS_POR_CATEGORIA:
+            evento = EVENTOS_POR_CATEGORIA[conquista.tipo.categoria]
+            indice[evento].append(Regra(conquista, conquista.meta_quantidade, None))
+    return dict(indice)
+
+
+def publicar(user, evento, valor=0, anterior=None, **contexto):
+    """
+    Avalia as regras do ``evento`` e desbloqueia as conquistas alcançadas.
+
+    Uma regra dispara quando ``anterior < meta <= valor``; sem ``anterior``
+    (valores que não são contadores, como economia) basta ``valor >= meta``.
+    Regras com condição extra disparam sempre que a condição vale.
+    Retorna as conquistas desbloqueadas.
+    """
+    alcancadas = [regra.conquista for regra in regras(evento) if _dispara(regra, valor, anterior, contexto)]
+    if not alcancadas:
+        return []
+    return desbloquear(user, alcancadas)
+
+
+def _dispara(regra, valor, anterior, contexto):
+    if regra.condicao is not None:
+        return regra.meta <= valor and regra.condicao(contexto)
+    return regra.meta <= valor and (anterior is None or anterior < regra.meta)
+
+
+def desbloquear(user, conquistas):
+    """Grava as conquistas ainda não desbloqueadas e credita os pontos de uma vez"""
+    user_id = getattr(user, 'pk', user)
+    perfil_id = PerfilGamificacao.objects.filter(user_id=user_id).values_list('pk', flat=True).first()
+    if perfil_id is None:
+        perfil_id = PerfilGamificacao.objects.get_or_create(user_id=user_id)[0].pk
+
+    ja_tem = set(ConquistaUsuario.objects.filter(
+        perfil_id=perfil_id,
+        conquista__in=conquistas
+    ).values_list('conquista_id', flat=True))
+    novas = [conquista for conquista in conquistas if conquista.pk not in ja_tem]
+    if not novas:
+        return []
+
+    try:
+        with transaction.atomic():
+            ConquistaUsuario.objects.bulk_create([
+                ConquistaUsuario(perfil_id=perfil_id, conquista=conquista) for conquista in novas
+            ])
+    except IntegrityError:
+        # Outro evento simultâneo desbloqueou alguma delas: grava uma a uma
+        novas = [
+            conquista for conquista in novas
+            if ConquistaUsuario.objects.get_or_create(perfil_id=perfil_id, conquista=conquista)[1]
+        ]
+        if not novas:
+            return []
+
+    credito = creditar(
+        user_id,
+        [Lancamento(conquista.pontos, 'conquista', f'🏆 Conquista desbloqueada: {conquista.titulo}') for conquista in novas],
+        contadores={'conquistas_desbloqueadas': len(novas), 'conquistas_nao_visualizadas': len(novas)}
+    )
+    logger.info(f"Usuário {user_id} desbloqueou: {', '.join(conquista.titulo for conquista in novas)}")
+
+    if credito.subiu_nivel:
+        novas += publicar(user_id, NIVEL_ALCANCADO, credito.nivel.numero)
+    return novas
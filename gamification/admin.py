@@ -1,6 +1,7 @@
 # gamification/admin.py
 from django.contrib import admin
 from django.utils.html import format_html
+from . import leaderboard
 from .models import (
     NivelFinanceiro, TipoConquista, Conquista, PerfilGamificacao,
     ConquistaUsuario, Desafio, DesafioUsuario, HistoricoGamificacao, Ranking
@@ -185,11 +186,12 @@ class RankingAdmin(admin.ModelAdmin):
     readonly_fields = ['criado_em', 'top_usuarios_display']
     
     def top_usuarios_display(self, obj):
-        if not obj.top_usuarios:
+        usuarios = leaderboard.top_congelado(obj)
+        if not usuarios:
             return "Nenhum usuário no ranking"
         
         html = '<ol>'
-        for user_data in obj.top_usuarios.get('usuarios', [])[:10]:
+        for user_data in usuarios[:10]:
             html += f'<li><strong>{user_data.get("username")}</strong> - {user_data.get("pontos")} pontos</li>'
         html += '</ol>'
         return format_html(html)
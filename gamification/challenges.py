@@ -0,0 +1,227 @@
+"""
+Avaliação em lote dos desafios (usada por ``manage.py avaliar_desafios``).
+
+DesafioUsuario.atualizar_progresso calcula um participante por vez e
+ninguém o chamava. Aqui cada Desafio ativo é avaliado para todos os
+participantes em andamento de uma vez:
+
+- uma consulta agrupada por usuário soma as transações do período
+  (entradas e saídas, no período atual e no anterior);
+- progresso e valor_alcancado de todos vão num bulk_update;
+- os que chegaram a 100% são completados juntos, com a recompensa
+  creditada por ``creditar_em_lote`` (ledger.py).
+
+Metas (``meta_tipo``), sempre nas transações de ``meta_categoria`` se
+preenchida (pelo nome da categoria, sem diferenciar maiúsculas):
+
+    economia         entradas - saídas no período; completa assim que
+                     atinge a meta
+    reduzir_gastos   redução das saídas em relação ao mesmo trecho do
+                     período anterior (de mesma duração), em % com
+                     meta_percentual ou em R$ com meta_valor; só completa
+                     quando o período termina
+
+Quando o período termina, o desafio recebe a última avaliação, quem não
+completou fica como 'falhado' e o desafio como 'finalizado'.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import achievements
+from .ledger import Lancamento, creditar_em_lote
+from .models import ConquistaUsuario, Desafio, DesafioUsuario, PerfilGamificacao
+
+logger = logging.getLogger(__name__)
+
+ECONOMIA = 'economia'
+REDUZIR_GASTOS = 'reduzir_gastos'
+META_TIPOS = [ECONOMIA, REDUZIR_GASTOS]
+
+ZERO = Decimal('0.00')
+
+
+def desafios_pendentes(hoje=None):
+    """Desafios ativos já iniciados, incluindo os que terminaram e ainda não foram fechados"""
+    hoje = hoje or timezone.localdate()
+    return Desafio.objects.filter(status='ativo', data_inicio__lte=hoje).select_related('conquista_recompensa')
+
+
+def avaliar_desafios(hoje=None):
+    """Avalia todos os desafios pendentes; retorna {desafio: resultado de avaliar_desafio}"""
+    hoje = hoje or timezone.localdate()
+    return {desafio: avaliar_desafio(desafio, hoje) for desafio in desafios_pendentes(hoje)}
+
+
+def avaliar_desafio(desafio, hoje=None):
+    """
+    Atualiza o progresso de todos os participantes em andamento do desafio.
+
+    Retorna um dict com quantos foram 'avaliados', 'completados' e 'falhados'.
+    """
+    hoje = hoje or timezone.localdate()
+    resultado = {'avaliados': 0, 'completados': 0, 'falhados': 0}
+    if desafio.meta_tipo not in META_TIPOS:
+        logger.warning(f"Desafio {desafio.pk}: meta_tipo '{desafio.meta_tipo}' não é avaliado automaticamente")
+        return resultado
+
+    encerrado = desafio.data_fim < hoje
+    agora = timezone.now()
+
+    with transaction.atomic():
+        participantes = list(
+            DesafioUsuario.objects.select_for_update(of=('self',)).filter(
+                desafio=desafio,
+                status='em_andamento'
+            ).annotate(user_id=F('perfil__user_id'))
+        )
+        valores = _calcular_valores(desafio, [participante.user_id for participante in participantes], hoje)
+
+        completados, falhados, alterados = [], [], []
+        for participante in participantes:
+            valor = valores.get(participante.user_id, ZERO)
+            progresso = desafio.calcular_progresso(valor)
+            anterior = participante.valor_alcancado
+
+            if progresso >= 100 and (encerrado or desafio.meta_tipo == ECONOMIA):
+                participante.status = 'completado'
+                participante.completado_em = agora
+                completados.append(participante)
+            elif encerrado:
+                participante.status = 'falhado'
+                falhados.append(participante)
+            elif (participante.progresso, participante.valor_alcancado) == (progresso, valor):
+                continue
+
+            participante.progresso = progresso
+            participante.valor_alcancado = valor
+            participante.valor_anterior = anterior
+            alterados.append(participante)
+
+        DesafioUsuario.objects.bulk_update(
+            alterados,
+            ['progresso', 'valor_alcancado', 'status', 'completado_em'],
+            batch_size=1000
+        )
+        creditos = _recompensar(desafio, completados)
+
+        # bulk_update não dispara os signals que mantêm desafios_em_andamento;
+        # o painel (estatisticas.py) é refeito quando o perfil muda
+        PerfilGamificacao.objects.filter(pk__in=[participante.perfil_id for participante in falhados]).update(
+            desafios_em_andamento=Greatest(F('desafios_em_andamento') - 1, Value(0)),
+            atualizado_em=agora
+        )
+        PerfilGamificacao.objects.filter(
+            pk__in=[participante.perfil_id for participante in alterados if participante.status == 'em_andamento']
+        ).update(atualizado_em=agora)
+
+        if encerrado:
+            Desafio.objects.filter(pk=desafio.pk).update(status='finalizado')
+            desafio.status = 'finalizado'
+
+    for credito in creditos:
+        if credito.subiu_nivel:
+            achievements.publicar(credito.perfil.user_id, achievements.NIVEL_ALCANCADO, credito.nivel.numero)
+    if desafio.meta_tipo == ECONOMIA and not desafio.meta_categoria:
+        _publicar_economia(alterados)
+
+    resultado['avaliados'] = len(participantes)
+    resultado['completados'] = len(completados)
+    resultado['falhados'] = len(falhados)
+    logger.info(
+        f"Desafio {desafio.pk} ({desafio.meta_tipo}): {resultado['avaliados']} avaliados, "
+        f"{resultado['completados']} completados, {resultado['falhados']} falhados"
+    )
+    return resultado
+
+
+def _calcular_valores(desafio, user_ids, hoje):
+    """{user_id: valor alcançado} numa única consulta agrupada por usuário"""
+    from transactions.models import Transaction
+
+    if not user_ids:
+        return {}
+
+    inicio = desafio.data_inicio
+    ate = min(hoje, desafio.data_fim)
+    entrada = Q(transaction_type=Transaction.TransactionType.INCOME)
+    saida = Q(transaction_type=Transaction.TransactionType.EXPENSE)
+    periodo = Q(transaction_date__gte=inicio)
+
+    def soma(condicao):
+        return Coalesce(Sum('amount', filter=condicao), Value(ZERO), output_field=DecimalField())
+
+    transacoes = Transaction.objects.filter(account__user_id__in=user_ids, transaction_date__lte=ate)
+    if desafio.meta_categoria:
+        transacoes = transacoes.filter(category__name__iexact=desafio.meta_categoria)
+
+    if desafio.meta_tipo == ECONOMIA:
+        linhas = transacoes.filter(periodo).values(usuario=F('account__user_id')).annotate(
+            entradas=soma(entrada),
+            saidas=soma(saida)
+        ).order_by()
+        return {linha['usuario']: linha['entradas'] - linha['saidas'] for linha in linhas}
+
+    # reduzir_gastos: o mesmo trecho (em dias) do período anterior de mesma duração
+    duracao = (desafio.data_fim - inicio).days + 1
+    inicio_anterior = inicio - timedelta(days=duracao)
+    ate_anterior = inicio_anterior + (ate - inicio)
+    linhas = transacoes.filter(saida, transaction_date__gte=inicio_anterior).values(
+        usuario=F('account__user_id')
+    ).annotate(
+        atual=soma(periodo),
+        anterior=soma(Q(transaction_date__lte=ate_anterior))
+    ).order_by()
+
+    valores = {}
+    for linha in linhas:
+        reducao = linha['anterior'] - linha['atual']
+        if desafio.meta_valor:
+            valores[linha['usuario']] = reducao
+        elif linha['anterior']:
+            valores[linha['usuario']] = (reducao * 100 / linha['anterior']).quantize(ZERO)
+    return valores
+
+
+def _recompensar(desafio, completados):
+    """Credita a recompensa de todos os completados (e a conquista, se houver)"""
+    if not completados:
+        return []
+    perfil_ids = [participante.perfil_id for participante in completados]
+    lancamentos = [Lancamento(desafio.pontos_recompensa, 'desafio', f"🎯 Completou o desafio: {desafio.titulo}")]
+    contadores = {'desafios_completados': 1, 'desafios_em_andamento': -1}
+
+    conquista = desafio.conquista_recompensa
+    if conquista is None:
+        return creditar_em_lote(perfil_ids, lancamentos, contadores)
+
+    ja_tem = set(ConquistaUsuario.objects.filter(
+        conquista=conquista,
+        perfil_id__in=perfil_ids
+    ).values_list('perfil_id', flat=True))
+    novos = [perfil_id for perfil_id in perfil_ids if perfil_id not in ja_tem]
+    ConquistaUsuario.objects.bulk_create(
+        [ConquistaUsuario(perfil_id=perfil_id, conquista=conquista) for perfil_id in novos],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+    return creditar_em_lote(ja_tem, lancamentos, contadores) + creditar_em_lote(
+        novos,
+        lancamentos + [Lancamento(conquista.pontos, 'conquista', f'🏆 Conquista desbloqueada: {conquista.titulo}')],
+        {**contadores, 'conquistas_desbloqueadas': 1, 'conquistas_nao_visualizadas': 1}
+    )
+
+
+def _publicar_economia(participantes):
+    """Regras de conquista por valor economizado, só para quem cruzou alguma meta"""
+    metas = [regra.meta for regra in achievements.regras(achievements.ECONOMIA_ATINGIDA)]
+    for participante in participantes:
+        valor, anterior = participante.valor_alcancado, participante.valor_anterior
+        if any(anterior < meta <= valor for meta in metas):
+            achievements.publicar(participante.user_id, achievements.ECONOMIA_ATINGIDA, valor, anterior)
@@ -0,0 +1,125 @@
+"""
+Painel de gamificação a partir de um retrato (snapshot) por usuário.
+
+O dashboard atualizava o streak (uma escrita num GET), buscava o perfil
+duas vezes, calculava o próximo nível duas vezes e contava as
+ConquistaUsuario a cada acesso. Aqui:
+
+- o perfil é lido uma vez (``carregar_perfil``), sem criar nada; nível
+  atual e próximo vêm do cache de referência (reference.py);
+- os totais são contadores do PerfilGamificacao mantidos por quem escreve
+  (ledger.py, achievements.py, challenges.py e os signals de
+  DesafioUsuario);
+- o retrato (estatísticas + conquistas recentes, histórico recente e
+  desafios em andamento) fica no cache do Django por usuário, com a
+  versão ``atualizado_em`` do perfil: qualquer crédito, streak ou
+  mudança de contador grava ``atualizado_em`` e o próximo acesso refaz.
+
+Com o retrato em cache o painel custa só a leitura do perfil; refeito,
+mais três consultas pequenas pelos índices do perfil.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ConquistaUsuario, DesafioUsuario, HistoricoGamificacao, PerfilGamificacao
+from .reference import nivel_por_id, proximo_nivel
+
+STATS_CACHE_KEY = 'gamificacao:painel:{user_id}'
+
+
+def carregar_perfil(user):
+    """Perfil do usuário numa consulta (não salvo, com os padrões, se ainda não existir)"""
+    perfil = PerfilGamificacao.objects.filter(user=user).first()
+    if perfil is None:
+        return PerfilGamificacao(user=user)
+    perfil.nivel_atual = nivel_por_id(perfil.nivel_atual_id)
+    return perfil
+
+
+def painel(perfil):
+    """Retrato do painel do perfil: {'stats', 'conquistas_recentes', 'historico', 'desafios_ativos'}"""
+    if perfil.pk is None:
+        return _montar_painel(perfil)
+
+    versao = (perfil.atualizado_em.isoformat(), timezone.now().date().isoformat())
+    chave = STATS_CACHE_KEY.format(user_id=perfil.user_id)
+    retrato = cache.get(chave)
+    if retrato is None or retrato['versao'] != versao:
+        retrato = {'versao': versao, **_montar_painel(perfil)}
+        cache.set(chave, retrato, getattr(settings, 'GAMIFICATION_STATS_TTL', 300))
+    return retrato
+
+
+def _montar_painel(perfil):
+    if perfil.pk is None:
+        return {'stats': estatisticas(perfil), 'conquistas_recentes': [], 'historico': [], 'desafios_ativos': []}
+
+    desafios_ativos = []
+    if perfil.desafios_em_andamento > 0:
+        desafios_ativos = list(DesafioUsuario.objects.filter(
+            perfil=perfil,
+            status='em_andamento'
+        ).select_related('desafio').order_by('-iniciado_em')[:3])
+
+    return {
+        'stats': estatisticas(perfil),
+        'conquistas_recentes': list(ConquistaUsuario.objects.filter(
+            perfil=perfil
+        ).select_related('conquista').order_by('-desbloqueada_em')[:5]),
+        'historico': list(HistoricoGamificacao.objects.filter(perfil=perfil).order_by('-criado_em')[:10]),
+        'desafios_ativos': desafios_ativos,
+    }
+
+
+def estatisticas(perfil):
+    """Estatísticas do perfil só com os contadores e o cache de referência (sem consultas)"""
+    atual = perfil.nivel_atual
+    proximo = proximo_nivel(perfil.pontos_totais)
+
+    if proximo and atual:
+        pontos_para_proximo = proximo.pontos_necessarios - atual.pontos_necessarios
+        pontos_progresso = perfil.pontos_totais - atual.pontos_necessarios
+        progresso_percentual = int((pontos_progresso / pontos_para_proximo) * 100) if pontos_para_proximo > 0 else 0
+    else:
+        progresso_percentual = 100 if not proximo else 0
+
+    # Sem atividade ontem nem hoje o streak já foi perdido (é zerado na próxima atividade)
+    streak_atual = perfil.streak_atual
+    if perfil.ultima_atividade is None or perfil.ultima_atividade < timezone.now().date() - timedelta(days=1):
+        streak_atual = 0
+
+    return {
+        'pontos_totais': perfil.pontos_totais,
+        'nivel': {
+            'atual': _nivel(atual),
+            'proximo': _nivel(proximo),
+            'progresso': progresso_percentual
+        },
+        'streak': {
+            'atual': streak_atual,
+            'maior': perfil.maior_streak
+        },
+        'conquistas': {
+            'total': perfil.conquistas_desbloqueadas,
+            'nao_visualizadas': perfil.conquistas_nao_visualizadas
+        },
+        'desafios': {
+            'completados': perfil.desafios_completados,
+            'em_andamento': perfil.desafios_em_andamento
+        }
+    }
+
+
+def _nivel(nivel):
+    if nivel is None:
+        return None
+    return {
+        'numero': nivel.numero,
+        'nome': nivel.nome,
+        'pontos_necessarios': nivel.pontos_necessarios,
+        'icone': nivel.icone,
+        'cor': nivel.cor,
+    }
@@ -0,0 +1,279 @@
+"""
+Rankings materializados (atualizados por ``manage.py atualizar_rankings``
+e, na leitura, quando passam de GAMIFICATION_RANKING_STALE segundos).
+
+ranking_view ordenava todos os perfis a cada acesso e os rankings semanal
+e mensal agregavam todo o HistoricoGamificacao. Aqui cada período tem um
+Ranking com uma PosicaoRanking por perfil (pontos e posição), então:
+
+- o top N é lido pelo índice (ranking, posicao);
+- a posição de um usuário é uma busca pelo par único (ranking, perfil).
+
+Semanal e mensal são a semana (segunda a domingo) e o mês corrente. Cada
+atualização só soma o histórico criado depois de ``Ranking.atualizado_ate``
+(dias inteiros já consolidados vêm de PontuacaoDiaria, ver retention.py)
+e reordena; o ranking geral é refeito a partir de ``pontos_totais``. Perfis
+privados ficam com posição vazia e não aparecem nem ocupam posições. Quem
+torna o perfil privado some já na leitura (top e top_congelado filtram
+``perfil_publico``); as posições dos demais só fecham o buraco na próxima
+atualização.
+
+Quando um período vira, o anterior recebe uma última atualização até o
+fim dele e fica congelado em ``top_usuarios``; as posições de períodos
+mais antigos são apagadas.
+
+O caminho principal é o comando agendado (ver docs/tarefas-agendadas.md).
+Sem ele, obter_ranking gera o ranking na primeira leitura e o refaz quando
+``atualizado_ate`` fica mais velho que GAMIFICATION_RANKING_STALE; uma
+trava no cache faz só uma requisição por vez atualizar, e as outras leem
+o ranking anterior (ou nenhum, enquanto o primeiro é gerado).
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import HistoricoGamificacao, PerfilGamificacao, PontuacaoDiaria, PosicaoRanking, Ranking
+from .retention import consolidado_ate
+
+logger = logging.getLogger(__name__)
+
+PERIODOS = ['semanal', 'mensal', 'geral']
+
+# Histórico mais novo que isso fica para a próxima atualização, para não
+# pular linhas de transações que ainda não fizeram commit
+ATRASO = timedelta(seconds=30)
+
+TOP_CONGELADO = 10
+
+ATUALIZANDO_KEY = 'gamificacao:ranking:{periodo}:atualizando'
+
+
+def limites_periodo(periodo, dia):
+    """(primeiro dia, último dia) do período que contém ``dia``"""
+    if periodo == 'semanal':
+        inicio = dia - timedelta(days=dia.weekday())
+        return inicio, inicio + timedelta(days=6)
+    inicio = dia.replace(day=1)
+    proximo = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, proximo - timedelta(days=1)
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def ranking_atual(periodo):
+    """Ranking materializado do período corrente (None se ainda não foi gerado)"""
+    rankings = Ranking.objects.filter(periodo=periodo)
+    if periodo != 'geral':
+        inicio, _ = limites_periodo(periodo, timezone.localdate())
+        rankings = rankings.filter(data_inicio=inicio)
+    return rankings.order_by('-data_inicio').first()
+
+
+def atualizar_ranking(periodo, agora=None):
+    """Atualiza o ranking corrente do período (e fecha o anterior); retorna o Ranking"""
+    agora = agora or timezone.now()
+    if periodo == 'geral':
+        return _atualizar_geral(agora)
+
+    hoje = timezone.localdate(agora)
+    inicio, fim = limites_periodo(periodo, hoje)
+
+    anterior = Ranking.objects.filter(periodo=periodo, data_inicio__lt=inicio).order_by('-data_inicio').first()
+    fim_anterior = anterior and _inicio_do_dia(anterior.data_fim + timedelta(days=1))
+    if anterior and (anterior.atualizado_ate is None or anterior.atualizado_ate < fim_anterior):
+        _atualizar_periodo(anterior, agora)
+        PosicaoRanking.objects.filter(
+            ranking__periodo=periodo,
+            ranking__data_inicio__lt=anterior.data_inicio
+        ).delete()
+
+    ranking, _ = Ranking.objects.get_or_create(
+        periodo=periodo,
+        data_inicio=inicio,
+        defaults={'data_fim': fim, 'atualizado_ate': _inicio_do_dia(inicio)}
+    )
+    _atualizar_periodo(ranking, agora)
+    return ranking
+
+
+def atualizar_rankings(agora=None):
+    return [atualizar_ranking(periodo, agora) for periodo in PERIODOS]
+
+
+def _atualizar_periodo(ranking, agora):
+    """Soma ao ranking o histórico entre ``atualizado_ate`` e agora (limitado ao fim do período)"""
+    with transaction.atomic():
+        ranking = Ranking.objects.select_for_update().get(pk=ranking.pk)
+        desde = ranking.atualizado_ate or _inicio_do_dia(ranking.data_inicio)
+        ate = min(agora - ATRASO, _inicio_do_dia(ranking.data_fim + timedelta(days=1)))
+        if ate <= desde:
+            return
+
+        pontos = dict(ranking.posicoes.values_list('perfil_id', 'pontos'))
+        # Linhas em ``desde`` só ficaram de fora se nada foi lido ainda
+        filtro_desde = 'criado_em__gte' if desde == _inicio_do_dia(ranking.data_inicio) else 'criado_em__gt'
+
+        # Ranking novo: os dias inteiros já consolidados vêm de PontuacaoDiaria
+        # (o histórico bruto desses dias pode ter sido arquivado)
+        consolidado = consolidado_ate() if filtro_desde == 'criado_em__gte' else None
+        if consolidado:
+            ultimo_dia = min(consolidado, ranking.data_fim, timezone.localdate(ate) - timedelta(days=1))
+            if ultimo_dia >= timezone.localdate(desde):
+                dias = PontuacaoDiaria.objects.filter(
+                    dia__gte=timezone.localdate(desde),
+                    dia__lte=ultimo_dia
+                ).values('perfil_id').annotate(total=Sum('pontos')).order_by()
+                _somar(pontos, dias)
+                desde = _inicio_do_dia(ultimo_dia + timedelta(days=1))
+                filtro_desde = 'criado_em__gte'
+
+        novos = HistoricoGamificacao.objects.filter(
+            criado_em__lte=ate,
+            **{filtro_desde: desde}
+        ).values('perfil_id').annotate(total=Sum('pontos')).order_by()
+        _somar(pontos, novos)
+
+        ranking.atualizado_ate = ate
+        _gravar_posicoes(ranking, pontos)
+
+
+def _somar(pontos, linhas):
+    for linha in linhas:
+        pontos[linha['perfil_id']] = pontos.get(linha['perfil_id'], 0) + (linha['total'] or 0)
+
+
+def _atualizar_geral(agora):
+    """O ranking geral é refeito a partir de pontos_totais (já mantido pelo ledger)"""
+    with transaction.atomic():
+        ranking = Ranking.objects.select_for_update().filter(periodo='geral').order_by('-data_inicio').first()
+        if ranking is None:
+            hoje = timezone.localdate(agora)
+            ranking, _ = Ranking.objects.get_or_create(periodo='geral', data_inicio=hoje, defaults={'data_fim': hoje})
+
+        pontos = dict(PerfilGamificacao.objects.values_list('pk', 'pontos_totais'))
+        ranking.data_fim = timezone.localdate(agora)
+        ranking.atualizado_ate = agora
+        _gravar_posicoes(ranking, pontos)
+        return ranking
+
+
+def _gravar_posicoes(ranking, pontos):
+    """
+    Reordena ``pontos`` ({perfil_id: pontos}) e grava só as linhas que mudaram.
+
+    Empates dividem a posição (1, 2, 2, 4), como a contagem de perfis com
+    mais pontos que o ranking fazia antes.
+    """
+    privados = set(PerfilGamificacao.objects.filter(perfil_publico=False).values_list('pk', flat=True))
+
+    posicoes = {}
+    posicao = anterior = None
+    publicos = 0
+    for perfil_id, total in sorted(pontos.items(), key=lambda item: (-item[1], item[0])):
+        if perfil_id in privados:
+            posicoes[perfil_id] = None
+            continue
+        publicos += 1
+        if total != anterior:
+            posicao, anterior = publicos, total
+        posicoes[perfil_id] = posicao
+
+    existentes = {linha.perfil_id: linha for linha in ranking.posicoes.all()}
+    criar, alterar = [], []
+    for perfil_id, total in pontos.items():
+        linha = existentes.pop(perfil_id, None)
+        if linha is None:
+            criar.append(PosicaoRanking(ranking=ranking, perfil_id=perfil_id, pontos=total, posicao=posicoes[perfil_id]))
+        elif (linha.pontos, linha.posicao) != (total, posicoes[perfil_id]):
+            linha.pontos, linha.posicao = total, posicoes[perfil_id]
+            alterar.append(linha)
+
+    PosicaoRanking.objects.bulk_create(criar, batch_size=1000)
+    PosicaoRanking.objects.bulk_update(alterar, ['pontos', 'posicao'], batch_size=1000)
+    if existentes:
+        PosicaoRanking.objects.filter(pk__in=[linha.pk for linha in existentes.values()]).delete()
+
+    ranking.top_usuarios = {'usuarios': _top_congelado(ranking)}
+    ranking.save(update_fields=['top_usuarios', 'atualizado_ate', 'data_fim'])
+    logger.info(
+        f"Ranking {ranking.periodo} de {ranking.data_inicio}: {len(pontos)} perfis, "
+        f"{len(criar)} novos, {len(alterar)} alterados"
+    )
+
+
+def _top_congelado(ranking):
+    return [
+        {
+            'perfil_id': linha.perfil_id,
+            'posicao': linha.posicao,
+            'username': linha.perfil.get_nome_exibicao(),
+            'pontos': linha.pontos,
+        }
+        for linha in ranking.posicoes.filter(posicao__isnull=False).select_related(
+            'perfil__user'
+        ).order_by('posicao', 'perfil_id')[:TOP_CONGELADO]
+    ]
+
+
+def top_congelado(ranking):
+    """Top gravado em ``top_usuarios``, sem os perfis que ficaram privados depois"""
+    usuarios = (ranking.top_usuarios or {}).get('usuarios', [])
+    privados = set(PerfilGamificacao.objects.filter(
+        pk__in=[usuario.get('perfil_id') for usuario in usuarios],
+        perfil_publico=False
+    ).values_list('pk', flat=True))
+    return [usuario for usuario in usuarios if usuario.get('perfil_id') not in privados]
+
+
+def obter_ranking(periodo):
+    """
+    Ranking corrente do período, gerado na primeira vez e refeito quando fica velho.
+
+    Retorna None se o primeiro ranking do período está sendo gerado por
+    outra requisição.
+    """
+    validade = timedelta(seconds=getattr(settings, 'GAMIFICATION_RANKING_STALE', 300))
+    ranking = ranking_atual(periodo)
+    if ranking is not None and ranking.atualizado_ate and ranking.atualizado_ate >= timezone.now() - validade:
+        return ranking
+
+    chave = ATUALIZANDO_KEY.format(periodo=periodo)
+    if not cache.add(chave, 1, validade.total_seconds()):
+        return ranking
+    try:
+        return atualizar_ranking(periodo)
+    finally:
+        cache.delete(chave)
+
+
+def top(ranking, limit=100):
+    """Perfis públicos do topo do ranking, com ``pontos_ranking`` e ``posicao_ranking``"""
+    if ranking is None:
+        return []
+    linhas = ranking.posicoes.filter(posicao__isnull=False, perfil__perfil_publico=True).select_related(
+        'perfil__user', 'perfil__nivel_atual'
+    ).order_by('posicao', 'perfil_id')[:limit]
+
+    perfis = []
+    for linha in linhas:
+        linha.perfil.pontos_ranking = linha.pontos
+        linha.perfil.posicao_ranking = linha.posicao
+        perfis.append(linha.perfil)
+    return perfis
+
+
+def posicao_usuario(ranking, perfil):
+    """Posição do perfil no ranking (None se privado ou fora do ranking)"""
+    if ranking is None or not perfil.perfil_publico:
+        return None
+    return PosicaoRanking.objects.filter(
+        ranking=ranking,
+        perfil=perfil
+    ).values_list('posicao', flat=True).first()
@@ -0,0 +1,155 @@
+"""
+Lançamento atômico de pontos no PerfilGamificacao.
+
+Todo crédito de pontos passa por ``creditar``:
+
+- os pontos (e contadores como ``conquistas_desbloqueadas``) são somados
+  no banco com um UPDATE usando F(), então eventos simultâneos do mesmo
+  usuário não perdem pontos;
+- o nível é resolvido no cache de referência em memória (reference.py),
+  sem consulta;
+- as linhas do HistoricoGamificacao são gravadas num único bulk_create.
+
+Um crédito comum custa 3 comandos (UPDATE, SELECT do total, INSERT do
+histórico); subir de nível acrescenta um UPDATE. ``creditar_em_lote``
+faz o mesmo crédito para vários perfis de uma vez (recompensas dos
+desafios, ver challenges.py), com um UPDATE por nível alcançado.
+
+Exemplo:
+    resultado = creditar(user, [Lancamento(10, 'transacao', '💰 Transação registrada')])
+    resultado.perfil.pontos_totais, resultado.subiu_nivel
+"""
+import logging
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import HistoricoGamificacao, PerfilGamificacao
+from .reference import nivel_para_pontos
+
+logger = logging.getLogger(__name__)
+
+BONUS_NIVEL = 50
+
+Lancamento = namedtuple('Lancamento', ['pontos', 'tipo', 'descricao'])
+Credito = namedtuple('Credito', ['perfil', 'subiu_nivel', 'nivel'])
+
+
+def _lancamento_nivel(nivel):
+    return Lancamento(
+        BONUS_NIVEL,
+        'nivel_up',
+        f'🎊 Level UP! Você alcançou o nível {nivel.numero}: {nivel.nome}'
+    )
+
+
+def creditar(user, lancamentos, contadores=None):
+    """
+    Soma os ``lancamentos`` ao perfil do usuário e grava o histórico.
+
+    ``user`` pode ser o usuário ou o id. ``contadores`` são campos inteiros
+    do perfil a incrementar no mesmo UPDATE, ex.: {'conquistas_desbloqueadas': 1}.
+    Retorna um Credito com o perfil atualizado.
+    """
+    user_id = getattr(user, 'pk', user)
+    lancamentos = [Lancamento(*lancamento) for lancamento in lancamentos]
+    total = sum(lancamento.pontos for lancamento in lancamentos)
+
+    incrementos = {campo: F(campo) + valor for campo, valor in (contadores or {}).items()}
+    incrementos['pontos_totais'] = F('pontos_totais') + total
+    incrementos['atualizado_em'] = timezone.now()
+
+    with transaction.atomic():
+        perfis = PerfilGamificacao.objects.filter(user_id=user_id)
+        if not perfis.update(**incrementos):
+            # Perfil normalmente criado no cadastro (signals.py); aqui só por garantia
+            PerfilGamificacao.objects.get_or_create(user_id=user_id)
+            perfis.update(**incrementos)
+
+        # O UPDATE acima segura o lock da linha até o fim da transação
+        perfil = perfis.select_related('nivel_atual').get()
+
+        subiu_nivel = False
+        nivel = nivel_para_pontos(perfil.pontos_totais)
+        if nivel and nivel.pk != perfil.nivel_atual_id:
+            anterior = perfil.nivel_atual
+            subiu_nivel = anterior is None or nivel.numero > anterior.numero
+            bonus = BONUS_NIVEL if subiu_nivel else 0
+            if subiu_nivel:
+                lancamentos.append(_lancamento_nivel(nivel))
+            perfis.update(nivel_atual=nivel, pontos_totais=F('pontos_totais') + bonus)
+            perfil.nivel_atual = nivel
+            perfil.pontos_totais += bonus
+
+        HistoricoGamificacao.objects.bulk_create([
+            HistoricoGamificacao(
+                perfil=perfil,
+                pontos=lancamento.pontos,
+                tipo=lancamento.tipo,
+                descricao=lancamento.descricao[:255]
+            )
+            for lancamento in lancamentos
+        ])
+
+    logger.info(f"Usuário {user_id} ganhou {total} pontos - Total: {perfil.pontos_totais}")
+    return Credito(perfil, subiu_nivel, perfil.nivel_atual)
+
+
+def creditar_em_lote(perfil_ids, lancamentos, contadores=None):
+    """
+    Soma os mesmos ``lancamentos`` a todos os perfis de ``perfil_ids``.
+
+    Custa um UPDATE e um SELECT para o lote todo, um UPDATE por nível
+    alcançado e um bulk_create do histórico. Retorna um Credito por perfil.
+    """
+    perfil_ids = list(perfil_ids)
+    if not perfil_ids:
+        return []
+    lancamentos = [Lancamento(*lancamento) for lancamento in lancamentos]
+    total = sum(lancamento.pontos for lancamento in lancamentos)
+
+    incrementos = {campo: F(campo) + valor for campo, valor in (contadores or {}).items()}
+    incrementos['pontos_totais'] = F('pontos_totais') + total
+    incrementos['atualizado_em'] = timezone.now()
+
+    with transaction.atomic():
+        PerfilGamificacao.objects.filter(pk__in=perfil_ids).update(**incrementos)
+        perfis = list(PerfilGamificacao.objects.filter(pk__in=perfil_ids).select_related('nivel_atual'))
+
+        creditos, historico, mudancas = [], [], {}
+        for perfil in perfis:
+            subiu_nivel = False
+            extras = []
+            nivel = nivel_para_pontos(perfil.pontos_totais)
+            if nivel and nivel.pk != perfil.nivel_atual_id:
+                anterior = perfil.nivel_atual
+                subiu_nivel = anterior is None or nivel.numero > anterior.numero
+                bonus = BONUS_NIVEL if subiu_nivel else 0
+                if subiu_nivel:
+                    extras.append(_lancamento_nivel(nivel))
+                mudancas.setdefault((nivel, bonus), []).append(perfil.pk)
+                perfil.nivel_atual = nivel
+                perfil.pontos_totais += bonus
+
+            historico.extend(
+                HistoricoGamificacao(
+                    perfil=perfil,
+                    pontos=lancamento.pontos,
+                    tipo=lancamento.tipo,
+                    descricao=lancamento.descricao[:255]
+                )
+                for lancamento in lancamentos + extras
+            )
+            creditos.append(Credito(perfil, subiu_nivel, perfil.nivel_atual))
+
+        for (nivel, bonus), ids in mudancas.items():
+            PerfilGamificacao.objects.filter(pk__in=ids).update(
+                nivel_atual=nivel,
+                pontos_totais=F('pontos_totais') + bonus
+            )
+        HistoricoGamificacao.objects.bulk_create(historico, batch_size=1000)
+
+    logger.info(f"{len(perfis)} perfis ganharam {total} pontos cada")
+    return creditos
@@ -0,0 +1,77 @@
+# gamification/management/commands/arquivar_historico.py
+from django.core.management.base import BaseCommand
+
+from gamification.retention import (
+    DEFAULT_BATCH_SIZE,
+    arquivar_historico,
+    consolidar_pontuacao_diaria,
+    limite_arquivamento,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Consolida o histórico de gamificação em pontos por perfil e dia '
+        '(PontuacaoDiaria) e apaga as linhas mais antigas que --dias, '
+        'opcionalmente gravando-as em --arquivo (.jsonl.gz). Pode rodar via cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=180,
+            help='Mantém o histórico dos últimos N dias (padrão: 180)'
+        )
+        parser.add_argument(
+            '--arquivo',
+            default=None,
+            help='Arquivo .jsonl.gz onde as linhas apagadas são acrescentadas (padrão: não grava)'
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=None,
+            help='Máximo de linhas apagadas por execução (padrão: sem limite)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Registros apagados por comando DELETE (padrão: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--so-consolidar',
+            action='store_true',
+            help='Apenas consolida a pontuação diária, sem apagar nada'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas mostra até quando o histórico seria apagado'
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            limite = limite_arquivamento(options['dias'])
+            if limite is None:
+                self.stdout.write('🔍 Nada seria apagado: nenhum dia consolidado ainda.')
+            else:
+                self.stdout.write(f'🔍 Seria apagado o histórico anterior a {limite:%d/%m/%Y %H:%M}.')
+            return
+
+        self.stdout.write('Consolidando pontuação diária...')
+        linhas = consolidar_pontuacao_diaria()
+        self.stdout.write(f'  ✓ {linhas} linha(s) de pontuação diária criada(s)')
+
+        if not options['so_consolidar']:
+            apagadas = arquivar_historico(
+                options['dias'],
+                arquivo=options['arquivo'],
+                batch_size=options['batch_size'],
+                limit=options['limite']
+            )
+            destino = f' (gravadas em {options["arquivo"]})' if options['arquivo'] else ''
+            self.stdout.write(f'  ✓ {apagadas} linha(s) de histórico apagada(s){destino}')
+
+        self.stdout.write(self.style.SUCCESS('✅ Histórico de gamificação consolidado!'))
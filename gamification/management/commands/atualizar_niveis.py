@@ -1,6 +1,7 @@
 # gamification/management/commands/atualizar_niveis.py
 from django.core.management.base import BaseCommand
 from gamification.models import NivelFinanceiro, TipoConquista, Conquista
+from gamification.reference import invalidar_referencia
 
 
 class Command(BaseCommand):
@@ -13,6 +14,9 @@ class Command(BaseCommand):
         self.stdout.write('Adicionando novas conquistas...')
         self.adicionar_conquistas()
         
+        # Processos em execução recarregam níveis e conquistas
+        invalidar_referencia()
+        
         self.stdout.write(self.style.SUCCESS('✅ Sistema atualizado com sucesso!'))
 
     def atualizar_niveis(self):
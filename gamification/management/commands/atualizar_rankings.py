@@ -0,0 +1,28 @@
+# gamification/management/commands/atualizar_rankings.py
+from django.core.management.base import BaseCommand
+
+from gamification.leaderboard import PERIODOS, atualizar_ranking
+
+
+class Command(BaseCommand):
+    help = (
+        'Atualiza os rankings materializados (semanal, mensal e geral) usados '
+        'pela página de ranking. Semanal e mensal só somam o histórico novo '
+        'desde a última execução; rode via cron a cada poucos minutos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--periodo',
+            choices=PERIODOS,
+            action='append',
+            help='Atualiza só este período (pode repetir; padrão: todos)'
+        )
+
+    def handle(self, *args, **options):
+        for periodo in options['periodo'] or PERIODOS:
+            ranking = atualizar_ranking(periodo)
+            posicoes = ranking.posicoes.filter(posicao__isnull=False).count()
+            self.stdout.write(f'  ✓ Ranking {periodo} ({ranking.data_inicio:%d/%m/%Y}): {posicoes} perfil(is) com posição')
+
+        self.stdout.write(self.style.SUCCESS('✅ Rankings atualizados!'))
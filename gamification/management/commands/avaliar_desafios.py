@@ -0,0 +1,35 @@
+# gamification/management/commands/avaliar_desafios.py
+from django.core.management.base import BaseCommand
+
+from gamification.challenges import avaliar_desafio, desafios_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Avalia os desafios ativos: recalcula o progresso de todos os '
+        'participantes a partir das transações, completa quem atingiu a meta '
+        '(com a recompensa) e fecha os desafios que terminaram. Rode via cron '
+        '(ex.: a cada hora e logo após a meia-noite).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desafio',
+            type=int,
+            action='append',
+            help='Avalia só o desafio com este id (pode repetir; padrão: todos os ativos)'
+        )
+
+    def handle(self, *args, **options):
+        desafios = desafios_pendentes()
+        if options['desafio']:
+            desafios = desafios.filter(pk__in=options['desafio'])
+
+        for desafio in desafios:
+            resultado = avaliar_desafio(desafio)
+            self.stdout.write(
+                f"  ✓ {desafio.titulo}: {resultado['avaliados']} avaliado(s), "
+                f"{resultado['completados']} completado(s), {resultado['falhados']} falhado(s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS('✅ Desafios avaliados!'))
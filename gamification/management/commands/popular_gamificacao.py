@@ -4,6 +4,7 @@ Execute: python manage.py popular_gamificacao
 """
 from django.core.management.base import BaseCommand
 from gamification.models import NivelFinanceiro, Conquista, TipoConquista
+from gamification.reference import invalidar_referencia
 
 
 class Command(BaseCommand):
@@ -16,6 +17,9 @@ class Command(BaseCommand):
         self.popular_tipos_conquista()
         self.popular_conquistas()
         
+        # Processos em execução recarregam níveis e conquistas
+        invalidar_referencia()
+        
         self.stdout.write(self.style.SUCCESS('✅ Sistema de gamificação populado com sucesso!'))
     
     def popular_niveis(self):
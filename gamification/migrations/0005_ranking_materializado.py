@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0004_perfilgamificacao_apelido_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosicaoRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontos', models.IntegerField(default=0)),
+                ('posicao', models.IntegerField(blank=True, help_text='Vazio para perfis privados', null=True)),
+            ],
+            options={
+                'verbose_name': 'Posição no Ranking',
+                'verbose_name_plural': 'Posições no Ranking',
+            },
+        ),
+        migrations.AddField(
+            model_name='ranking',
+            name='atualizado_ate',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='ranking',
+            constraint=models.UniqueConstraint(fields=('periodo', 'data_inicio'), name='gamif_ranking_periodo_inicio_uniq'),
+        ),
+        migrations.AddField(
+            model_name='posicaoranking',
+            name='perfil',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posicoes_ranking', to='gamification.perfilgamificacao'),
+        ),
+        migrations.AddField(
+            model_name='posicaoranking',
+            name='ranking',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posicoes', to='gamification.ranking'),
+        ),
+        migrations.AddIndex(
+            model_name='posicaoranking',
+            index=models.Index(fields=['ranking', 'posicao'], name='gamif_posicao_ranking_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='posicaoranking',
+            unique_together={('ranking', 'perfil')},
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0005_ranking_materializado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PontuacaoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('pontos', models.IntegerField(default=0)),
+                ('eventos', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Pontuação Diária',
+                'verbose_name_plural': 'Pontuações Diárias',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='historicogamificacao',
+            index=models.Index(fields=['perfil', '-criado_em'], name='gamif_hist_perfil_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicogamificacao',
+            index=models.Index(fields=['criado_em', 'perfil'], name='gamif_hist_data_perfil_idx'),
+        ),
+        migrations.AlterField(
+            model_name='historicogamificacao',
+            name='perfil',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='historico', to='gamification.perfilgamificacao'),
+        ),
+        migrations.AddField(
+            model_name='pontuacaodiaria',
+            name='perfil',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pontuacao_diaria', to='gamification.perfilgamificacao'),
+        ),
+        migrations.AddIndex(
+            model_name='pontuacaodiaria',
+            index=models.Index(fields=['dia', 'perfil'], name='gamif_pont_diaria_dia_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pontuacaodiaria',
+            unique_together={('perfil', 'dia')},
+        ),
+    ]
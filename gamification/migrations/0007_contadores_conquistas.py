@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:04
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _contagem(queryset, campo_usuario):
+    """Subquery com o total de linhas do usuário do perfil"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{campo_usuario: OuterRef('user_id')})
+            .order_by()
+            .values(campo_usuario)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        Value(0)
+    )
+
+
+def preencher_contadores(apps, schema_editor):
+    PerfilGamificacao = apps.get_model('gamification', 'PerfilGamificacao')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    Category = apps.get_model('categories', 'Category')
+    Budget = apps.get_model('accounts', 'Budget')
+    CreditCard = apps.get_model('accounts', 'CreditCard')
+
+    PerfilGamificacao.objects.update(
+        transacoes_registradas=_contagem(Transaction.objects.all(), 'account__user'),
+        categorias_criadas=_contagem(Category.objects.all(), 'user'),
+        orcamentos_criados=_contagem(Budget.objects.all(), 'user'),
+        cartoes_cadastrados=_contagem(CreditCard.objects.all(), 'account__user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0006_historico_indices_pontuacao_diaria'),
+        ('transactions', '0003_transaction_fingerprint'),
+        ('categories', '0003_categoryclassifier'),
+        ('accounts', '0002_budget_creditcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilgamificacao',
+            name='cartoes_cadastrados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='perfilgamificacao',
+            name='categorias_criadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='perfilgamificacao',
+            name='orcamentos_criados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='perfilgamificacao',
+            name='transacoes_registradas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
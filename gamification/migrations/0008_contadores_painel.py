@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _contagem(queryset):
+    """Subquery com o total de linhas do perfil"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(perfil=OuterRef('pk'))
+            .order_by()
+            .values('perfil')
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        Value(0)
+    )
+
+
+def preencher_contadores(apps, schema_editor):
+    PerfilGamificacao = apps.get_model('gamification', 'PerfilGamificacao')
+    ConquistaUsuario = apps.get_model('gamification', 'ConquistaUsuario')
+    DesafioUsuario = apps.get_model('gamification', 'DesafioUsuario')
+
+    # conquistas_desbloqueadas também: o dashboard passa a exibir o contador
+    PerfilGamificacao.objects.update(
+        conquistas_desbloqueadas=_contagem(ConquistaUsuario.objects.all()),
+        conquistas_nao_visualizadas=_contagem(ConquistaUsuario.objects.filter(visualizada=False)),
+        desafios_em_andamento=_contagem(DesafioUsuario.objects.filter(status='em_andamento')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0007_contadores_conquistas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilgamificacao',
+            name='conquistas_nao_visualizadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='perfilgamificacao',
+            name='desafios_em_andamento',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
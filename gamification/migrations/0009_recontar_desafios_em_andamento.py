@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:40
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def recontar_desafios_em_andamento(apps, schema_editor):
+    """Corrige contadores que ficaram negativos antes dos signals de DesafioUsuario"""
+    PerfilGamificacao = apps.get_model('gamification', 'PerfilGamificacao')
+    DesafioUsuario = apps.get_model('gamification', 'DesafioUsuario')
+
+    PerfilGamificacao.objects.update(
+        desafios_em_andamento=Coalesce(
+            Subquery(
+                DesafioUsuario.objects.filter(perfil=OuterRef('pk'), status='em_andamento')
+                .order_by()
+                .values('perfil')
+                .annotate(total=Count('pk'))
+                .values('total'),
+                output_field=IntegerField()
+            ),
+            Value(0)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0008_contadores_painel'),
+    ]
+
+    operations = [
+        migrations.RunPython(recontar_desafios_em_andamento, migrations.RunPython.noop),
+    ]
@@ -113,7 +113,15 @@ class PerfilGamificacao(models.Model):
     
     # Estatísticas
     conquistas_desbloqueadas = models.IntegerField(default=0)
+    conquistas_nao_visualizadas = models.IntegerField(default=0)
     desafios_completados = models.IntegerField(default=0)
+    desafios_em_andamento = models.IntegerField(default=0)
+    
+    # Contadores das regras de conquistas (ver achievements.py)
+    transacoes_registradas = models.IntegerField(default=0)
+    categorias_criadas = models.IntegerField(default=0)
+    orcamentos_criados = models.IntegerField(default=0)
+    cartoes_cadastrados = models.IntegerField(default=0)
     
     # Preferências
     notificacoes_gamificacao = models.BooleanField(default=True)
@@ -189,40 +197,22 @@ class PerfilGamificacao(models.Model):
         return f"{random.choice(adjetivos)} {random.choice(animais)}"
     # ========================================
     
-    def adicionar_pontos(self, pontos, descricao=""):
-        """Adiciona pontos e verifica se subiu de nível"""
-        self.pontos_totais += pontos
-        nivel_anterior = self.nivel_atual
-        
-        # Verifica se subiu de nível
-        novo_nivel = NivelFinanceiro.objects.filter(
-            pontos_necessarios__lte=self.pontos_totais
-        ).order_by('-pontos_necessarios').first()
+    def adicionar_pontos(self, pontos, descricao="", contadores=None):
+        """Adiciona pontos e verifica se subiu de nível (soma atômica, ver ledger.py)"""
+        from .ledger import Lancamento, creditar
         
-        if novo_nivel and (not self.nivel_atual or novo_nivel.numero > self.nivel_atual.numero):
-            self.nivel_atual = novo_nivel
-            self.save()
-            
-            # Registra a subida de nível
-            HistoricoGamificacao.objects.create(
-                perfil=self,
-                tipo='nivel_up',
-                descricao=f"Subiu para {novo_nivel.nome}!",
-                pontos=0
-            )
-            return True, novo_nivel
-        
-        self.save()
-        
-        # Registra os pontos ganhos
-        if descricao:
-            HistoricoGamificacao.objects.create(
-                perfil=self,
-                tipo='pontos',
-                descricao=descricao,
-                pontos=pontos
-            )
+        credito = creditar(
+            self.user_id,
+            [Lancamento(pontos, 'pontos', descricao or 'Pontos adicionados')],
+            contadores=contadores
+        )
+        for campo in ['pontos_totais', 'nivel_atual', *(contadores or {})]:
+            setattr(self, campo, getattr(credito.perfil, campo))
         
+        if credito.subiu_nivel:
+            from .achievements import NIVEL_ALCANCADO, publicar
+            publicar(self.user_id, NIVEL_ALCANCADO, credito.nivel.numero)
+            return True, credito.nivel
         return False, None
     
     def atualizar_streak(self):
@@ -233,7 +223,7 @@ class PerfilGamificacao(models.Model):
             # Primeira atividade
             self.streak_atual = 1
             self.ultima_atividade = hoje
-            self.save()
+            self.save(update_fields=['streak_atual', 'ultima_atividade', 'atualizado_em'])
             return True
         
         dias_diferenca = (hoje - self.ultima_atividade).days
@@ -247,34 +237,34 @@ class PerfilGamificacao(models.Model):
             if self.streak_atual > self.maior_streak:
                 self.maior_streak = self.streak_atual
             self.ultima_atividade = hoje
+            self.save(update_fields=['streak_atual', 'maior_streak', 'ultima_atividade', 'atualizado_em'])
             
             # Bônus de streak
             bonus = self.streak_atual * 2
             self.adicionar_pontos(bonus, f"Bônus de {self.streak_atual} dias consecutivos!")
-            
-            self.save()
             return True
         else:
             # Quebrou a sequência
             self.streak_atual = 1
             self.ultima_atividade = hoje
-            self.save()
+            self.save(update_fields=['streak_atual', 'ultima_atividade', 'atualizado_em'])
             return False
     
     def progresso_nivel(self):
         """Retorna o progresso percentual para o próximo nível"""
-        if not self.nivel_atual:
+        from .reference import nivel_por_id, nivel_por_numero
+        
+        nivel_atual = nivel_por_id(self.nivel_atual_id)
+        if not nivel_atual:
             return 0
         
-        proximo_nivel = NivelFinanceiro.objects.filter(
-            numero=self.nivel_atual.numero + 1
-        ).first()
+        proximo_nivel = nivel_por_numero(nivel_atual.numero + 1)
         
         if not proximo_nivel:
             return 100  # Já está no nível máximo
         
-        pontos_necessarios = proximo_nivel.pontos_necessarios - self.nivel_atual.pontos_necessarios
-        pontos_progresso = self.pontos_totais - self.nivel_atual.pontos_necessarios
+        pontos_necessarios = proximo_nivel.pontos_necessarios - nivel_atual.pontos_necessarios
+        pontos_progresso = self.pontos_totais - nivel_atual.pontos_necessarios
         
         return min(100, int((pontos_progresso / pontos_necessarios) * 100))
 
@@ -351,6 +341,13 @@ class Desafio(models.Model):
     def esta_ativo(self):
         hoje = timezone.now().date()
         return self.data_inicio <= hoje <= self.data_fim and self.status == 'ativo'
+    
+    def calcular_progresso(self, valor):
+        """Percentual (0 a 100) da meta atingido com ``valor``"""
+        meta = self.meta_valor or self.meta_percentual
+        if not meta:
+            return 0
+        return max(0, min(100, int((float(valor) / float(meta)) * 100)))
 
 
 class DesafioUsuario(models.Model):
@@ -384,11 +381,7 @@ class DesafioUsuario(models.Model):
     def atualizar_progresso(self, novo_valor):
         """Atualiza o progresso do desafio"""
         self.valor_alcancado = novo_valor
-        
-        if self.desafio.meta_valor:
-            self.progresso = min(100, int((float(novo_valor) / float(self.desafio.meta_valor)) * 100))
-        elif self.desafio.meta_percentual:
-            self.progresso = min(100, int(novo_valor))
+        self.progresso = self.desafio.calcular_progresso(novo_valor)
         
         if self.progresso >= 100:
             self.completar_desafio()
@@ -397,29 +390,26 @@ class DesafioUsuario(models.Model):
     
     def completar_desafio(self):
         """Marca o desafio como completado e entrega recompensas"""
+        from .achievements import desbloquear
+        
         if self.status == 'completado':
             return
         
+        # desafios_em_andamento é ajustado pelo save (signals.py)
         self.status = 'completado'
         self.completado_em = timezone.now()
         self.save()
         
-        # Adiciona pontos
+        # Adiciona pontos e atualiza os contadores
         subiu_nivel, novo_nivel = self.perfil.adicionar_pontos(
             self.desafio.pontos_recompensa,
-            f"Completou o desafio: {self.desafio.titulo}"
+            f"Completou o desafio: {self.desafio.titulo}",
+            contadores={'desafios_completados': 1}
         )
         
         # Desbloqueia conquista se houver
         if self.desafio.conquista_recompensa:
-            ConquistaUsuario.objects.get_or_create(
-                perfil=self.perfil,
-                conquista=self.desafio.conquista_recompensa
-            )
-        
-        # Atualiza contador
-        self.perfil.desafios_completados += 1
-        self.perfil.save()
+            desbloquear(self.perfil.user_id, [self.desafio.conquista_recompensa])
         
         return True
 
@@ -434,7 +424,8 @@ class HistoricoGamificacao(models.Model):
         ('streak', 'Streak Mantido'),
     ]
     
-    perfil = models.ForeignKey(PerfilGamificacao, on_delete=models.CASCADE, related_name='historico')
+    # Sem índice próprio: o índice (perfil, -criado_em) já começa pelo perfil
+    perfil = models.ForeignKey(PerfilGamificacao, on_delete=models.CASCADE, related_name='historico', db_index=False)
     tipo = models.CharField(max_length=20, choices=TIPOS)
     descricao = models.CharField(max_length=255)
     pontos = models.IntegerField(default=0)
@@ -445,11 +436,36 @@ class HistoricoGamificacao(models.Model):
         ordering = ['-criado_em']
         verbose_name = 'Histórico de Gamificação'
         verbose_name_plural = 'Históricos de Gamificação'
+        indexes = [
+            # Histórico de um perfil (dashboard, historico_view)
+            models.Index(fields=['perfil', '-criado_em'], name='gamif_hist_perfil_data_idx'),
+            # Intervalos de datas (rankings, consolidação, arquivamento)
+            models.Index(fields=['criado_em', 'perfil'], name='gamif_hist_data_perfil_idx'),
+        ]
     
     def __str__(self):
         return f"{self.perfil.user.username} - {self.tipo} - {self.criado_em.strftime('%d/%m/%Y')}"
 
 
+class PontuacaoDiaria(models.Model):
+    """Pontos de um perfil em um dia, consolidados do HistoricoGamificacao (ver retention.py)"""
+    perfil = models.ForeignKey(PerfilGamificacao, on_delete=models.CASCADE, related_name='pontuacao_diaria')
+    dia = models.DateField()
+    pontos = models.IntegerField(default=0)
+    eventos = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['perfil', 'dia']
+        indexes = [
+            models.Index(fields=['dia', 'perfil'], name='gamif_pont_diaria_dia_idx'),
+        ]
+        verbose_name = 'Pontuação Diária'
+        verbose_name_plural = 'Pontuações Diárias'
+    
+    def __str__(self):
+        return f"{self.perfil_id} - {self.dia.strftime('%d/%m/%Y')} - {self.pontos} pts"
+
+
 class Ranking(models.Model):
     """Ranking semanal/mensal de usuários"""
     PERIODO = [
@@ -465,12 +481,37 @@ class Ranking(models.Model):
     # Top 10 congelado
     top_usuarios = models.JSONField(default=dict, help_text="Top 10 usuários do período")
     
+    # Histórico já somado nas posições (ver leaderboard.py)
+    atualizado_ate = models.DateTimeField(null=True, blank=True)
+    
     criado_em = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-data_inicio']
         verbose_name = 'Ranking'
         verbose_name_plural = 'Rankings'
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'data_inicio'], name='gamif_ranking_periodo_inicio_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"Ranking {self.periodo} - {self.data_inicio.strftime('%d/%m/%Y')}"
+
+
+class PosicaoRanking(models.Model):
+    """Pontos e posição de um perfil em um Ranking materializado"""
+    ranking = models.ForeignKey(Ranking, on_delete=models.CASCADE, related_name='posicoes')
+    perfil = models.ForeignKey(PerfilGamificacao, on_delete=models.CASCADE, related_name='posicoes_ranking')
+    pontos = models.IntegerField(default=0)
+    posicao = models.IntegerField(null=True, blank=True, help_text="Vazio para perfis privados")
+    
+    class Meta:
+        unique_together = ['ranking', 'perfil']
+        indexes = [
+            models.Index(fields=['ranking', 'posicao'], name='gamif_posicao_ranking_idx'),
+        ]
+        verbose_name = 'Posição no Ranking'
+        verbose_name_plural = 'Posições no Ranking'
     
     def __str__(self):
-        return f"Ranking {self.periodo} - {self.data_inicio.strftime('%d/%m/%Y')}"
\ No newline at end of file
+        return f"{self.ranking} - {self.posicao}º ({self.pontos} pts)"
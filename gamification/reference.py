@@ -0,0 +1,108 @@
+"""
+Cache em memória dos dados de referência da gamificação.
+
+NivelFinanceiro e Conquista são tabelas pequenas que só mudam pelos
+comandos popular_gamificacao/atualizar_niveis ou pelo admin, mas eram
+consultadas a cada evento e a cada página. Aqui elas são carregadas uma
+vez por processo:
+
+- nivel_para_pontos usa bisect na lista de ``pontos_necessarios``;
+- conquista(codigo) é uma busca num dicionário.
+
+Qualquer save/delete desses modelos (signals.py, inclusive pelo admin) e
+o fim de popular_gamificacao/atualizar_niveis gravam uma nova versão em
+REFERENCE_VERSION_KEY no cache do Django; cada processo compara a versão
+antes de usar os dados e recarrega se mudou. Com um cache local
+(LocMemCache/DummyCache) a versão não chega aos outros processos, então
+os dados também são recarregados a cada GAMIFICATION_REFERENCE_TTL
+segundos.
+
+Os objetos devolvidos são compartilhados entre requisições: só leitura.
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Conquista, NivelFinanceiro
+
+REFERENCE_VERSION_KEY = 'gamificacao:referencia:versao'
+
+Referencia = namedtuple('Referencia', ['versao', 'carregada_em', 'limites', 'niveis', 'conquistas'])
+
+_lock = threading.Lock()
+_referencia = None
+
+
+def referencia():
+    """Dados de referência atuais, recarregados se a versão mudou ou passou do TTL"""
+    global _referencia
+    versao = cache.get(REFERENCE_VERSION_KEY)
+    ttl = getattr(settings, 'GAMIFICATION_REFERENCE_TTL', 60)
+    atual = _referencia
+    if atual is not None and atual.versao == versao and time.monotonic() - atual.carregada_em < ttl:
+        return atual
+
+    with _lock:
+        # None: invalidar_referencia() rodou depois da leitura de ``atual``
+        if _referencia is None or _referencia is atual:
+            niveis = list(NivelFinanceiro.objects.order_by('pontos_necessarios', 'numero'))
+            conquistas = {
+                conquista.codigo: conquista
+                for conquista in Conquista.objects.select_related('tipo')
+            }
+            _referencia = Referencia(
+                versao,
+                time.monotonic(),
+                [nivel.pontos_necessarios for nivel in niveis],
+                niveis,
+                conquistas
+            )
+        return _referencia
+
+
+def invalidar_referencia():
+    """Grava uma nova versão: todos os processos recarregam no próximo acesso"""
+    global _referencia
+    cache.set(REFERENCE_VERSION_KEY, time.time_ns(), None)
+    _referencia = None
+
+
+def niveis():
+    """Níveis ordenados por número"""
+    return sorted(referencia().niveis, key=lambda nivel: nivel.numero)
+
+
+def nivel_para_pontos(pontos):
+    """Maior nível cujo ``pontos_necessarios`` é <= ``pontos`` (None se não houver)"""
+    dados = referencia()
+    posicao = bisect.bisect_right(dados.limites, pontos)
+    return dados.niveis[posicao - 1] if posicao else None
+
+
+def proximo_nivel(pontos):
+    """Primeiro nível que exige mais que ``pontos`` (None no nível máximo)"""
+    dados = referencia()
+    posicao = bisect.bisect_right(dados.limites, pontos)
+    return dados.niveis[posicao] if posicao < len(dados.niveis) else None
+
+
+def nivel_por_id(nivel_id):
+    return next((nivel for nivel in referencia().niveis if nivel.pk == nivel_id), None)
+
+
+def nivel_por_numero(numero):
+    return next((nivel for nivel in referencia().niveis if nivel.numero == numero), None)
+
+
+def conquista(codigo):
+    """Conquista pelo código (None se não existir)"""
+    return referencia().conquistas.get(codigo)
+
+
+def conquistas():
+    """Todas as conquistas, na ordenação padrão do modelo"""
+    return list(referencia().conquistas.values())
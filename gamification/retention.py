@@ -0,0 +1,123 @@
+"""
+Consolidação e arquivamento do HistoricoGamificacao (usado por
+``manage.py arquivar_historico``).
+
+O histórico recebe uma linha a cada transação, streak, conquista e
+subida de nível, e só cresce. Aqui:
+
+- consolidar_pontuacao_diaria soma o histórico de cada dia completo em
+  PontuacaoDiaria (uma linha por perfil e dia). Os rankings (leaderboard.py)
+  leem os dias consolidados dessa tabela em vez do histórico bruto;
+- arquivar_historico apaga, em lotes, linhas mais antigas que N dias,
+  opcionalmente gravando-as antes num arquivo JSON Lines (.jsonl.gz). Só
+  apaga dias já consolidados e nada que um ranking ainda em andamento
+  precise ler.
+"""
+import gzip
+import json
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import HistoricoGamificacao, PontuacaoDiaria, Ranking
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def consolidado_ate():
+    """Último dia já somado em PontuacaoDiaria (None se nenhum)"""
+    return PontuacaoDiaria.objects.aggregate(ultimo=Max('dia'))['ultimo']
+
+
+def consolidar_pontuacao_diaria(ate_dia=None):
+    """
+    Soma em PontuacaoDiaria os dias completos ainda não consolidados.
+
+    Vai até ontem (ou ``ate_dia``); retorna quantas linhas criou. Todos os
+    dias pendentes entram numa única agregação, na mesma transação, então
+    o último dia consolidado é sempre um limite confiável.
+    """
+    ate_dia = min(ate_dia or timezone.localdate(), timezone.localdate() - timedelta(days=1))
+    ultimo = consolidado_ate()
+    desde = _inicio_do_dia(ultimo + timedelta(days=1)) if ultimo else None
+
+    historico = HistoricoGamificacao.objects.filter(criado_em__lt=_inicio_do_dia(ate_dia + timedelta(days=1)))
+    if desde:
+        historico = historico.filter(criado_em__gte=desde)
+
+    linhas = historico.annotate(dia=TruncDate('criado_em')).values('perfil_id', 'dia').annotate(
+        total=Sum('pontos'),
+        quantidade=Count('id')
+    ).order_by()
+
+    with transaction.atomic():
+        criadas = PontuacaoDiaria.objects.bulk_create([
+            PontuacaoDiaria(
+                perfil_id=linha['perfil_id'],
+                dia=linha['dia'],
+                pontos=linha['total'] or 0,
+                eventos=linha['quantidade']
+            )
+            for linha in linhas
+        ], batch_size=DEFAULT_BATCH_SIZE)
+    return len(criadas)
+
+
+def limite_arquivamento(dias):
+    """
+    Linhas criadas antes deste instante podem ser arquivadas: mais antigas
+    que ``dias``, de dias já consolidados e já lidas pelos rankings
+    semanais/mensais que ainda não fecharam.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+
+    ultimo = consolidado_ate()
+    if ultimo is None:
+        return None
+    limite = min(limite, _inicio_do_dia(ultimo + timedelta(days=1)))
+
+    abertos = Ranking.objects.exclude(periodo='geral').filter(
+        data_fim__gte=timezone.localdate() - timedelta(days=62)
+    ).values_list('data_fim', 'atualizado_ate')
+    for data_fim, atualizado_ate in abertos:
+        if atualizado_ate is None:
+            continue
+        if atualizado_ate < _inicio_do_dia(data_fim + timedelta(days=1)):
+            limite = min(limite, atualizado_ate)
+    return limite
+
+
+def arquivar_historico(dias, arquivo=None, batch_size=DEFAULT_BATCH_SIZE, limit=None):
+    """
+    Apaga (e grava em ``arquivo``, se informado) o histórico mais antigo
+    que ``dias`` dias, em lotes de ``batch_size``. Retorna quantas linhas.
+    """
+    limite = limite_arquivamento(dias)
+    if limite is None:
+        return 0
+
+    antigos = HistoricoGamificacao.objects.filter(criado_em__lt=limite).order_by('criado_em', 'perfil_id')
+    saida = gzip.open(arquivo, 'at', encoding='utf-8') if arquivo else None
+    apagadas = 0
+    try:
+        while limit is None or apagadas < limit:
+            tamanho = batch_size if limit is None else min(batch_size, limit - apagadas)
+            lote = list(antigos.values('id', 'perfil_id', 'tipo', 'descricao', 'pontos', 'criado_em')[:tamanho])
+            if not lote:
+                break
+            if saida:
+                for linha in lote:
+                    saida.write(json.dumps({**linha, 'criado_em': linha['criado_em'].isoformat()}, ensure_ascii=False) + '\n')
+                saida.flush()
+            apagadas += HistoricoGamificacao.objects.filter(pk__in=[linha['id'] for linha in lote]).delete()[0]
+    finally:
+        if saida:
+            saida.close()
+    return apagadas
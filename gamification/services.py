@@ -2,7 +2,6 @@
 Services para Sistema de Gamificação do Nebue
 Centraliza toda a lógica de negócio da gamificação
 """
-from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 import logging
@@ -14,56 +13,46 @@ class GamificationService:
     """Serviço centralizado para gamificação"""
     
     @staticmethod
-    def adicionar_pontos(user, pontos, tipo='geral', descricao='Pontos adicionados'):
+    def adicionar_pontos(user, pontos, tipo='geral', descricao='Pontos adicionados', contadores=None):
         """
-        Adiciona pontos ao usuário e registra no histórico
+        Adiciona pontos ao usuário e registra no histórico (ver gamification/ledger.py)
         """
-        from gamification.models import PerfilGamificacao, HistoricoGamificacao, NivelFinanceiro
+        from gamification import achievements
+        from gamification.ledger import Lancamento, creditar
         
         try:
-            with transaction.atomic():
-                perfil, created = PerfilGamificacao.objects.get_or_create(user=user)
-                perfil.pontos_totais += pontos
-                
-                HistoricoGamificacao.objects.create(
-                    perfil=perfil,
-                    pontos=pontos,
-                    tipo=tipo,
-                    descricao=descricao
-                )
-                
-                nivel_anterior = perfil.nivel_atual
-                novo_nivel = GamificationService._calcular_nivel(perfil.pontos_totais)
-                
-                if novo_nivel and novo_nivel != nivel_anterior:
-                    perfil.nivel_atual = novo_nivel
-                    
-                    HistoricoGamificacao.objects.create(
-                        perfil=perfil,
-                        pontos=50,
-                        tipo='nivel_up',
-                        descricao=f'🎊 Level UP! Você alcançou o nível {novo_nivel.numero}: {novo_nivel.nome}'
-                    )
-                    perfil.pontos_totais += 50
-                
-                perfil.save()
-                logger.info(f"{user.username} ganhou {pontos} pontos - Total: {perfil.pontos_totais}")
-                return perfil
-                
+            credito = creditar(user, [Lancamento(pontos, tipo, descricao)], contadores=contadores)
+            if credito.subiu_nivel:
+                achievements.publicar(user, achievements.NIVEL_ALCANCADO, credito.nivel.numero)
+            return credito.perfil
         except Exception as e:
             logger.error(f"Erro ao adicionar pontos: {e}")
             raise
     
+    @staticmethod
+    def registrar_evento(user, evento, pontos, tipo, descricao, **contexto):
+        """
+        Pontos de uma ação do usuário (transação, categoria, orçamento, cartão)
+        e as regras de conquista do evento (ver gamification/achievements.py)
+        """
+        from gamification import achievements
+        
+        contador = achievements.CONTADORES.get(evento)
+        perfil = GamificationService.adicionar_pontos(
+            user, pontos, tipo, descricao,
+            contadores={contador: 1} if contador else None
+        )
+        valor = getattr(perfil, contador) if contador else 0
+        achievements.publicar(user, evento, valor, valor - 1 if contador else None, **contexto)
+        return perfil
+    
     @staticmethod
     def _calcular_nivel(pontos_totais):
         """Calcula qual nível o usuário deve estar"""
-        from gamification.models import NivelFinanceiro
+        from gamification.reference import nivel_para_pontos
         
         try:
-            nivel = NivelFinanceiro.objects.filter(
-                pontos_necessarios__lte=pontos_totais
-            ).order_by('-pontos_necessarios').first()
-            return nivel
+            return nivel_para_pontos(pontos_totais)
         except Exception as e:
             logger.error(f"Erro ao calcular nível: {e}")
             return None
@@ -71,7 +60,8 @@ class GamificationService:
     @staticmethod
     def atualizar_streak(user):
         """Atualiza a sequência (streak) do usuário"""
-        from gamification.models import PerfilGamificacao, HistoricoGamificacao
+        from gamification import achievements
+        from gamification.models import PerfilGamificacao
         
         try:
             perfil, created = PerfilGamificacao.objects.get_or_create(user=user)
@@ -82,6 +72,7 @@ class GamificationService:
                 return perfil
             
             ontem = hoje - timedelta(days=1)
+            bonus_streak = 0
             
             if perfil.ultima_atividade == ontem:
                 # Mantém e aumenta streak
@@ -93,25 +84,29 @@ class GamificationService:
                 # Bônus por streak
                 bonus_streak = perfil.streak_atual * 5
                 
-                HistoricoGamificacao.objects.create(
-                    perfil=perfil,
-                    pontos=bonus_streak,
-                    tipo='streak',
-                    descricao=f'🔥 Sequência de {perfil.streak_atual} dias! Bônus streak'
-                )
-                perfil.pontos_totais += bonus_streak
-                
             elif perfil.ultima_atividade is None or perfil.ultima_atividade < ontem:
                 # Perdeu o streak, reinicia
                 if perfil.streak_atual > 0:
-                    logger.info(f"{user.username} perdeu o streak de {perfil.streak_atual} dias")
+                    logger.info(f"{user.email} perdeu o streak de {perfil.streak_atual} dias")
                 perfil.streak_atual = 1
             
             perfil.ultima_atividade = hoje
-            perfil.save()
+            # Só os campos do streak: os pontos são somados no banco pelo ledger
+            perfil.save(update_fields=['streak_atual', 'maior_streak', 'ultima_atividade', 'atualizado_em'])
+            
+            if bonus_streak:
+                perfil = GamificationService.adicionar_pontos(
+                    user,
+                    bonus_streak,
+                    'streak',
+                    f'🔥 Sequência de {perfil.streak_atual} dias! Bônus streak'
+                )
             
-            # Verifica conquistas de streak
-            GamificationService._verificar_conquistas_streak(user, perfil.streak_atual)
+            # Conquistas de streak: dispara ao cruzar a meta de dias
+            achievements.publicar(
+                user, achievements.STREAK_ATUALIZADO,
+                perfil.streak_atual, perfil.streak_atual - 1
+            )
             
             return perfil
             
@@ -119,55 +114,19 @@ class GamificationService:
             logger.error(f"Erro ao atualizar streak: {e}")
             return None
     
-    @staticmethod
-    def _verificar_conquistas_streak(user, streak_atual):
-        """Verifica conquistas relacionadas a streak"""
-        conquistas_streak = {
-            7: 'streak_7',
-            30: 'streak_30',
-            100: 'streak_100'
-        }
-        
-        if streak_atual in conquistas_streak:
-            GamificationService.verificar_e_desbloquear_conquista(
-                user, conquistas_streak[streak_atual]
-            )
-    
     @staticmethod
     def verificar_e_desbloquear_conquista(user, codigo_conquista):
         """Verifica e desbloqueia uma conquista específica"""
-        from gamification.models import PerfilGamificacao, Conquista, ConquistaUsuario, HistoricoGamificacao
+        from gamification.achievements import desbloquear
+        from gamification.reference import conquista as conquista_por_codigo
         
         try:
-            perfil, created = PerfilGamificacao.objects.get_or_create(user=user)
-            
-            try:
-                conquista = Conquista.objects.get(codigo=codigo_conquista)
-            except Conquista.DoesNotExist:
+            conquista = conquista_por_codigo(codigo_conquista)
+            if conquista is None:
                 logger.warning(f"Conquista {codigo_conquista} não existe")
                 return False
             
-            # Verifica se já possui
-            if ConquistaUsuario.objects.filter(perfil=perfil, conquista=conquista).exists():
-                return False
-            
-            # Desbloqueia
-            ConquistaUsuario.objects.create(perfil=perfil, conquista=conquista)
-            
-            # Adiciona pontos da conquista
-            HistoricoGamificacao.objects.create(
-                perfil=perfil,
-                pontos=conquista.pontos,
-                tipo='conquista',
-                descricao=f'🏆 Conquista desbloqueada: {conquista.titulo}'
-            )
-            
-            perfil.pontos_totais += conquista.pontos
-            perfil.conquistas_desbloqueadas += 1
-            perfil.save()
-            
-            logger.info(f"{user.username} desbloqueou conquista: {conquista.titulo}")
-            return True
+            return bool(desbloquear(user, [conquista]))
             
         except Exception as e:
             logger.error(f"Erro ao desbloquear conquista: {e}")
@@ -175,72 +134,27 @@ class GamificationService:
     
     @staticmethod
     def get_ranking(periodo='geral', limit=None):
-        """Retorna o ranking de usuários"""
-        from gamification.models import PerfilGamificacao, HistoricoGamificacao
-        from django.db.models import Sum, Subquery, OuterRef
+        """Retorna os perfis do topo do ranking materializado (ver leaderboard.py)"""
+        from gamification import leaderboard
         
         try:
-            if periodo == 'semanal':
-                data_inicio = timezone.now() - timedelta(days=7)
-                
-                perfis_com_pontos = HistoricoGamificacao.objects.filter(
-                    criado_em__gte=data_inicio
-                ).values_list('perfil_id', flat=True).distinct()
-                
-                perfis = PerfilGamificacao.objects.filter(
-                    id__in=perfis_com_pontos
-                ).select_related('user', 'nivel_atual')
-                
-                pontos_semana = HistoricoGamificacao.objects.filter(
-                    perfil=OuterRef('pk'),
-                    criado_em__gte=data_inicio
-                ).values('perfil').annotate(total=Sum('pontos')).values('total')
-                
-                perfis = perfis.annotate(pontos_periodo=Subquery(pontos_semana)).order_by('-pontos_periodo')
-                
-            elif periodo == 'mensal':
-                data_inicio = timezone.now() - timedelta(days=30)
-                
-                perfis_com_pontos = HistoricoGamificacao.objects.filter(
-                    criado_em__gte=data_inicio
-                ).values_list('perfil_id', flat=True).distinct()
-                
-                perfis = PerfilGamificacao.objects.filter(
-                    id__in=perfis_com_pontos
-                ).select_related('user', 'nivel_atual')
-                
-                pontos_mes = HistoricoGamificacao.objects.filter(
-                    perfil=OuterRef('pk'),
-                    criado_em__gte=data_inicio
-                ).values('perfil').annotate(total=Sum('pontos')).values('total')
-                
-                perfis = perfis.annotate(pontos_periodo=Subquery(pontos_mes)).order_by('-pontos_periodo')
-                
-            else:  # geral
-                perfis = PerfilGamificacao.objects.all().select_related(
-                    'user', 'nivel_atual'
-                ).order_by('-pontos_totais')
-            
-            if limit:
-                perfis = perfis[:limit]
-            
-            return perfis
+            return leaderboard.top(leaderboard.obter_ranking(periodo), limit)
             
         except Exception as e:
             logger.error(f"Erro ao buscar ranking: {e}")
-            return PerfilGamificacao.objects.none()
+            return []
     
     @staticmethod
     def get_posicao_usuario(user, periodo='geral'):
-        """Retorna a posição do usuário no ranking"""
+        """Retorna a posição do usuário no ranking materializado (ver leaderboard.py)"""
+        from gamification import leaderboard
+        from gamification.models import PerfilGamificacao
+        
         try:
-            ranking = GamificationService.get_ranking(periodo=periodo)
-            
-            for index, perfil in enumerate(ranking, start=1):
-                if perfil.user == user:
-                    return index
-            
-            return None
+            perfil = PerfilGamificacao.objects.filter(user=user).first()
+            if perfil is None:
+                return None
+            return leaderboard.posicao_usuario(leaderboard.obter_ranking(periodo), perfil)
             
         except Exception as e:
             logger.error(f"Erro ao buscar posição do usuário: {e}")
@@ -248,49 +162,11 @@ class GamificationService:
     
     @staticmethod
     def get_estatisticas_usuario(user):
-        """Retorna estatísticas completas do usuário"""
-        from gamification.models import PerfilGamificacao, ConquistaUsuario, NivelFinanceiro
+        """Retorna estatísticas completas do usuário (contadores do perfil, ver estatisticas.py)"""
+        from gamification.estatisticas import carregar_perfil, estatisticas
         
         try:
-            perfil, created = PerfilGamificacao.objects.get_or_create(user=user)
-            
-            total_conquistas = ConquistaUsuario.objects.filter(perfil=perfil).count()
-            conquistas_nao_vistas = ConquistaUsuario.objects.filter(
-                perfil=perfil, visualizada=False
-            ).count()
-            
-            proximo_nivel = NivelFinanceiro.objects.filter(
-                pontos_necessarios__gt=perfil.pontos_totais
-            ).order_by('pontos_necessarios').first()
-            
-            if proximo_nivel and perfil.nivel_atual:
-                nivel_atual_pontos = perfil.nivel_atual.pontos_necessarios
-                pontos_para_proximo = proximo_nivel.pontos_necessarios - nivel_atual_pontos
-                pontos_progresso = perfil.pontos_totais - nivel_atual_pontos
-                progresso_percentual = int((pontos_progresso / pontos_para_proximo) * 100) if pontos_para_proximo > 0 else 0
-            else:
-                progresso_percentual = 100 if not proximo_nivel else 0
-            
-            return {
-                'pontos_totais': perfil.pontos_totais,
-                'nivel': {
-                    'atual': perfil.nivel_atual,
-                    'proximo': proximo_nivel,
-                    'progresso': progresso_percentual
-                },
-                'streak': {
-                    'atual': perfil.streak_atual,
-                    'maior': perfil.maior_streak
-                },
-                'conquistas': {
-                    'total': total_conquistas,
-                    'nao_visualizadas': conquistas_nao_vistas
-                },
-                'desafios': {
-                    'completados': perfil.desafios_completados,
-                    'em_andamento': 0
-                }
-            }
+            return estatisticas(carregar_perfil(user))
             
         except Exception as e:
             logger.error(f"Erro ao buscar estatísticas: {e}")
@@ -1,10 +1,15 @@
 """
 Signals para Sistema de Gamificação do Nebue
 """
-from django.db.models.signals import post_save
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .services import GamificationService
+from django.utils import timezone
+from .models import NivelFinanceiro, Conquista, TipoConquista, DesafioUsuario, PerfilGamificacao
+from .reference import invalidar_referencia, nivel_por_numero
+from .achievements import CADASTRO, publicar
 import logging
 
 User = get_user_model()
@@ -17,21 +22,68 @@ def criar_perfil_gamificacao(sender, instance, created, **kwargs):
     Cria o perfil de gamificação quando o usuário se cadastra
     """
     if created:
-        from .models import PerfilGamificacao, NivelFinanceiro
+        from .models import PerfilGamificacao
         
         try:
-            nivel_inicial = NivelFinanceiro.objects.filter(numero=1).first()
+            nivel_inicial = nivel_por_numero(1)
             perfil, _ = PerfilGamificacao.objects.get_or_create(
                 user=instance,
                 defaults={'nivel_atual': nivel_inicial} if nivel_inicial else {}
             )
             
-            GamificationService.verificar_e_desbloquear_conquista(
-                instance, 
-                'bem_vindo'
-            )
+            publicar(instance, CADASTRO)
             
             logger.info(f"✅ Perfil criado para {instance.email}")
             
         except Exception as e:
-            logger.error(f"❌ Erro: {e}")
\ No newline at end of file
+            logger.error(f"❌ Erro: {e}")
+
+
+@receiver(post_save, sender=NivelFinanceiro)
+@receiver(post_delete, sender=NivelFinanceiro)
+@receiver(post_save, sender=Conquista)
+@receiver(post_delete, sender=Conquista)
+@receiver(post_save, sender=TipoConquista)
+def invalidar_cache_referencia(sender, **kwargs):
+    """
+    Níveis e conquistas mudaram (admin, popular_gamificacao, atualizar_niveis):
+    os processos recarregam o cache de referência (ver reference.py)
+    """
+    invalidar_referencia()
+
+
+@receiver(pre_save, sender=DesafioUsuario)
+def guardar_status_anterior_desafio(sender, instance, **kwargs):
+    """Guarda o status anterior para ajustar desafios_em_andamento só quando ele muda"""
+    instance._status_anterior = None
+    if instance.pk:
+        instance._status_anterior = DesafioUsuario.objects.filter(
+            pk=instance.pk
+        ).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=DesafioUsuario)
+def contar_desafio_em_andamento(sender, instance, **kwargs):
+    """
+    Mantém PerfilGamificacao.desafios_em_andamento em qualquer inscrição ou
+    mudança de status (views, admin, completar_desafio). A avaliação em
+    lote (challenges.py) usa bulk_update e ajusta o contador ela mesma.
+    """
+    anterior = getattr(instance, '_status_anterior', None)
+    _ajustar_em_andamento(instance.perfil_id, (instance.status == 'em_andamento') - (anterior == 'em_andamento'))
+
+
+@receiver(post_delete, sender=DesafioUsuario)
+def descontar_desafio_removido(sender, instance, **kwargs):
+    if instance.status == 'em_andamento':
+        _ajustar_em_andamento(instance.perfil_id, -1)
+
+
+def _ajustar_em_andamento(perfil_id, delta):
+    if not delta:
+        return
+    # O painel (estatisticas.py) é refeito quando o perfil muda
+    PerfilGamificacao.objects.filter(pk=perfil_id).update(
+        desafios_em_andamento=Greatest(F('desafios_em_andamento') + delta, Value(0)),
+        atualizado_em=timezone.now()
+    )
@@ -0,0 +1,427 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Account
+from transactions.models import Transaction
+
+from . import achievements, challenges, leaderboard, reference, retention
+from .models import (
+    Conquista, ConquistaUsuario, Desafio, DesafioUsuario, HistoricoGamificacao, PerfilGamificacao,
+    PontuacaoDiaria, Ranking, TipoConquista
+)
+from .services import GamificationService
+
+
+class _LockQueInvalida:
+    """Lock que simula invalidar_referencia() entre a leitura de ``atual`` e o lock"""
+
+    def __enter__(self):
+        reference.invalidar_referencia()
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class ReferenciaTests(TestCase):
+    def tearDown(self):
+        reference.invalidar_referencia()
+
+    def test_invalidacao_concorrente_recarrega_em_vez_de_devolver_none(self):
+        reference._referencia = reference.Referencia('antiga', 0, [], [], {})
+
+        with mock.patch.object(reference, '_lock', _LockQueInvalida()):
+            dados = reference.referencia()
+
+        self.assertIsNotNone(dados)
+        self.assertIs(reference._referencia, dados)
+
+
+@override_settings(GAMIFICATION_RANKING_STALE=60)
+class RankingTests(TestCase):
+    def setUp(self):
+        self.perfil = PerfilGamificacao.objects.get(
+            user=get_user_model().objects.create_user(email='ranking@teste.com', password='x')
+        )
+        PerfilGamificacao.objects.filter(pk=self.perfil.pk).update(pontos_totais=10)
+
+    def _pontos(self, ranking):
+        return ranking.posicoes.get(perfil=self.perfil).pontos
+
+    def test_ranking_recente_nao_e_refeito(self):
+        leaderboard.obter_ranking('geral')
+        PerfilGamificacao.objects.filter(pk=self.perfil.pk).update(pontos_totais=50)
+
+        self.assertEqual(self._pontos(leaderboard.obter_ranking('geral')), 10)
+
+    def test_ranking_velho_e_refeito_na_leitura(self):
+        leaderboard.obter_ranking('geral')
+        PerfilGamificacao.objects.filter(pk=self.perfil.pk).update(pontos_totais=50)
+        Ranking.objects.filter(periodo='geral').update(atualizado_ate=timezone.now() - timedelta(seconds=61))
+
+        self.assertEqual(self._pontos(leaderboard.obter_ranking('geral')), 50)
+
+    def test_get_ranking_usa_o_ranking_materializado(self):
+        perfis = GamificationService.get_ranking('geral', limit=10)
+
+        self.assertEqual([(perfil.pk, perfil.pontos_ranking) for perfil in perfis], [(self.perfil.pk, 10)])
+
+    def test_perfil_que_fica_privado_some_antes_da_atualizacao(self):
+        ranking = leaderboard.obter_ranking('geral')
+        PerfilGamificacao.objects.filter(pk=self.perfil.pk).update(perfil_publico=False)
+
+        self.assertEqual(leaderboard.top(leaderboard.obter_ranking('geral')), [])
+        self.assertEqual(leaderboard.top_congelado(ranking), [])
+        self.assertEqual(ranking.top_usuarios['usuarios'][0]['perfil_id'], self.perfil.pk)
+
+    def test_primeira_geracao_tambem_usa_a_trava(self):
+        self.client.force_login(self.perfil.user)
+
+        with mock.patch.object(leaderboard.cache, 'add', return_value=False):
+            self.assertIsNone(leaderboard.obter_ranking('geral'))
+            self.assertEqual(GamificationService.get_ranking('geral'), [])
+            response = self.client.get(reverse('gamification:ranking'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Ranking.objects.filter(periodo='geral').exists())
+
+
+class DesafiosEmAndamentoTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='desafio@teste.com', password='x')
+        self.perfil = PerfilGamificacao.objects.get(user=self.user)
+        hoje = timezone.localdate()
+        self.desafio = Desafio.objects.create(
+            titulo='Economizar',
+            descricao='Guardar R$ 100',
+            periodo='mensal',
+            meta_tipo='economia',
+            meta_valor=100,
+            data_inicio=hoje,
+            data_fim=hoje + timedelta(days=30)
+        )
+
+    def _em_andamento(self):
+        return PerfilGamificacao.objects.values_list('desafios_em_andamento', flat=True).get(pk=self.perfil.pk)
+
+    def test_participar_e_completar(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('gamification:participar_desafio', args=[self.desafio.pk]))
+        self.assertEqual(self._em_andamento(), 1)
+
+        DesafioUsuario.objects.get(perfil=self.perfil).completar_desafio()
+        self.assertEqual(self._em_andamento(), 0)
+
+    def test_inscricao_fora_da_view_tambem_conta(self):
+        participacao = DesafioUsuario.objects.create(perfil=self.perfil, desafio=self.desafio)
+        self.assertEqual(self._em_andamento(), 1)
+
+        participacao.status = 'desistiu'
+        participacao.save()
+        participacao.save()
+        self.assertEqual(self._em_andamento(), 0)
+
+        participacao.delete()
+        self.assertEqual(self._em_andamento(), 0)
+
+    def test_remover_participacao_em_andamento(self):
+        DesafioUsuario.objects.create(perfil=self.perfil, desafio=self.desafio)
+        DesafioUsuario.objects.filter(perfil=self.perfil).delete()
+
+        self.assertEqual(self._em_andamento(), 0)
+
+
+class PerfilUpdateFieldsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='privacidade@teste.com', password='x')
+        self.perfil = PerfilGamificacao.objects.get(user=self.user)
+
+    def test_privacidade_nao_regrava_contadores(self):
+        self.client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse('gamification:configuracoes_privacidade'),
+                {'perfil_publico': 'on', 'apelido': 'Poupador'}
+            )
+
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "gamification_perfilgamificacao"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"pontos_totais"', updates[0])
+        self.perfil.refresh_from_db()
+        self.assertEqual((self.perfil.apelido, self.perfil.perfil_publico), ('Poupador', True))
+
+    def test_streak_atualiza_atualizado_em(self):
+        antes = timezone.now() - timedelta(days=1)
+        PerfilGamificacao.objects.filter(pk=self.perfil.pk).update(atualizado_em=antes, ultima_atividade=None)
+        self.perfil.refresh_from_db()
+
+        self.perfil.atualizar_streak()
+
+        self.perfil.refresh_from_db()
+        self.assertEqual(self.perfil.streak_atual, 1)
+        self.assertGreater(self.perfil.atualizado_em, antes)
+
+
+class ArquivamentoHistoricoTests(TestCase):
+    def setUp(self):
+        self.perfil = PerfilGamificacao.objects.get(
+            user=get_user_model().objects.create_user(email='historico@teste.com', password='x')
+        )
+        HistoricoGamificacao.objects.all().delete()
+
+    def _historico(self, dias_atras, pontos=10):
+        historico = HistoricoGamificacao.objects.create(
+            perfil=self.perfil, tipo='pontos', descricao='Transação registrada', pontos=pontos
+        )
+        HistoricoGamificacao.objects.filter(pk=historico.pk).update(
+            criado_em=timezone.now() - timedelta(days=dias_atras)
+        )
+        return historico
+
+    def test_so_apaga_dias_consolidados_e_mais_antigos_que_o_prazo(self):
+        antigo = self._historico(200)
+        self._historico(100, pontos=5)
+        self._historico(0, pontos=1)
+        self.assertEqual(retention.arquivar_historico(180), 0)
+
+        self.assertEqual(retention.consolidar_pontuacao_diaria(), 2)
+        self.assertEqual(retention.consolidar_pontuacao_diaria(), 0)
+        self.assertEqual(retention.arquivar_historico(180), 1)
+        self.assertEqual(retention.arquivar_historico(180), 0)
+
+        self.assertFalse(HistoricoGamificacao.objects.filter(pk=antigo.pk).exists())
+        self.assertEqual(HistoricoGamificacao.objects.count(), 2)
+        self.assertEqual(PontuacaoDiaria.objects.aggregate(total=Sum('pontos'))['total'], 15)
+
+    def test_ranking_aberto_segura_o_historico_que_ainda_nao_leu(self):
+        historico = self._historico(3)
+        retention.consolidar_pontuacao_diaria()
+        hoje = timezone.localdate()
+        ranking = Ranking.objects.create(
+            periodo='semanal',
+            data_inicio=hoje - timedelta(days=6),
+            data_fim=hoje + timedelta(days=1),
+            atualizado_ate=timezone.now() - timedelta(days=4)
+        )
+
+        self.assertEqual(retention.arquivar_historico(1), 0)
+
+        Ranking.objects.filter(pk=ranking.pk).update(atualizado_ate=timezone.now())
+        self.assertEqual(retention.arquivar_historico(1), 1)
+        self.assertFalse(HistoricoGamificacao.objects.filter(pk=historico.pk).exists())
+
+    def test_limite_por_execucao_e_arquivo(self):
+        for dias_atras in range(10, 15):
+            self._historico(dias_atras)
+        retention.consolidar_pontuacao_diaria()
+
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'historico.jsonl.gz')
+            self.assertEqual(retention.arquivar_historico(1, arquivo=arquivo, batch_size=2, limit=3), 3)
+            self.assertEqual(HistoricoGamificacao.objects.count(), 2)
+            self.assertEqual(retention.arquivar_historico(1, arquivo=arquivo, batch_size=2), 2)
+
+            with gzip.open(arquivo, 'rt', encoding='utf-8') as entrada:
+                linhas = [json.loads(linha) for linha in entrada]
+        self.assertEqual(len(linhas), 5)
+        self.assertEqual({linha['perfil_id'] for linha in linhas}, {self.perfil.pk})
+        self.assertFalse(HistoricoGamificacao.objects.exists())
+
+
+class RegrasConquistasTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='conquistas@teste.com', password='x')
+        tipo = TipoConquista.objects.create(categoria='transacoes', nome='Transações', icone='fa-exchange-alt', cor='#3b82f6')
+        self.tres = self._conquista(tipo, 'tres_transacoes', meta_quantidade=3)
+        self.cinco = self._conquista(tipo, 'cinco_transacoes', meta_quantidade=5)
+        self.madrugador = self._conquista(tipo, 'madrugador')
+        self.pontos_iniciais = self._perfil().pontos_totais
+
+    def tearDown(self):
+        reference.invalidar_referencia()
+
+    def _conquista(self, tipo, codigo, **metas):
+        conquista = Conquista.objects.create(
+            tipo=tipo, titulo=codigo, descricao=codigo, pontos=50, icone='fa-trophy', condicao=codigo, **metas
+        )
+        Conquista.objects.filter(pk=conquista.pk).update(codigo=codigo)
+        conquista.codigo = codigo
+        reference.invalidar_referencia()
+        return conquista
+
+    def _perfil(self):
+        return PerfilGamificacao.objects.get(user=self.user)
+
+    def test_dispara_so_ao_cruzar_a_meta(self):
+        self.assertEqual(achievements.publicar(self.user, achievements.TRANSACAO_CRIADA, 2, 1), [])
+        self.assertEqual(achievements.publicar(self.user, achievements.TRANSACAO_CRIADA, 3, 2), [self.tres])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(achievements.publicar(self.user, achievements.TRANSACAO_CRIADA, 4, 3), [])
+
+        perfil = self._perfil()
+        self.assertEqual(perfil.conquistas_desbloqueadas, 1)
+        self.assertEqual(perfil.pontos_totais - self.pontos_iniciais, 50)
+
+    def test_metas_cruzadas_no_mesmo_evento_sao_gravadas_juntas(self):
+        with CaptureQueriesContext(connection) as queries:
+            desbloqueadas = achievements.publicar(self.user, achievements.TRANSACAO_CRIADA, 5, 2)
+
+        self.assertEqual({conquista.pk for conquista in desbloqueadas}, {self.tres.pk, self.cinco.pk})
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO "gamification_conquistausuario"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self._perfil().pontos_totais - self.pontos_iniciais, 100)
+
+    def test_conquista_ja_desbloqueada_nao_repete(self):
+        achievements.publicar(self.user, achievements.TRANSACAO_CRIADA, 3, 2)
+
+        self.assertEqual(achievements.publicar(self.user, achievements.TRANSACAO_CRIADA, 3, 2), [])
+        self.assertEqual(ConquistaUsuario.objects.filter(conquista=self.tres).count(), 1)
+        self.assertEqual(self._perfil().pontos_totais - self.pontos_iniciais, 50)
+
+    def test_condicao_extra_dispara_fora_da_meta(self):
+        self.assertEqual(achievements.publicar(self.user, achievements.TRANSACAO_CRIADA, 7, 6, hora=10), [])
+        self.assertEqual(achievements.publicar(self.user, achievements.TRANSACAO_CRIADA, 7, 6, hora=3), [self.madrugador])
+
+    def test_registrar_evento_soma_o_contador_e_desbloqueia(self):
+        for _ in range(3):
+            GamificationService.registrar_evento(self.user, achievements.TRANSACAO_CRIADA, 10, 'pontos', 'Transação')
+
+        perfil = self._perfil()
+        self.assertEqual(perfil.transacoes_registradas, 3)
+        self.assertEqual(perfil.pontos_totais - self.pontos_iniciais, 80)
+        self.assertTrue(ConquistaUsuario.objects.filter(perfil=perfil, conquista=self.tres).exists())
+
+
+class AvaliacaoDesafiosTests(TestCase):
+    def setUp(self):
+        self.hoje = timezone.localdate()
+        tipo = TipoConquista.objects.create(categoria='economia', nome='Economia', icone='fa-piggy-bank', cor='#22c55e')
+        self.conquista = Conquista.objects.create(
+            tipo=tipo, titulo='Poupador', descricao='Poupador', pontos=30, icone='fa-trophy', condicao='Desafio'
+        )
+        self.desafio = Desafio.objects.create(
+            titulo='Guardar R$ 100',
+            descricao='Guardar R$ 100',
+            periodo='mensal',
+            meta_tipo='economia',
+            meta_valor=100,
+            pontos_recompensa=50,
+            conquista_recompensa=self.conquista,
+            data_inicio=self.hoje - timedelta(days=5),
+            data_fim=self.hoje + timedelta(days=20)
+        )
+        self.contas = {}
+
+    def tearDown(self):
+        reference.invalidar_referencia()
+
+    def _participante(self, email, desafio=None):
+        user = get_user_model().objects.create_user(email=email, password='x')
+        self.contas[user.pk] = Account.objects.create(user=user, name='Conta', bank_name='Banco')
+        perfil = PerfilGamificacao.objects.get(user=user)
+        return DesafioUsuario.objects.create(perfil=perfil, desafio=desafio or self.desafio)
+
+    def _transacao(self, participante, tipo, valor, dias_atras=1):
+        conta = self.contas[participante.perfil.user_id]
+        Transaction.objects.create(
+            account=conta,
+            category=conta.user.categories.filter(category_type=tipo).first(),
+            transaction_type=tipo,
+            amount=Decimal(valor),
+            transaction_date=self.hoje - timedelta(days=dias_atras),
+            description='Lançamento'
+        )
+
+    def _perfil(self, participante):
+        return PerfilGamificacao.objects.get(pk=participante.perfil_id)
+
+    def test_completa_em_lote_e_entrega_a_recompensa_uma_vez(self):
+        poupador = self._participante('poupador@teste.com')
+        parcial = self._participante('parcial@teste.com')
+        self._transacao(poupador, 'INCOME', '200.00')
+        self._transacao(poupador, 'EXPENSE', '50.00')
+        self._transacao(parcial, 'INCOME', '60.00')
+        pontos_iniciais = self._perfil(poupador).pontos_totais
+
+        resultado = challenges.avaliar_desafio(self.desafio, self.hoje)
+
+        self.assertEqual(resultado, {'avaliados': 2, 'completados': 1, 'falhados': 0})
+        poupador.refresh_from_db()
+        parcial.refresh_from_db()
+        self.assertEqual((poupador.status, poupador.progresso, poupador.valor_alcancado), ('completado', 100, Decimal('150.00')))
+        self.assertEqual((parcial.status, parcial.progresso, parcial.valor_alcancado), ('em_andamento', 60, Decimal('60.00')))
+
+        perfil = self._perfil(poupador)
+        self.assertEqual(perfil.pontos_totais - pontos_iniciais, 80)
+        self.assertEqual((perfil.desafios_completados, perfil.desafios_em_andamento), (1, 0))
+        self.assertTrue(ConquistaUsuario.objects.filter(perfil=perfil, conquista=self.conquista).exists())
+
+        self.assertEqual(challenges.avaliar_desafio(self.desafio, self.hoje), {'avaliados': 1, 'completados': 0, 'falhados': 0})
+        self.assertEqual(self._perfil(poupador).pontos_totais - pontos_iniciais, 80)
+
+    def test_consultas_nao_crescem_com_os_participantes(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as queries:
+                challenges.avaliar_desafio(self.desafio, self.hoje)
+            return len(queries)
+
+        primeiro = self._participante('primeiro@teste.com')
+        self._transacao(primeiro, 'INCOME', '10.00')
+        com_um = consultas()
+
+        for numero in range(4):
+            participante = self._participante(f'participante{numero}@teste.com')
+            self._transacao(participante, 'INCOME', f'{20 + numero}.00')
+        self._transacao(primeiro, 'INCOME', '5.00')
+
+        self.assertEqual(consultas(), com_um)
+
+    def test_fim_do_periodo_falha_quem_nao_completou(self):
+        participante = self._participante('falhou@teste.com')
+        self._transacao(participante, 'INCOME', '40.00')
+
+        resultado = challenges.avaliar_desafio(self.desafio, self.desafio.data_fim + timedelta(days=1))
+
+        self.assertEqual(resultado, {'avaliados': 1, 'completados': 0, 'falhados': 1})
+        participante.refresh_from_db()
+        self.assertEqual((participante.status, participante.progresso), ('falhado', 40))
+        self.assertEqual(self._perfil(participante).desafios_em_andamento, 0)
+        self.desafio.refresh_from_db()
+        self.assertEqual(self.desafio.status, 'finalizado')
+        self.assertNotIn(self.desafio, challenges.desafios_pendentes(self.hoje))
+
+    def test_reduzir_gastos_so_completa_no_fim_do_periodo(self):
+        desafio = Desafio.objects.create(
+            titulo='Gastar 20% menos',
+            descricao='Gastar 20% menos',
+            periodo='personalizado',
+            meta_tipo='reduzir_gastos',
+            meta_percentual=20,
+            data_inicio=self.hoje - timedelta(days=4),
+            data_fim=self.hoje + timedelta(days=5)
+        )
+        participante = self._participante('reduziu@teste.com', desafio)
+        self._transacao(participante, 'EXPENSE', '200.00', dias_atras=12)
+        self._transacao(participante, 'EXPENSE', '100.00')
+
+        self.assertEqual(challenges.avaliar_desafio(desafio, self.hoje)['completados'], 0)
+        participante.refresh_from_db()
+        self.assertEqual((participante.status, participante.valor_alcancado), ('em_andamento', Decimal('50.00')))
+
+        self.assertEqual(challenges.avaliar_desafio(desafio, desafio.data_fim + timedelta(days=1))['completados'], 1)
+        participante.refresh_from_db()
+        self.assertEqual(participante.status, 'completado')
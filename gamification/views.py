@@ -4,57 +4,28 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
+from django.utils import timezone
 from .models import (
-    PerfilGamificacao, Conquista, ConquistaUsuario,
-    Desafio, DesafioUsuario, HistoricoGamificacao, NivelFinanceiro
+    PerfilGamificacao, ConquistaUsuario,
+    Desafio, DesafioUsuario, HistoricoGamificacao
 )
+from . import estatisticas, leaderboard, reference
 from .services import GamificationService
 
 
 @login_required
 def dashboard_gamificacao(request):
-    """Dashboard principal de gamificação"""
-    # Atualiza streak do dia
-    GamificationService.atualizar_streak(request.user)
-    
-    # Busca ou cria perfil
-    perfil, created = PerfilGamificacao.objects.get_or_create(user=request.user)
-    
-    # Estatísticas completas
-    stats = GamificationService.get_estatisticas_usuario(request.user)
-    
-    # Próximo nível
-    proximo_nivel = NivelFinanceiro.objects.filter(
-        pontos_necessarios__gt=perfil.pontos_totais
-    ).order_by('pontos_necessarios').first()
-    
-    # Conquistas recentes (últimas 5)
-    conquistas_recentes = ConquistaUsuario.objects.filter(
-        perfil=perfil
-    ).select_related('conquista').order_by('-desbloqueada_em')[:5]
-    
-    # Histórico recente (últimas 10 ações)
-    historico = HistoricoGamificacao.objects.filter(
-        perfil=perfil
-    ).order_by('-criado_em')[:10]
-    
-    # Desafios ativos (se você tiver implementado)
-    desafios_ativos = []
-    try:
-        desafios_ativos = DesafioUsuario.objects.filter(
-            perfil=perfil,
-            status='em_andamento'
-        ).select_related('desafio')[:3]
-    except:
-        pass
+    """Dashboard principal de gamificação (só leitura, ver estatisticas.py)"""
+    perfil = estatisticas.carregar_perfil(request.user)
+    retrato = estatisticas.painel(perfil)
     
     context = {
         'perfil': perfil,
-        'stats': stats,
-        'proximo_nivel': proximo_nivel,
-        'conquistas_recentes': conquistas_recentes,
-        'historico': historico,
-        'desafios_ativos': desafios_ativos,
+        'stats': retrato['stats'],
+        'proximo_nivel': retrato['stats']['nivel']['proximo'],
+        'conquistas_recentes': retrato['conquistas_recentes'],
+        'historico': retrato['historico'],
+        'desafios_ativos': retrato['desafios_ativos'],
     }
     
     return render(request, 'gamification/dashboard.html', context)
@@ -66,7 +37,7 @@ def conquistas_list(request):
     perfil, created = PerfilGamificacao.objects.get_or_create(user=request.user)
     
     # Todas as conquistas
-    todas_conquistas = Conquista.objects.all().select_related('tipo')
+    todas_conquistas = reference.conquistas()
     
     # IDs das conquistas desbloqueadas
     conquistas_desbloqueadas_ids = list(
@@ -74,7 +45,7 @@ def conquistas_list(request):
     )
     
     # Contadores
-    total = todas_conquistas.count()
+    total = len(todas_conquistas)
     desbloqueadas_count = len(conquistas_desbloqueadas_ids)
     progresso = int((desbloqueadas_count / total * 100)) if total > 0 else 0
     
@@ -97,34 +68,19 @@ def ranking_view(request):
     if periodo not in ['semanal', 'mensal', 'geral']:
         periodo = 'geral'
     
-    # ========================================
-    # MODIFICADO: Busca apenas perfis públicos
-    # ========================================
-    ranking = PerfilGamificacao.objects.filter(
-        perfil_publico=True  # Respeita configuração de privacidade
-    ).select_related('user', 'nivel_atual').order_by('-pontos_totais')[:100]
+    # Ranking materializado (leaderboard.py): só perfis públicos têm posição
+    ranking_periodo = leaderboard.obter_ranking(periodo)
+    ranking = leaderboard.top(ranking_periodo, 100)
     
-    # Busca posição do usuário atual
-    try:
-        perfil_user = PerfilGamificacao.objects.get(user=request.user)
-        
-        if perfil_user.perfil_publico:
-            # Conta quantos perfis públicos tem mais pontos
-            posicao_user = PerfilGamificacao.objects.filter(
-                perfil_publico=True,
-                pontos_totais__gt=perfil_user.pontos_totais
-            ).count() + 1
-        else:
-            posicao_user = None  # Usuário está no modo privado
-    except PerfilGamificacao.DoesNotExist:
-        posicao_user = None
-    # ========================================
+    perfil_user = PerfilGamificacao.objects.filter(user=request.user).first()
+    posicao_user = leaderboard.posicao_usuario(ranking_periodo, perfil_user) if perfil_user else None
     
     context = {
         'ranking': ranking,
         'periodo': periodo,
         'posicao_user': posicao_user,
-        'perfil_user': perfil_user if 'perfil_user' in locals() else None,
+        'perfil_user': perfil_user,
+        'atualizado_ate': ranking_periodo and ranking_periodo.atualizado_ate,
     }
     
     return render(request, 'gamification/ranking.html', context)
@@ -136,7 +92,7 @@ def niveis_view(request):
     perfil, created = PerfilGamificacao.objects.get_or_create(user=request.user)
     
     # Todos os níveis ordenados
-    todos_niveis = NivelFinanceiro.objects.all().order_by('numero')
+    todos_niveis = reference.niveis()
     
     context = {
         'perfil': perfil,
@@ -224,7 +180,7 @@ def participar_desafio(request, desafio_id):
             messages.warning(request, 'Você já está participando deste desafio!')
             return redirect('gamification:desafios_list')
         
-        # Inscreve no desafio
+        # Inscreve no desafio (o contador do perfil é ajustado em signals.py)
         DesafioUsuario.objects.create(
             perfil=perfil,
             desafio=desafio
@@ -255,7 +211,8 @@ def configuracoes_privacidade(request):
         if apelido_personalizado:
             perfil.apelido = apelido_personalizado
         
-        perfil.save()
+        # Só os campos do formulário: pontos e contadores são mantidos por F()
+        perfil.save(update_fields=['exibir_nome_real', 'perfil_publico', 'apelido', 'atualizado_em'])
         
         messages.success(request, '✅ Configurações de privacidade atualizadas com sucesso!')
         return redirect('gamification:configuracoes_privacidade')
@@ -310,5 +267,9 @@ def marcar_conquistas_vistas(request):
         perfil=perfil,
         visualizada=False
     ).update(visualizada=True)
+    PerfilGamificacao.objects.filter(pk=perfil.pk).update(
+        conquistas_nao_visualizadas=0,
+        atualizado_em=timezone.now()
+    )
     
     return JsonResponse({'success': True})
\ No newline at end of file
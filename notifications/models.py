@@ -126,6 +126,28 @@ class Notification(models.Model):
             link='/cartoes/'
         )
     
+    @classmethod
+    def build_invoice_closed(cls, user_id, card_name, month, year, amount):
+        """Build (unsaved) notification for a closed card invoice, for bulk_create."""
+        return cls(
+            user_id=user_id,
+            notification_type=cls.NotificationType.CARD,
+            title=f'Fatura {month:02d}/{year} do {card_name} fechada',
+            message=f'O valor da fatura é R$ {amount:.2f}.',
+            link='/cartoes/'
+        )
+    
+    @classmethod
+    def build_invoice_overdue(cls, user_id, card_name, month, year, pending):
+        """Build (unsaved) notification for an overdue card invoice, for bulk_create."""
+        return cls(
+            user_id=user_id,
+            notification_type=cls.NotificationType.CARD,
+            title=f'Fatura {month:02d}/{year} do {card_name} em atraso',
+            message=f'Ainda há R$ {pending:.2f} pendentes nesta fatura.',
+            link='/cartoes/'
+        )
+    
     @classmethod
     def create_low_balance_alert(cls, user, account):
         """Create notification when account balance is low."""
@@ -2,6 +2,7 @@ from django import forms
 
 from accounts.models import Account
 from categories.models import Category
+from .importers import get_parser, supported_extensions
 from .models import Profile
 
 
@@ -25,19 +26,20 @@ class ProfileForm(forms.ModelForm):
 
 class OFXImportForm(forms.Form):
     """
-    Form for importing OFX/OFC bank statement files.
+    Form for importing bank statement files (OFX/QFX, CSV, CNAB 240/400).
     
     Allows users to upload their bank statement files and select
-    which account the transactions should be imported into.
+    which account the transactions should be imported into. The parser
+    matching the file is exposed as cleaned_data['parser'].
     """
     
     ofx_file = forms.FileField(
-        label='Arquivo OFX/OFC',
-        help_text='Arquivo de extrato bancário em formato OFX ou OFC',
+        label='Arquivo de extrato',
+        help_text='Extrato bancário em OFX, OFC, QFX, CSV ou CNAB 240/400 (.ret, .txt)',
         widget=forms.FileInput(attrs={
             'class': 'hidden',
             'id': 'ofx-file-input',
-            'accept': '.ofx,.OFX,.ofc,.OFC',
+            'accept': ','.join(supported_extensions()),
         })
     )
     
@@ -68,23 +70,23 @@ class OFXImportForm(forms.Form):
     
     def clean_ofx_file(self):
         """
-        Validate that the uploaded file is in OFX/OFC format.
+        Validate that the uploaded file is in a supported statement format.
         
         Returns:
             File: The validated file object
             
         Raises:
-            ValidationError: If file extension is not .ofx or .ofc
+            ValidationError: If no registered parser accepts the file
         """
         ofx_file = self.cleaned_data.get('ofx_file')
         
         if ofx_file:
-            # Check file extension
-            file_name = ofx_file.name.lower()
-            if not (file_name.endswith('.ofx') or file_name.endswith('.ofc')):
+            parser = get_parser(ofx_file)
+            if parser is None:
                 raise forms.ValidationError(
-                    'Arquivo inválido. Por favor, envie um arquivo .OFX ou .OFC'
+                    'Formato não suportado. Envie um extrato em OFX, OFC, QFX, CSV ou CNAB 240/400.'
                 )
+            self.cleaned_data['parser'] = parser
             
             # Check file size (max 5MB)
             if ofx_file.size > 5 * 1024 * 1024:
@@ -100,20 +102,23 @@ class OFXPreviewConfirmForm(forms.Form):
     Form for confirming OFX import after preview.
     
     Allows users to review and modify category mappings before final import.
-    Each transaction can have its category changed by the user.
+    Each staged row (OFXImportRow) of the current preview page can have its
+    category changed by the user. Date, description and amount stay on the
+    server, so only one field per row is posted.
     """
     
     def __init__(self, *args, **kwargs):
         """
-        Dynamically create category selection fields for each transaction.
+        Dynamically create a category selection field for each staged row.
         
         Args:
-            transactions_data: List of parsed transaction dictionaries
+            rows: OFXImportRow objects shown on the current preview page
             user: Current user (for filtering categories)
         """
-        transactions_data = kwargs.pop('transactions_data', [])
+        rows = kwargs.pop('rows', [])
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        self.rows = rows
         
         if user:
             # Get user categories grouped by type
@@ -126,34 +131,31 @@ class OFXPreviewConfirmForm(forms.Form):
                 category_type=Category.CategoryType.EXPENSE
             )
             
-            # Create a field for each transaction
-            for idx, trans_data in enumerate(transactions_data):
+            # Create a field for each staged row
+            for row in rows:
                 # Select appropriate categories based on transaction type
-                categories = income_categories if trans_data['type'] == 'INCOME' else expense_categories
+                categories = income_categories if row.transaction_type == 'INCOME' else expense_categories
                 
-                self.fields[f'category_{idx}'] = forms.ModelChoiceField(
+                self.fields[f'category_{row.pk}'] = forms.ModelChoiceField(
                     queryset=categories,
-                    initial=trans_data.get('category'),
+                    initial=row.category_id,
                     label=f'Categoria',
                     widget=forms.Select(attrs={
                         'class': 'px-3 py-2 bg-slate-700 border border-slate-600 rounded-lg text-slate-100 text-sm focus:outline-none focus:ring-2 focus:ring-purple-500 transition-all'
                     })
                 )
-                
-                # Store transaction data as hidden fields
-                self.fields[f'date_{idx}'] = forms.CharField(
-                    initial=trans_data['date'],
-                    widget=forms.HiddenInput()
-                )
-                self.fields[f'description_{idx}'] = forms.CharField(
-                    initial=trans_data['description'],
-                    widget=forms.HiddenInput()
-                )
-                self.fields[f'amount_{idx}'] = forms.CharField(
-                    initial=str(trans_data['amount']),
-                    widget=forms.HiddenInput()
-                )
-                self.fields[f'type_{idx}'] = forms.CharField(
-                    initial=trans_data['type'],
-                    widget=forms.HiddenInput()
-                )
\ No newline at end of file
+
+    def changed_rows(self):
+        """
+        Apply the chosen categories to the rows and return the ones that changed.
+        
+        Returns:
+            list: OFXImportRow objects ready for bulk_update(['category'])
+        """
+        changed = []
+        for row in self.rows:
+            category = self.cleaned_data[f'category_{row.pk}']
+            if category.pk != row.category_id:
+                row.category = category
+                changed.append(row)
+        return changed
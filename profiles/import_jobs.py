@@ -0,0 +1,188 @@
+'''
+Background processing of confirmed OFX imports.
+
+A confirmed OFXImport is processed outside the HTTP request, in a daemon
+thread of the web worker started once the confirming transaction commits,
+so the confirm view answers immediately instead of holding the request
+until the whole statement is saved. Work is done in atomic batches: each
+batch creates its Transactions (signals included), deletes the staged
+rows it consumed and bumps the job counters in the same transaction.
+
+The thread dies with its worker process, so a deploy or worker restart
+interrupts the imports in flight, losing at most the uncommitted batch.
+The job's heartbeat (set when the job is queued and at the end of every
+batch) then goes stale and the job is resumed either by the next progress
+poll (resume_if_stale) or by ``python manage.py processar_importacoes``,
+which runs from cron (docs/tarefas-agendadas.md) so imports nobody is
+watching also finish.
+
+Each batch holds the job row lock and stops after BATCH_TIME_LIMIT, so a
+heartbeat is committed well within STALE_AFTER and a claim racing a
+running batch waits for it and then finds the job fresh. The heartbeat
+written by a worker is also its claim: a worker whose job was taken over
+(it stalled past STALE_AFTER) finds a different heartbeat and stops.
+'''
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from categories.models import CategoryClassifier
+from notifications.models import Notification
+from transactions.models import Transaction
+
+from .models import OFXImport, OFXImportRow
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+STALE_AFTER = timedelta(minutes=2)
+BATCH_TIME_LIMIT = STALE_AFTER / 4
+
+
+class _TakenOver(Exception):
+    '''Another worker claimed the job after this one stopped reporting progress.'''
+
+
+def start_import_job(import_id):
+    '''Run the import in a background thread after the current transaction commits.'''
+    db_transaction.on_commit(lambda: threading.Thread(
+        target=_run_in_thread,
+        args=(import_id,),
+        name=f'ofx-import-{import_id}',
+        daemon=True,
+    ).start())
+
+
+def resume_if_stale(ofx_import):
+    '''Restart a queued/running job whose worker stopped reporting progress.'''
+    if ofx_import.status not in OFXImport.ACTIVE_STATUSES:
+        return
+    last_progress = ofx_import.heartbeat_at or ofx_import.created_at
+    if last_progress >= timezone.now() - STALE_AFTER:
+        return
+    start_import_job(ofx_import.pk)
+
+
+def _run_in_thread(import_id):
+    try:
+        run_import(import_id)
+    finally:
+        connections.close_all()
+
+
+def _claim(import_id):
+    '''Atomically take ownership of a queued or stale job; returns the claim's heartbeat or None.'''
+    now = timezone.now()
+    stale = Q(status=OFXImport.Status.RUNNING) & (
+        Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=now - STALE_AFTER)
+    )
+    claimed = OFXImport.objects.filter(
+        Q(status=OFXImport.Status.QUEUED) | stale,
+        pk=import_id,
+    ).update(status=OFXImport.Status.RUNNING, heartbeat_at=now)
+    return now if claimed else None
+
+
+def run_import(import_id):
+    '''
+    Process all remaining rows of the import.
+
+    Returns:
+        bool: False if the job was already finished or owned by another worker
+    '''
+    heartbeat = _claim(import_id)
+    if heartbeat is None:
+        return False
+
+    ofx_import = OFXImport.objects.select_related('account', 'user').get(pk=import_id)
+
+    try:
+        while heartbeat:
+            heartbeat = _process_batch(ofx_import, heartbeat)
+    except _TakenOver:
+        logger.warning('Importação OFX %s foi retomada por outro worker', import_id)
+        return True
+    except Exception as e:
+        logger.exception('Importação OFX %s falhou', import_id)
+        OFXImport.objects.filter(pk=import_id).update(
+            status=OFXImport.Status.FAILED,
+            last_error=str(e)[:1000],
+            finished_at=timezone.now(),
+        )
+        return True
+
+    OFXImport.objects.filter(pk=import_id).update(
+        status=OFXImport.Status.DONE,
+        finished_at=timezone.now(),
+    )
+    ofx_import.refresh_from_db(fields=['created_count'])
+    if ofx_import.created_count > 0:
+        Notification.create_import_success(user=ofx_import.user, count=ofx_import.created_count)
+    return True
+
+
+def _process_batch(ofx_import, heartbeat):
+    '''
+    Import the next rows (up to BATCH_SIZE or BATCH_TIME_LIMIT) in one transaction.
+
+    Returns:
+        datetime: the new heartbeat, or None when no rows are left
+
+    Raises:
+        _TakenOver: the job's heartbeat is no longer the one this worker wrote
+    '''
+    with db_transaction.atomic():
+        owned = OFXImport.objects.select_for_update().filter(pk=ofx_import.pk, heartbeat_at=heartbeat).exists()
+        if not owned:
+            raise _TakenOver
+        rows = list(ofx_import.rows.select_related('category').order_by('position')[:BATCH_SIZE])
+        if not rows:
+            return None
+
+        created = skipped = errors = 0
+        processed = []
+        deadline = time.monotonic() + BATCH_TIME_LIMIT.total_seconds()
+        # One classifier write per batch instead of one per created transaction
+        with CategoryClassifier.deferred():
+            for row in rows:
+                if processed and time.monotonic() > deadline:
+                    break
+                processed.append(row.pk)
+                if row.category_id is None:
+                    errors += 1
+                    continue
+                try:
+                    # Savepoint: a duplicate fingerprint (concurrent import of the
+                    # same statement) must not abort the batch
+                    with db_transaction.atomic():
+                        Transaction.objects.create(
+                            account=ofx_import.account,
+                            category=row.category,
+                            transaction_type=row.transaction_type,
+                            amount=row.amount,
+                            transaction_date=row.transaction_date,
+                            description=row.description,
+                            fingerprint=row.fingerprint
+                        )
+                    created += 1
+                except IntegrityError:
+                    skipped += 1
+                except Exception:
+                    logger.warning('Erro ao importar linha %s da importação %s', row.position, ofx_import.pk, exc_info=True)
+                    errors += 1
+
+        heartbeat = timezone.now()
+        OFXImportRow.objects.filter(pk__in=processed).delete()
+        OFXImport.objects.filter(pk=ofx_import.pk).update(
+            processed_count=F('processed_count') + len(processed),
+            created_count=F('created_count') + created,
+            skipped_count=F('skipped_count') + skipped,
+            error_count=F('error_count') + errors,
+            heartbeat_at=heartbeat,
+        )
+    return heartbeat
@@ -0,0 +1,47 @@
+'''
+Bank statement importers.
+
+Each supported format is a StatementParser registered in PARSERS. Parsers
+only turn a file into StatementRow objects; dedupe, categorization and
+staging are shared by every format (see pipeline.py).
+
+Example:
+    parser = get_parser(uploaded_file)
+    for row in parser.parse(uploaded_file):
+        ...
+'''
+from .bank_csv import BankCSVParser
+from .base import StatementParseError, StatementParser, StatementRow
+from .cnab import CNAB240Parser, CNAB400Parser
+from .ofx import OFXParser
+
+HEAD_SIZE = 1024
+
+PARSERS = [OFXParser, BankCSVParser, CNAB240Parser, CNAB400Parser]
+
+
+def supported_extensions():
+    return sorted({extension for parser in PARSERS for extension in parser.extensions})
+
+
+def get_parser(uploaded_file):
+    '''
+    Return a parser instance for the file, or None if no format matches.
+
+    Peeks at the first bytes (some formats share an extension) and rewinds.
+    '''
+    head = uploaded_file.read(HEAD_SIZE)
+    uploaded_file.seek(0)
+    if isinstance(head, str):
+        head = head.encode('latin-1', errors='replace')
+
+    for parser in PARSERS:
+        if parser.matches(uploaded_file.name, head):
+            return parser()
+    return None
+
+
+__all__ = [
+    'PARSERS', 'StatementParseError', 'StatementParser', 'StatementRow',
+    'get_parser', 'supported_extensions',
+]
@@ -0,0 +1,179 @@
+'''
+Bank CSV statement parser.
+
+Banks export CSV with different delimiters, encodings, column names and
+number formats, so the layout is detected from the file itself:
+
+- encoding: UTF-8 (with or without BOM), falling back to cp1252;
+- delimiter: csv.Sniffer over the first lines (',', ';', tab or '|');
+- columns: the header row is matched against COLUMN_ALIASES (accent and
+  case insensitive). A single signed amount column, or separate
+  credit/debit columns, are both supported.
+
+Amounts accept Brazilian and international formats ("1.234,56",
+"-1,234.56", "R$ 12,00", "12,00 D", "(12,00)").
+
+Rows are read lazily through csv.reader, one line at a time.
+'''
+import codecs
+import csv
+import re
+from datetime import date
+
+from transactions.fingerprints import normalize_description
+
+from .base import StatementParseError, StatementParser, StatementRow, parse_decimal
+
+SNIFF_SIZE = 16 * 1024
+
+COLUMN_ALIASES = {
+    'date': ('DATA', 'DATE', 'DATA LANCAMENTO', 'DATA DO LANCAMENTO', 'DATA MOVIMENTO', 'DT', 'DATA TRANSACAO'),
+    'description': ('DESCRICAO', 'DESCRIPTION', 'HISTORICO', 'LANCAMENTO', 'MEMO', 'TITULO', 'TITLE', 'ESTABELECIMENTO', 'DETALHES'),
+    'payee': ('FAVORECIDO', 'BENEFICIARIO', 'PAYEE', 'NOME'),
+    'amount': ('VALOR', 'AMOUNT', 'VALOR (R$)', 'VALOR R$', 'QUANTIA'),
+    'credit': ('CREDITO', 'CREDIT', 'CREDITO (R$)', 'ENTRADA', 'ENTRADAS'),
+    'debit': ('DEBITO', 'DEBIT', 'DEBITO (R$)', 'SAIDA', 'SAIDAS'),
+    # Only explicit unique ids: document numbers repeat (e.g. 000000) and
+    # would collapse distinct lines into one fingerprint
+    'id': ('ID', 'IDENTIFICADOR', 'FITID'),
+}
+
+_DATE_FORMATS = (
+    (re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})'), ('d', 'm', 'y')),
+    (re.compile(r'^(\d{4})-(\d{2})-(\d{2})'), ('y', 'm', 'd')),
+    (re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{2})\b'), ('d', 'm', 'yy')),
+    (re.compile(r'^(\d{1,2})-(\d{1,2})-(\d{4})'), ('d', 'm', 'y')),
+    (re.compile(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})'), ('d', 'm', 'y')),
+)
+_THOUSANDS_DOT_RE = re.compile(r'^\d{1,3}(\.\d{3})+$')
+
+
+def parse_date(value):
+    value = value.strip()
+    for pattern, order in _DATE_FORMATS:
+        match = pattern.match(value)
+        if not match:
+            continue
+        parts = dict(zip(order, map(int, match.groups())))
+        year = parts.get('y') or 2000 + parts['yy']
+        try:
+            return date(year, parts['m'], parts['d'])
+        except ValueError:
+            break
+    raise StatementParseError(f'Data inválida: {value!r}')
+
+
+def parse_amount(value):
+    '''Signed Decimal from a Brazilian or international formatted amount.'''
+    text = value.strip().upper().replace('R$', '').replace(' ', '').replace('\xa0', '')
+    if not text:
+        return None
+
+    negative = False
+    if text.startswith('(') and text.endswith(')'):
+        negative, text = True, text[1:-1]
+    if text.endswith('D'):
+        negative, text = True, text[:-1]
+    elif text.endswith('C'):
+        text = text[:-1]
+    if text.startswith('-'):
+        negative, text = not negative, text[1:]
+    elif text.startswith('+'):
+        text = text[1:]
+
+    if ',' in text and '.' in text:
+        # The last separator is the decimal one
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '.')
+    elif _THOUSANDS_DOT_RE.match(text):
+        text = text.replace('.', '')
+
+    amount = parse_decimal(text)
+    return -amount if negative else amount
+
+
+def _detect_encoding(head):
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        head.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is still UTF-8
+        if e.start >= len(head) - 3:
+            return 'utf-8'
+        return 'cp1252'
+
+
+class BankCSVParser(StatementParser):
+    name = 'csv'
+    label = 'CSV'
+    extensions = ('.csv',)
+
+    def parse(self, fileobj):
+        head = fileobj.read(SNIFF_SIZE)
+        fileobj.seek(0)
+        encoding = _detect_encoding(head)
+        sample = head.decode(encoding, errors='ignore')
+
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+        except csv.Error:
+            dialect = csv.excel
+
+        reader = csv.reader(codecs.getreader(encoding)(fileobj, errors='replace'), dialect)
+        columns = self._map_columns(next(reader, []))
+
+        for line_number, line in enumerate(reader, start=2):
+            if not any(cell.strip() for cell in line):
+                continue
+            row = self._build_row(columns, line, line_number)
+            if row is not None:
+                yield row
+
+    def _map_columns(self, header):
+        normalized = [normalize_description(cell).strip(' :') for cell in header]
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for index, name in enumerate(normalized):
+                if name in aliases:
+                    columns[field] = index
+                    break
+
+        if 'date' not in columns or not ({'amount', 'credit', 'debit'} & columns.keys()):
+            raise StatementParseError(
+                'Cabeçalho do CSV não reconhecido: são necessárias as colunas de data e valor'
+            )
+        return columns
+
+    def _build_row(self, columns, line, line_number):
+        def cell(field):
+            index = columns.get(field)
+            return line[index].strip() if index is not None and index < len(line) else ''
+
+        try:
+            if 'amount' in columns:
+                amount = parse_amount(cell('amount'))
+            else:
+                credit = parse_amount(cell('credit')) or 0
+                debit = parse_amount(cell('debit')) or 0
+                amount = abs(credit) - abs(debit)
+            transaction_date = parse_date(cell('date'))
+        except StatementParseError as e:
+            raise StatementParseError(f'Linha {line_number}: {e}')
+
+        # Balance lines ("SALDO ANTERIOR") and empty amounts are not transactions
+        if not amount or normalize_description(cell('description')).startswith('SALDO'):
+            return None
+
+        return StatementRow(
+            id=cell('id') or None,
+            date=transaction_date,
+            amount=amount,
+            payee=cell('payee') or None,
+            memo=cell('description') or None,
+        )
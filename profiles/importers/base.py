@@ -0,0 +1,68 @@
+'''
+Common types shared by every statement parser.
+
+A parser turns an uploaded file into an iterator of StatementRow, reading
+it incrementally; everything after that (dedupe, categorization, staging)
+is format-agnostic and lives in profiles/importers/pipeline.py.
+'''
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+# id: identifier unique within the account (OFX FITID, bank bill number) or None;
+#     it becomes the fingerprint, so non-unique numbers must not go here
+# date: datetime.date
+# amount: signed Decimal (negative = expense)
+StatementRow = namedtuple('StatementRow', ['id', 'date', 'amount', 'payee', 'memo'])
+
+
+class StatementParseError(ValueError):
+    '''Raised when a statement line cannot be interpreted.'''
+
+
+class StatementParser:
+    '''
+    Base class of the pluggable parsers registered in profiles/importers/__init__.py.
+
+    Subclasses declare the extensions they accept and implement parse();
+    matches() may also inspect the first bytes of the file when several
+    formats share an extension.
+    '''
+    name = ''
+    label = ''
+    extensions = ()
+
+    @classmethod
+    def matches(cls, filename, head):
+        return filename.lower().endswith(cls.extensions)
+
+    def parse(self, fileobj):
+        '''Yield StatementRow objects; raise StatementParseError on bad data.'''
+        raise NotImplementedError
+
+
+def parse_ddmmyyyy(value):
+    '''DDMMAAAA (or DDMMAA) as used by CNAB files.'''
+    try:
+        day, month, year = int(value[:2]), int(value[2:4]), int(value[4:])
+        if len(value) == 6:
+            year += 2000
+        return date(year, month, day)
+    except ValueError:
+        raise StatementParseError(f'Data inválida: {value!r}')
+
+
+def parse_cents(value):
+    '''Zero-padded integer amount with two implied decimals (CNAB).'''
+    try:
+        return Decimal(int(value)) / 100
+    except ValueError:
+        raise StatementParseError(f'Valor inválido: {value!r}')
+
+
+def parse_decimal(value):
+    '''Decimal from text, raising StatementParseError.'''
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise StatementParseError(f'Valor inválido: {value!r}')
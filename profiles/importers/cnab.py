@@ -0,0 +1,111 @@
+'''
+CNAB (FEBRABAN) fixed-width statement parsers.
+
+- CNAB 240, bank statement ("extrato para conciliação"): each detail
+  record with segment E is one account entry.
+- CNAB 400, collection return file ("retorno de cobrança", Bradesco
+  layout, followed by most banks): each settled bill ("liquidação") is one
+  income.
+
+Positions in the layouts below are 1-indexed and inclusive, as in the
+FEBRABAN/bank manuals. Files are read line by line in latin-1.
+'''
+import codecs
+
+from .base import StatementParser, StatementRow, parse_cents, parse_ddmmyyyy
+
+ENCODING = 'latin-1'
+
+
+def _field(line, start, end):
+    return line[start - 1:end].strip()
+
+
+def _first_line(head):
+    return head.split(b'\n', 1)[0].rstrip(b'\r')
+
+
+class _CNABParser(StatementParser):
+    extensions = ('.ret', '.txt', '.cnab')
+    record_length = 0
+
+    @classmethod
+    def matches(cls, filename, head):
+        return super().matches(filename, head) and len(_first_line(head)) == cls.record_length
+
+    def parse(self, fileobj):
+        for line in codecs.getreader(ENCODING)(fileobj, errors='replace'):
+            line = line.rstrip('\r\n')
+            if line:
+                row = self._parse_line(line)
+                if row is not None:
+                    yield row
+
+    def _parse_line(self, line):
+        raise NotImplementedError
+
+
+class CNAB240Parser(_CNABParser):
+    '''
+    Segment E layout (detail record '3'):
+
+        008       record type ('3')
+        014       segment ('E')
+        114-133   complement
+        143-150   entry date (DDMMAAAA)
+        151-168   amount (2 implied decimals)
+        169       'D' debit / 'C' credit
+        177-201   history description
+        202-240   document number (not unique, not used as id)
+    '''
+    name = 'cnab240'
+    label = 'CNAB 240'
+    record_length = 240
+
+    def _parse_line(self, line):
+        if line[7:8] != '3' or line[13:14] != 'E':
+            return None
+
+        amount = parse_cents(_field(line, 151, 168))
+        if _field(line, 169, 169) == 'D':
+            amount = -amount
+
+        return StatementRow(
+            id=None,
+            date=parse_ddmmyyyy(_field(line, 143, 150)),
+            amount=amount,
+            payee=_field(line, 177, 201) or None,
+            memo=_field(line, 114, 133) or None,
+        )
+
+
+class CNAB400Parser(_CNABParser):
+    '''
+    Collection return detail layout (record '1'):
+
+        001       record type ('1')
+        109-110   occurrence code (06, 15, 17 = settled)
+        111-116   occurrence date (DDMMAA)
+        117-126   document number ("seu número", not unique)
+        127-146   bank's bill number ("nosso número", unique per bill)
+        254-266   amount paid (2 implied decimals)
+    '''
+    name = 'cnab400'
+    label = 'CNAB 400'
+    record_length = 400
+
+    SETTLED_OCCURRENCES = {'06', '15', '17'}
+
+    def _parse_line(self, line):
+        if line[:1] != '1' or _field(line, 109, 110) not in self.SETTLED_OCCURRENCES:
+            return None
+
+        document = _field(line, 117, 126)
+        bill_number = _field(line, 127, 146)
+        return StatementRow(
+            id=bill_number or None,
+            date=parse_ddmmyyyy(_field(line, 111, 116)),
+            amount=parse_cents(_field(line, 254, 266)),
+            payee='Liquidação de boleto',
+            memo=document or None,
+        )
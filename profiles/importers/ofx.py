@@ -0,0 +1,147 @@
+'''
+Streaming OFX/QFX statement parser.
+
+Reads the upload in fixed-size chunks and yields one StatementRow per
+<STMTTRN> as soon as it is complete, so memory stays bounded no matter how
+many years the statement covers. Handles both SGML (OFX 1.x, leaf elements
+without closing tags) and XML (OFX 2.x / QFX) files.
+
+Example:
+    for row in OFXParser().parse(request.FILES['ofx_file']):
+        print(row.date, row.amount)
+'''
+import codecs
+import html
+import re
+from datetime import date
+
+from .base import StatementParseError, StatementParser, StatementRow, parse_decimal
+
+CHUNK_SIZE = 64 * 1024
+HEADER_SIZE = 4096
+
+_TAG_RE = re.compile(r'<(/?)([A-Za-z0-9._]+)[^>]*>')
+_XML_ENCODING_RE = re.compile(rb'encoding\s*=\s*["\']([A-Za-z0-9_-]+)["\']', re.IGNORECASE)
+_SGML_HEADER_RE = re.compile(rb'^(ENCODING|CHARSET):\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+
+
+def _detect_encoding(head):
+    '''Pick the text encoding from the OFX 1.x header or the XML prolog.'''
+    match = _XML_ENCODING_RE.search(head)
+    if match:
+        return match.group(1).decode('ascii')
+
+    header = {key.upper(): value.upper() for key, value in _SGML_HEADER_RE.findall(head)}
+    if header.get(b'ENCODING') == b'UTF-8':
+        return 'utf-8'
+    if header.get(b'CHARSET') in (b'8859-1', b'ISO-8859-1'):
+        return 'latin-1'
+    # USASCII/NONE: Brazilian banks usually send cp1252 anyway
+    return 'cp1252'
+
+
+def _parse_date(value):
+    # YYYYMMDD[HHMMSS[.XXX]][[-3:BRT]]
+    try:
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    except ValueError:
+        raise StatementParseError(f'Data inválida: {value!r}')
+
+
+def _build_transaction(fields):
+    if 'DTPOSTED' not in fields or 'TRNAMT' not in fields:
+        raise StatementParseError('Transação sem DTPOSTED ou TRNAMT')
+
+    return StatementRow(
+        id=fields.get('FITID'),
+        date=_parse_date(fields['DTPOSTED']),
+        amount=parse_decimal(fields['TRNAMT'].replace(',', '.')),
+        payee=fields.get('NAME') or fields.get('PAYEE'),
+        memo=fields.get('MEMO'),
+    )
+
+
+def _read_text(fileobj, chunk_size):
+    '''Yield decoded text chunks using the encoding declared in the header.'''
+    head = fileobj.read(max(chunk_size, HEADER_SIZE))
+    if isinstance(head, str):
+        yield head
+        yield from iter(lambda: fileobj.read(chunk_size), '')
+        return
+
+    decoder = codecs.getincrementaldecoder(_detect_encoding(head))(errors='replace')
+    yield decoder.decode(head)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+class _StatementScanner:
+    '''Incremental tag scanner that keeps only the unfinished tail in memory.'''
+
+    def __init__(self):
+        self.buffer = ''
+        self.current = None
+
+    def feed(self, text, final=False):
+        self.buffer += text
+        pos = 0
+
+        while True:
+            match = _TAG_RE.search(self.buffer, pos)
+            if not match:
+                break
+
+            # SGML leaf values run until the next tag; wait for more data if
+            # the value may continue in the next chunk
+            value_end = self.buffer.find('<', match.end())
+            if value_end == -1:
+                if not final:
+                    break
+                value_end = len(self.buffer)
+
+            closing, tag = match.group(1), match.group(2).upper()
+            value = html.unescape(self.buffer[match.end():value_end].strip())
+            pos = value_end
+
+            if tag == 'STMTTRN':
+                if self.current is not None:
+                    # Also covers a </STMTTRN> omitted by the bank
+                    yield _build_transaction(self.current)
+                self.current = None if closing else {}
+            elif tag == 'BANKTRANLIST' and closing and self.current is not None:
+                yield _build_transaction(self.current)
+                self.current = None
+            elif self.current is not None and not closing and value:
+                self.current[tag] = value
+
+        self.buffer = self.buffer[pos:]
+        if '<' not in self.buffer:
+            self.buffer = ''
+
+        if final and self.current is not None:
+            yield _build_transaction(self.current)
+            self.current = None
+
+
+class OFXParser(StatementParser):
+    name = 'ofx'
+    label = 'OFX/QFX'
+    extensions = ('.ofx', '.ofc', '.qfx')
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def parse(self, fileobj):
+        '''
+        Yield StatementRow objects from an OFX/QFX file-like object.
+
+        Only the current chunk plus one unfinished element is kept in memory.
+
+        Raises:
+            StatementParseError: If a transaction has no date/amount or they are malformed
+        '''
+        scanner = _StatementScanner()
+        for text in _read_text(fileobj, self.chunk_size):
+            yield from scanner.feed(text)
+        yield from scanner.feed('', final=True)
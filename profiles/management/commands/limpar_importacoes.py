@@ -0,0 +1,33 @@
+# profiles/management/commands/limpar_importacoes.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from profiles.models import OFXImport
+
+
+class Command(BaseCommand):
+    help = (
+        'Apaga importações de extrato concluídas, com falha ou nunca '
+        'confirmadas enviadas há mais de --dias dias (com as linhas que '
+        'sobraram). Importações na fila ou em andamento são mantidas. '
+        'Pode rodar via cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=90,
+            help='Apaga importações enviadas há mais de N dias (padrão: 90)'
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['dias'])
+        _, apagados = OFXImport.objects.filter(
+            created_at__lt=limite
+        ).exclude(status__in=OFXImport.ACTIVE_STATUSES).delete()
+
+        total = apagados.get(OFXImport._meta.label, 0)
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} importação(ões) apagada(s)!'))
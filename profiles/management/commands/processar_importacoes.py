@@ -0,0 +1,30 @@
+# profiles/management/commands/processar_importacoes.py
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from profiles.import_jobs import STALE_AFTER, run_import
+from profiles.models import OFXImport
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa importações OFX na fila ou interrompidas (sem progresso há '
+        'mais de 2 minutos), retomando do último lote confirmado. Pode rodar '
+        'via cron; importações em andamento em outro worker são ignoradas.'
+    )
+
+    def handle(self, *args, **options):
+        pendentes = OFXImport.objects.filter(
+            Q(status=OFXImport.Status.QUEUED)
+            | Q(status=OFXImport.Status.RUNNING, heartbeat_at__lt=timezone.now() - STALE_AFTER)
+            | Q(status=OFXImport.Status.RUNNING, heartbeat_at__isnull=True)
+        ).order_by('created_at').values_list('pk', flat=True)
+
+        total = 0
+        for import_id in list(pendentes):
+            self.stdout.write(f'Processando importação {import_id}...')
+            if run_import(import_id):
+                total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} importação(ões) processada(s)!'))
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:17
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_budget_creditcard'),
+        ('categories', '0002_category_categories__user_id_f0c68e_idx_and_more'),
+        ('profiles', '0002_profile_profiles_pr_user_id_3364d1_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OFXImport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('skipped_count', models.PositiveIntegerField(default=0, verbose_name='Duplicatas ignoradas')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ofx_imports', to='accounts.account', verbose_name='Conta')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ofx_imports', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Importação OFX',
+                'verbose_name_plural': 'Importações OFX',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OFXImportRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Posição no arquivo')),
+                ('transaction_date', models.DateField(verbose_name='Data da Transação')),
+                ('description', models.TextField(verbose_name='Descrição')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Valor')),
+                ('transaction_type', models.CharField(max_length=7, verbose_name='Tipo')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Impressão digital')),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='categories.category', verbose_name='Categoria')),
+                ('ofx_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='profiles.ofximport', verbose_name='Importação')),
+            ],
+            options={
+                'verbose_name': 'Linha de importação OFX',
+                'verbose_name_plural': 'Linhas de importação OFX',
+                'ordering': ['position'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ofximport',
+            index=models.Index(fields=['created_at'], name='profiles_of_created_53d288_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ofximportrow',
+            index=models.Index(fields=['ofx_import', 'position'], name='profiles_of_ofx_imp_92b642_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ofximportrow',
+            constraint=models.UniqueConstraint(fields=('ofx_import', 'fingerprint'), name='ofx_import_row_fingerprint_unique'),
+        ),
+    ]
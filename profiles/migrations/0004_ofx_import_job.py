@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_budget_creditcard'),
+        ('profiles', '0003_ofx_import_staging'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ofximport',
+            name='created_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Transações criadas'),
+        ),
+        migrations.AddField(
+            model_name='ofximport',
+            name='error_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Erros'),
+        ),
+        migrations.AddField(
+            model_name='ofximport',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Finalizado em'),
+        ),
+        migrations.AddField(
+            model_name='ofximport',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último progresso'),
+        ),
+        migrations.AddField(
+            model_name='ofximport',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='Último erro'),
+        ),
+        migrations.AddField(
+            model_name='ofximport',
+            name='processed_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Linhas processadas'),
+        ),
+        migrations.AddField(
+            model_name='ofximport',
+            name='status',
+            field=models.CharField(choices=[('staged', 'Aguardando confirmação'), ('queued', 'Na fila'), ('running', 'Importando'), ('done', 'Concluída'), ('failed', 'Falhou')], default='staged', max_length=10, verbose_name='Status'),
+        ),
+        migrations.AddField(
+            model_name='ofximport',
+            name='total_rows',
+            field=models.PositiveIntegerField(default=0, verbose_name='Total de linhas'),
+        ),
+        migrations.AddIndex(
+            model_name='ofximport',
+            index=models.Index(fields=['status', 'heartbeat_at'], name='profiles_of_status_8b3685_idx'),
+        ),
+    ]
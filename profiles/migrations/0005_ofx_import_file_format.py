@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_ofx_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ofximport',
+            name='file_format',
+            field=models.CharField(default='ofx', max_length=10, verbose_name='Formato do arquivo'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
@@ -74,3 +76,189 @@ class Profile(models.Model):
         if self.full_name:
             return self.full_name
         return self.user.email if hasattr(self.user, 'email') else self.user.username
+
+
+class OFXImport(models.Model):
+    '''
+    Server-side staging area and background job record of a statement import.
+
+    Despite the name, any format registered in profiles/importers is staged
+    here. The upload step parses the statement in a streaming fashion and stores
+    one OFXImportRow per new transaction, so the preview only keeps the
+    import id in the session instead of the whole statement. Confirming the
+    import queues it; a background job (profiles/import_jobs.py) turns the
+    rows into Transactions in atomic batches, deleting each processed batch
+    and updating the counters below in the same transaction. The rows left
+    are therefore exactly the work still to do, and a job interrupted by a
+    worker restart resumes where its last committed batch stopped.
+
+    Attributes:
+        id: UUID used as the import id in the session and progress URL
+        user: Owner of the import (CASCADE on delete)
+        account: Destination account (CASCADE on delete)
+        file_format: Parser that read the file (ofx, csv, cnab240, cnab400)
+        status: staged -> queued -> running -> done/failed
+        total_rows: Rows queued for import
+        processed_count: Rows already handled by the job
+        created_count: Transactions created
+        skipped_count: Duplicates ignored (at staging and at import time)
+        error_count: Rows that could not be imported
+        last_error: Message of the error that failed the job
+        heartbeat_at: Last progress of the running job (stale = resumable)
+        created_at: Timestamp when the file was uploaded
+        finished_at: Timestamp when the job finished
+    '''
+    class Status(models.TextChoices):
+        STAGED = 'staged', 'Aguardando confirmação'
+        QUEUED = 'queued', 'Na fila'
+        RUNNING = 'running', 'Importando'
+        DONE = 'done', 'Concluída'
+        FAILED = 'failed', 'Falhou'
+
+    ACTIVE_STATUSES = (Status.QUEUED, Status.RUNNING)
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='ofx_imports',
+        verbose_name='Usuário'
+    )
+    account = models.ForeignKey(
+        'accounts.Account',
+        on_delete=models.CASCADE,
+        related_name='ofx_imports',
+        verbose_name='Conta'
+    )
+    file_format = models.CharField(
+        max_length=10,
+        default='ofx',
+        verbose_name='Formato do arquivo'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.STAGED,
+        verbose_name='Status'
+    )
+    total_rows = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Total de linhas'
+    )
+    processed_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Linhas processadas'
+    )
+    created_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Transações criadas'
+    )
+    skipped_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Duplicatas ignoradas'
+    )
+    error_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Erros'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Último erro'
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Último progresso'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Criado em'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Finalizado em'
+    )
+
+    class Meta:
+        verbose_name = 'Importação OFX'
+        verbose_name_plural = 'Importações OFX'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'heartbeat_at']),
+        ]
+
+    def __str__(self):
+        return f'Importação OFX {self.id} ({self.user})'
+
+    @property
+    def progress_percent(self):
+        if not self.total_rows:
+            return 100 if self.status == self.Status.DONE else 0
+        return min(100, round(self.processed_count * 100 / self.total_rows))
+
+
+class OFXImportRow(models.Model):
+    '''
+    One staged statement line of an OFXImport.
+
+    The (ofx_import, fingerprint) constraint drops lines repeated inside the
+    same file at insert time (bulk_create with ignore_conflicts).
+    '''
+    ofx_import = models.ForeignKey(
+        OFXImport,
+        on_delete=models.CASCADE,
+        related_name='rows',
+        verbose_name='Importação'
+    )
+    position = models.PositiveIntegerField(
+        verbose_name='Posição no arquivo'
+    )
+    transaction_date = models.DateField(
+        verbose_name='Data da Transação'
+    )
+    description = models.TextField(
+        verbose_name='Descrição'
+    )
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name='Valor'
+    )
+    transaction_type = models.CharField(
+        max_length=7,
+        verbose_name='Tipo'
+    )
+    category = models.ForeignKey(
+        'categories.Category',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Categoria'
+    )
+    fingerprint = models.CharField(
+        max_length=64,
+        verbose_name='Impressão digital'
+    )
+
+    class Meta:
+        verbose_name = 'Linha de importação OFX'
+        verbose_name_plural = 'Linhas de importação OFX'
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ofx_import', 'fingerprint'],
+                name='ofx_import_row_fingerprint_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['ofx_import', 'position']),
+        ]
+
+    def __str__(self):
+        return f'{self.transaction_date} - {self.description} ({self.amount})'
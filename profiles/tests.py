@@ -1 +1,261 @@
-# Create your tests here.
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import Account
+from transactions.models import Transaction
+
+from . import import_jobs
+from .importers.bank_csv import BankCSVParser
+from .importers.base import StatementParseError, StatementRow
+from .importers.ofx import OFXParser
+from .importers.pipeline import ImportPipeline
+from .models import OFXImport, OFXImportRow
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='import@test.com', password='x')
+        self.account = Account.objects.create(user=self.user, name='Conta', bank_name='Banco')
+        self.category = self.user.categories.filter(category_type='EXPENSE').first()
+        self.ofx_import = OFXImport.objects.create(
+            user=self.user,
+            account=self.account,
+            status=OFXImport.Status.QUEUED,
+            heartbeat_at=timezone.now()
+        )
+        OFXImportRow.objects.bulk_create([
+            OFXImportRow(
+                ofx_import=self.ofx_import,
+                position=position,
+                transaction_date=date(2024, 1, 10),
+                description=f'PADARIA {position}',
+                amount=Decimal('10.00'),
+                transaction_type='EXPENSE',
+                category=self.category,
+                fingerprint=f'fp-{position}'
+            )
+            for position in range(5)
+        ])
+
+    @mock.patch('profiles.import_jobs.start_import_job')
+    def test_recently_queued_job_is_not_restarted(self, start_import_job):
+        import_jobs.resume_if_stale(self.ofx_import)
+        start_import_job.assert_not_called()
+
+    @mock.patch('profiles.import_jobs.start_import_job')
+    def test_job_without_heartbeat_is_stale_only_after_timeout(self, start_import_job):
+        self.ofx_import.heartbeat_at = None
+        import_jobs.resume_if_stale(self.ofx_import)
+        start_import_job.assert_not_called()
+
+        self.ofx_import.created_at -= import_jobs.STALE_AFTER + timedelta(seconds=1)
+        import_jobs.resume_if_stale(self.ofx_import)
+        start_import_job.assert_called_once_with(self.ofx_import.pk)
+
+    def test_running_job_is_not_claimed_twice(self):
+        heartbeat = import_jobs._claim(self.ofx_import.pk)
+
+        self.assertIsNotNone(heartbeat)
+        self.assertIsNone(import_jobs._claim(self.ofx_import.pk))
+
+    def test_stale_claim_is_taken_over(self):
+        stalled = import_jobs._claim(self.ofx_import.pk)
+        OFXImport.objects.filter(pk=self.ofx_import.pk).update(
+            heartbeat_at=stalled - import_jobs.STALE_AFTER - timedelta(seconds=1)
+        )
+
+        heartbeat = import_jobs._claim(self.ofx_import.pk)
+
+        self.assertIsNotNone(heartbeat)
+        self.assertNotEqual(heartbeat, stalled)
+        with self.assertRaises(import_jobs._TakenOver):
+            import_jobs._process_batch(self.ofx_import, stalled)
+
+    def test_command_resumes_only_stale_jobs(self):
+        stalled = OFXImport.objects.create(
+            user=self.user,
+            account=self.account,
+            status=OFXImport.Status.RUNNING,
+            heartbeat_at=timezone.now() - import_jobs.STALE_AFTER - timedelta(seconds=1)
+        )
+        OFXImportRow.objects.filter(ofx_import=self.ofx_import).update(ofx_import=stalled)
+        OFXImport.objects.filter(pk=self.ofx_import.pk).update(status=OFXImport.Status.RUNNING)
+
+        call_command('processar_importacoes', stdout=io.StringIO())
+
+        stalled.refresh_from_db()
+        self.ofx_import.refresh_from_db()
+        self.assertEqual(stalled.status, OFXImport.Status.DONE)
+        self.assertEqual(stalled.created_count, 5)
+        self.assertEqual(self.ofx_import.status, OFXImport.Status.RUNNING)
+
+    def test_worker_stops_when_job_was_taken_over(self):
+        heartbeat = import_jobs._claim(self.ofx_import.pk)
+        OFXImport.objects.filter(pk=self.ofx_import.pk).update(heartbeat_at=timezone.now() + timedelta(seconds=1))
+
+        with self.assertRaises(import_jobs._TakenOver):
+            import_jobs._process_batch(self.ofx_import, heartbeat)
+        self.assertEqual(self.ofx_import.rows.count(), 5)
+
+    def test_batch_stops_at_time_limit(self):
+        heartbeat = import_jobs._claim(self.ofx_import.pk)
+
+        with mock.patch.object(import_jobs, 'BATCH_TIME_LIMIT', timedelta(0)):
+            heartbeat = import_jobs._process_batch(self.ofx_import, heartbeat)
+
+        self.ofx_import.refresh_from_db()
+        self.assertEqual(self.ofx_import.heartbeat_at, heartbeat)
+        self.assertEqual(self.ofx_import.processed_count, 1)
+        self.assertEqual(self.ofx_import.rows.count(), 4)
+
+    def test_run_import_creates_all_rows(self):
+        self.assertTrue(import_jobs.run_import(self.ofx_import.pk))
+
+        self.ofx_import.refresh_from_db()
+        self.assertEqual(self.ofx_import.status, OFXImport.Status.DONE)
+        self.assertEqual(self.ofx_import.created_count, 5)
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 5)
+
+
+SGML_STATEMENT = ("""OFXHEADER:100
+DATA:OFXSGML
+ENCODING:USASCII
+CHARSET:1252
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240110120000[-3:BRT]<TRNAMT>-12,50<FITID>A1<MEMO>PADARIA SÃO JOÃO
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240111<TRNAMT>-80.00<FITID>A2<NAME>MERCADO &amp; CIA
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240112<TRNAMT>1500.00<FITID>A3<MEMO>SALARIO
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+""").encode('cp1252')
+
+EXPECTED_ROWS = [
+    StatementRow('A1', date(2024, 1, 10), Decimal('-12.50'), None, 'PADARIA SÃO JOÃO'),
+    StatementRow('A2', date(2024, 1, 11), Decimal('-80.00'), 'MERCADO & CIA', None),
+    StatementRow('A3', date(2024, 1, 12), Decimal('1500.00'), None, 'SALARIO'),
+]
+
+
+class OFXParserTests(TestCase):
+    def _parse(self, content, chunk_size=64 * 1024):
+        return list(OFXParser(chunk_size=chunk_size).parse(io.BytesIO(content)))
+
+    def test_sgml_rows_with_and_without_closing_tags(self):
+        self.assertEqual(self._parse(SGML_STATEMENT), EXPECTED_ROWS)
+
+    def test_small_chunks_give_the_same_rows(self):
+        # Larger than HEADER_SIZE so tags and values straddle chunk boundaries
+        content = b'<OFX><BANKTRANLIST>' + b''.join(
+            b'<STMTTRN><DTPOSTED>20240110<TRNAMT>-%d.50<FITID>F%d<MEMO>COMPRA %d\n' % (n, n, n)
+            for n in range(500)
+        ) + b'</BANKTRANLIST></OFX>'
+        expected = self._parse(content)
+
+        self.assertEqual(len(expected), 500)
+        self.assertEqual(expected[-1], StatementRow('F499', date(2024, 1, 10), Decimal('-499.50'), None, 'COMPRA 499'))
+        for chunk_size in (1, 7, 64):
+            self.assertEqual(self._parse(content, chunk_size), expected, chunk_size)
+
+    def test_xml_statement(self):
+        content = (
+            '<?xml version="1.0" encoding="UTF-8"?><OFX><BANKTRANLIST>'
+            '<STMTTRN><DTPOSTED>20240110</DTPOSTED><TRNAMT>-12.50</TRNAMT>'
+            '<FITID>A1</FITID><MEMO>PADARIA SÃO JOÃO</MEMO></STMTTRN>'
+            '</BANKTRANLIST></OFX>'
+        ).encode('utf-8')
+
+        self.assertEqual(self._parse(content, chunk_size=5), EXPECTED_ROWS[:1])
+
+    def test_transaction_without_amount_is_rejected(self):
+        content = b'<OFX><BANKTRANLIST><STMTTRN><DTPOSTED>20240110<FITID>A1</STMTTRN></BANKTRANLIST></OFX>'
+
+        with self.assertRaises(StatementParseError):
+            self._parse(content)
+
+
+class ImportPipelineTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='pipeline@test.com', password='x')
+        self.account = Account.objects.create(user=self.user, name='Conta', bank_name='Banco')
+
+    def _stage(self, content):
+        return ImportPipeline(self.user, self.account).run(BankCSVParser(), io.BytesIO(content.encode('utf-8')))
+
+    def test_rows_sharing_a_document_number_are_all_staged(self):
+        ofx_import = self._stage(
+            'Data;Descricao;Documento;Valor\n'
+            '10/01/2024;PADARIA REAL;000000;-12,50\n'
+            '11/01/2024;MERCADO CENTRAL;000000;-80,00\n'
+            '11/01/2024;MERCADO CENTRAL;000000;-80,00\n'
+        )
+
+        self.assertEqual(ofx_import.rows.count(), 3)
+        self.assertEqual(ofx_import.skipped_count, 0)
+
+    def test_explicit_fitid_column_is_the_fingerprint(self):
+        content = 'Data;Descricao;FITID;Valor\n10/01/2024;PADARIA;abc;-12,50\n'
+        first = self._stage(content)
+        fingerprint = first.rows.get().fingerprint
+        Transaction.objects.create(
+            account=self.account,
+            category=self.user.categories.filter(category_type='EXPENSE').first(),
+            transaction_type='EXPENSE',
+            amount=Decimal('12.50'),
+            transaction_date=date(2024, 1, 10),
+            description='Padaria editada',
+            fingerprint=fingerprint
+        )
+
+        second = self._stage(content.replace('PADARIA', 'PADARIA (EDITADO NO BANCO)'))
+        self.assertEqual(second.rows.count(), 0)
+
+    def test_manual_transaction_absorbs_one_matching_line(self):
+        Transaction.objects.create(
+            account=self.account,
+            category=self.user.categories.filter(category_type='EXPENSE').first(),
+            transaction_type='EXPENSE',
+            amount=Decimal('4.50'),
+            transaction_date=date(2024, 1, 10),
+            description='Café Central'
+        )
+        content = (
+            'Data;Descricao;Valor\n'
+            '10/01/2024;CAFE CENTRAL;-4,50\n'
+            '10/01/2024;CAFE CENTRAL;-4,50\n'
+            '10/01/2024;CAFE CENTRAL;4,50\n'
+        )
+
+        for _ in range(2):
+            ofx_import = self._stage(content)
+            self.assertEqual(
+                list(ofx_import.rows.values_list('transaction_type', flat=True)), ['EXPENSE', 'INCOME']
+            )
+            self.assertEqual(ofx_import.skipped_count, 1)
+
+    def test_new_upload_keeps_previous_job_records(self):
+        finished = OFXImport.objects.create(user=self.user, account=self.account, status=OFXImport.Status.DONE)
+        abandoned = self._stage('Data;Descricao;Valor\n10/01/2024;PADARIA;-12,50\n')
+
+        self._stage('Data;Descricao;Valor\n11/01/2024;MERCADO;-80,00\n')
+
+        self.assertTrue(OFXImport.objects.filter(pk=finished.pk).exists())
+        self.assertTrue(OFXImport.objects.filter(pk=abandoned.pk).exists())
+        self.assertEqual(abandoned.rows.count(), 0)
+
+    def test_ofx_rows_are_staged_in_order(self):
+        ofx_import = ImportPipeline(self.user, self.account).run(OFXParser(chunk_size=16), io.BytesIO(SGML_STATEMENT))
+
+        rows = list(ofx_import.rows.order_by('position').values_list('transaction_type', 'amount'))
+        self.assertEqual(rows, [
+            ('EXPENSE', Decimal('12.50')),
+            ('EXPENSE', Decimal('80.00')),
+            ('INCOME', Decimal('1500.00')),
+        ])
@@ -5,6 +5,8 @@ from .views import (
     ProfileUpdateView, 
     ImportOFXView, 
     ImportOFXPreviewView,
+    ImportOFXProgressView,
+    ImportOFXStatusView,
     perfil_view,
     editar_perfil,
     trocar_senha,
@@ -27,6 +29,8 @@ urlpatterns = [
     # ========================================
     path('import-ofx/', ImportOFXView.as_view(), name='import_ofx'),
     path('import-ofx/preview/', ImportOFXPreviewView.as_view(), name='import_ofx_preview'),
+    path('import-ofx/<uuid:import_id>/', ImportOFXProgressView.as_view(), name='import_ofx_progress'),
+    path('import-ofx/<uuid:import_id>/status/', ImportOFXStatusView.as_view(), name='import_ofx_status'),
     
     # ========================================
     # VIEWS ANTIGAS (REDIRECIONAM)
@@ -1,4 +1,3 @@
-from decimal import Decimal
 from datetime import datetime
 import json
 import os
@@ -9,18 +8,17 @@ from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.db import transaction as db_transaction
+from django.core.paginator import Paginator
 from django.shortcuts import redirect, render
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django.views.generic import DetailView, UpdateView, FormView, View
 from django.http import JsonResponse
 
-import ofxparse
-from notifications.models import Notification
-from accounts.models import Account
-from categories.models import Category
-from transactions.models import Transaction
 from .forms import ProfileForm, OFXImportForm, OFXPreviewConfirmForm
-from .models import Profile
+from .import_jobs import resume_if_stale, start_import_job
+from .importers.pipeline import ImportPipeline
+from .models import Profile, OFXImport, OFXImportRow
 
 
 # ========================================
@@ -195,261 +193,150 @@ class ImportOFXView(LoginRequiredMixin, FormView):
         return kwargs
 
     def form_valid(self, form):
-        ofx_file = form.cleaned_data['ofx_file']
+        statement_file = form.cleaned_data['ofx_file']
         account = form.cleaned_data['account']
         
         try:
-            ofx = ofxparse.OfxParser.parse(ofx_file)
-            user_categories = self._get_user_categories()
-            transactions_data = []
-            skipped_count = 0
-            
-            for ofx_transaction in ofx.account.statement.transactions:
-                if self._is_duplicate(account, ofx_transaction):
-                    skipped_count += 1
-                    continue
-                
-                amount = abs(Decimal(str(ofx_transaction.amount)))
-                transaction_type = 'INCOME' if ofx_transaction.amount > 0 else 'EXPENSE'
-                category = self._map_category(
-                    ofx_transaction.memo or ofx_transaction.payee,
-                    transaction_type,
-                    user_categories
+            with db_transaction.atomic():
+                ofx_import = ImportPipeline(self.request.user, account).run(
+                    form.cleaned_data['parser'], statement_file
                 )
-                
-                transactions_data.append({
-                    'date': ofx_transaction.date.date().isoformat(),
-                    'description': self._format_description(ofx_transaction),
-                    'amount': float(amount),
-                    'type': transaction_type,
-                    'category': category.id,
-                    'category_name': category.name,
-                    'category_color': category.color,
-                })
-            
-            self.request.session['ofx_import_data'] = {
-                'account_id': account.id,
-                'transactions': transactions_data,
-                'skipped_count': skipped_count,
-            }
             
+            self.request.session['ofx_import_id'] = str(ofx_import.pk)
             return redirect('profile:import_ofx_preview')
             
         except Exception as e:
             messages.error(
                 self.request,
-                f'Erro ao processar arquivo OFX: {str(e)}. '
+                f'Erro ao processar o extrato: {str(e)}. '
                 'Verifique se o arquivo está no formato correto.'
             )
             return self.form_invalid(form)
 
-    def _get_user_categories(self):
-        categories = Category.objects.filter(user=self.request.user)
-        return {
-            'income': list(categories.filter(category_type=Category.CategoryType.INCOME)),
-            'expense': list(categories.filter(category_type=Category.CategoryType.EXPENSE))
-        }
-
-    def _is_duplicate(self, account, ofx_transaction):
-        amount = abs(Decimal(str(ofx_transaction.amount)))
-        description = self._format_description(ofx_transaction)
-        
-        return Transaction.objects.filter(
-            account=account,
-            transaction_date=ofx_transaction.date.date(),
-            amount=amount,
-            description__icontains=description[:50]
-        ).exists()
-
-    def _map_category(self, description, transaction_type, user_categories):
-        if not description:
-            return self._get_default_category(transaction_type, user_categories)
-        
-        description_upper = description.upper()
-        
-        expense_keywords = {
-            'ALIMENTACAO': ['MERCADO', 'SUPERMERCADO', 'PADARIA', 'RESTAURANTE', 'LANCHONETE', 'IFOOD', 'UBER EATS', 'RAPPI'],
-            'TRANSPORTE': ['POSTO', 'COMBUSTIVEL', 'UBER', '99', 'METRO', 'ONIBUS', 'ESTACIONAMENTO', 'PEDÁGIO'],
-            'SAUDE': ['FARMACIA', 'DROGARIA', 'HOSPITAL', 'CLINICA', 'MEDICO', 'LABORATORIO', 'CONSULTA'],
-            'MORADIA': ['ALUGUEL', 'CONDOMINIO', 'IPTU', 'LUZ', 'AGUA', 'GAS', 'ENERGIA', 'INTERNET'],
-            'EDUCACAO': ['ESCOLA', 'FACULDADE', 'CURSO', 'LIVRO', 'MATERIAL ESCOLAR', 'UNIVERSIDADE'],
-            'LAZER': ['CINEMA', 'TEATRO', 'NETFLIX', 'SPOTIFY', 'AMAZON', 'STREAMING', 'INGRESSO'],
-            'VESTUARIO': ['ROUPA', 'CALCADO', 'LOJA', 'MAGAZINE', 'SHOPPING', 'ZARA', 'C&A'],
-        }
-        
-        income_keywords = {
-            'SALARIO': ['SALARIO', 'PAGAMENTO', 'FOLHA', 'VENCIMENTO', 'REMUNERACAO'],
-            'FREELANCE': ['FREELANCE', 'FREELA', 'AUTONOMO', 'SERVICO', 'PRESTACAO'],
-            'INVESTIMENTO': ['DIVIDENDO', 'RENDIMENTO', 'JUROS', 'RESGATE', 'APLICACAO'],
-        }
-        
-        keywords_map = income_keywords if transaction_type == 'INCOME' else expense_keywords
-        category_list = user_categories['income'] if transaction_type == 'INCOME' else user_categories['expense']
-        
-        for category_name, keywords in keywords_map.items():
-            if any(keyword in description_upper for keyword in keywords):
-                for category in category_list:
-                    if category_name.lower() in category.name.lower():
-                        return category
-        
-        for category in category_list:
-            if category.name.upper() in description_upper:
-                return category
-        
-        return self._get_default_category(transaction_type, user_categories)
-
-    def _get_default_category(self, transaction_type, user_categories):
-        category_list = user_categories['income'] if transaction_type == 'INCOME' else user_categories['expense']
-        
-        if category_list:
-            return category_list[0]
-        
-        category_type = Category.CategoryType.INCOME if transaction_type == 'INCOME' else Category.CategoryType.EXPENSE
-        default_name = "Entrada Geral" if transaction_type == 'INCOME' else "Despesa Geral"
-        
-        category, _ = Category.objects.get_or_create(
-            user=self.request.user,
-            name=default_name,
-            defaults={
-                'category_type': category_type,
-                'color': '#6B7280'
-            }
-        )
-        return category
-
-    def _format_description(self, ofx_transaction):
-        parts = []
-        if ofx_transaction.payee:
-            parts.append(ofx_transaction.payee)
-        if ofx_transaction.memo and ofx_transaction.memo != ofx_transaction.payee:
-            parts.append(ofx_transaction.memo)
-        
-        return ' - '.join(parts) if parts else 'Transação importada'
-
 
 class ImportOFXPreviewView(LoginRequiredMixin, View):
-    """Step 2: Preview transactions and confirm import."""
+    """Step 2: Preview staged transactions page by page and confirm import."""
     template_name = 'profiles/import_ofx_preview.html'
+    paginate_by = 100
+
+    def _get_import(self, request):
+        import_id = request.session.get('ofx_import_id')
+        if not import_id:
+            return None
+        return OFXImport.objects.select_related('account').filter(
+            pk=import_id, user=request.user, status=OFXImport.Status.STAGED
+        ).first()
+
+    def _get_page(self, ofx_import, page_number):
+        paginator = Paginator(ofx_import.rows.select_related('category'), self.paginate_by)
+        return paginator.get_page(page_number)
+
+    def _render(self, request, ofx_import, page_obj, form):
+        rows_with_fields = [
+            {'row': row, 'category_field': form[f'category_{row.pk}']}
+            for row in page_obj.object_list
+        ]
+        context = {
+            'form': form,
+            'account': ofx_import.account,
+            'page_obj': page_obj,
+            'rows_with_fields': rows_with_fields,
+            'total_transactions': page_obj.paginator.count,
+            'skipped_count': ofx_import.skipped_count,
+        }
+        return render(request, self.template_name, context)
 
     def get(self, request):
-        import_data = request.session.get('ofx_import_data')
+        ofx_import = self._get_import(request)
         
-        if not import_data:
+        if not ofx_import:
             messages.warning(request, 'Nenhum arquivo para visualizar. Por favor, faça upload primeiro.')
             return redirect('profile:import_ofx')
         
-        try:
-            account = Account.objects.get(id=import_data['account_id'], user=request.user)
-        except Account.DoesNotExist:
-            messages.error(request, 'Conta não encontrada.')
+        page_obj = self._get_page(ofx_import, request.GET.get('page'))
+        form = OFXPreviewConfirmForm(rows=page_obj.object_list, user=request.user)
+        return self._render(request, ofx_import, page_obj, form)
+
+    def post(self, request):
+        ofx_import = self._get_import(request)
+        
+        if not ofx_import:
+            messages.warning(request, 'Sessão expirada. Por favor, faça upload novamente.')
             return redirect('profile:import_ofx')
         
+        page_obj = self._get_page(ofx_import, request.POST.get('page'))
         form = OFXPreviewConfirmForm(
-            transactions_data=import_data['transactions'],
+            request.POST,
+            rows=page_obj.object_list,
             user=request.user
         )
         
-        transactions_with_fields = []
-        for idx, trans_data in enumerate(import_data['transactions']):
-            transactions_with_fields.append({
-                'data': trans_data,
-                'category_field': form[f'category_{idx}'],
-                'date_field': form[f'date_{idx}'],
-                'description_field': form[f'description_{idx}'],
-                'amount_field': form[f'amount_{idx}'],
-                'type_field': form[f'type_{idx}'],
-            })
+        if not form.is_valid():
+            return self._render(request, ofx_import, page_obj, form)
         
-        context = {
-            'form': form,
-            'account': account,
-            'transactions_with_fields': transactions_with_fields,
-            'total_transactions': len(import_data['transactions']),
-            'skipped_count': import_data.get('skipped_count', 0),
-        }
+        # Categories chosen on this page are kept on the staged rows
+        OFXImportRow.objects.bulk_update(form.changed_rows(), ['category'])
         
-        return render(request, self.template_name, context)
+        if request.POST.get('action') != 'confirm':
+            goto_page = page_obj.paginator.get_page(request.POST.get('goto_page', page_obj.number))
+            return redirect(f"{reverse('profile:import_ofx_preview')}?page={goto_page.number}")
+        
+        # Conditional update: a double submit queues the job only once
+        queued = OFXImport.objects.filter(
+            pk=ofx_import.pk,
+            status=OFXImport.Status.STAGED
+        ).update(
+            status=OFXImport.Status.QUEUED,
+            total_rows=ofx_import.rows.count(),
+            heartbeat_at=timezone.now()
+        )
+        if queued:
+            start_import_job(ofx_import.pk)
+        
+        del request.session['ofx_import_id']
+        return redirect('profile:import_ofx_progress', import_id=ofx_import.pk)
 
-    def post(self, request):
-        import_data = request.session.get('ofx_import_data')
+
+class ImportOFXProgressView(LoginRequiredMixin, View):
+    """Step 3: Follow the background import job until it finishes."""
+    template_name = 'profiles/import_ofx_progress.html'
+
+    def get(self, request, import_id):
+        ofx_import = OFXImport.objects.select_related('account').filter(
+            pk=import_id, user=request.user
+        ).first()
         
-        if not import_data:
-            messages.warning(request, 'Sessão expirada. Por favor, faça upload novamente.')
+        if not ofx_import or ofx_import.status == OFXImport.Status.STAGED:
+            messages.warning(request, 'Importação não encontrada.')
             return redirect('profile:import_ofx')
         
-        try:
-            account = Account.objects.get(id=import_data['account_id'], user=request.user)
-        except Account.DoesNotExist:
-            messages.error(request, 'Conta não encontrada.')
-            return redirect('profile:import_ofx')
+        resume_if_stale(ofx_import)
         
-        form = OFXPreviewConfirmForm(
-            request.POST,
-            transactions_data=import_data['transactions'],
-            user=request.user
-        )
+        return render(request, self.template_name, {
+            'ofx_import': ofx_import,
+        })
+
+
+class ImportOFXStatusView(LoginRequiredMixin, View):
+    """JSON progress of a background import job (polled by the progress page)."""
+
+    def get(self, request, import_id):
+        ofx_import = OFXImport.objects.filter(pk=import_id, user=request.user).first()
         
-        if form.is_valid():
-            created_count = 0
-            error_count = 0
-            
-            try:
-                with db_transaction.atomic():
-                    for idx, trans_data in enumerate(import_data['transactions']):
-                        try:
-                            category = form.cleaned_data[f'category_{idx}']
-                            
-                            Transaction.objects.create(
-                                account=account,
-                                category=category,
-                                transaction_type=trans_data['type'],
-                                amount=Decimal(str(trans_data['amount'])),
-                                transaction_date=trans_data['date'],
-                                description=trans_data['description']
-                            )
-                            created_count += 1
-                            
-                        except Exception as e:
-                            error_count += 1
-                            print(f"Error creating transaction: {e}")
-                            continue
-                
-                del request.session['ofx_import_data']
-                
-                if created_count > 0:
-                    messages.success(
-                        request,
-                        f'✅ Sucesso! {created_count} transação(ões) importada(s).'
-                    )
-                    
-                    Notification.create_import_success(
-                        user=request.user,
-                        count=created_count
-                    )
-                
-                if import_data.get('skipped_count', 0) > 0:
-                    messages.info(
-                        request,
-                        f'ℹ️ {import_data["skipped_count"]} transação(ões) duplicada(s) ignorada(s).'
-                    )
-                
-                if error_count > 0:
-                    messages.warning(
-                        request,
-                        f'⚠️ {error_count} transação(ões) com erro.'
-                    )
-                
-                return redirect('profile:profile')
-                
-            except Exception as e:
-                messages.error(request, f'Erro ao importar transações: {str(e)}')
-                return redirect('profile:import_ofx')
+        if not ofx_import:
+            return JsonResponse({'error': 'Importação não encontrada.'}, status=404)
         
-        context = {
-            'form': form,
-            'account': account,
-            'transactions': import_data['transactions'],
-            'total_transactions': len(import_data['transactions']),
-            'skipped_count': import_data.get('skipped_count', 0),
-        }
-        return render(request, self.template_name, context)
\ No newline at end of file
+        resume_if_stale(ofx_import)
+        
+        return JsonResponse({
+            'status': ofx_import.status,
+            'status_display': ofx_import.get_status_display(),
+            'total': ofx_import.total_rows,
+            'processed': ofx_import.processed_count,
+            'created': ofx_import.created_count,
+            'skipped': ofx_import.skipped_count,
+            'errors': ofx_import.error_count,
+            'percent': ofx_import.progress_percent,
+            'finished': ofx_import.status not in OFXImport.ACTIVE_STATUSES,
+            'last_error': ofx_import.last_error,
+        })
@@ -183,17 +183,18 @@ echo ""
 # ============================================
 # INICIA GUNICORN
 # ============================================
-echo "🚀 Iniciando Gunicorn..."
+# ASGI (uvicorn worker): o streaming do chatbot (SSE) não prende threads
+# enquanto espera a IA; views síncronas rodam no thread pool do Django
+echo "🚀 Iniciando Gunicorn (ASGI/Uvicorn)..."
 echo "   Workers: ${WEB_CONCURRENCY:-2}"
-echo "   Threads por worker: ${PYTHON_MAX_THREADS:-4}"
 echo "   Porta: ${PORT:-8080}"
 echo "   Timeout: 120s"
 echo ""
 
-exec gunicorn core.wsgi \
+exec gunicorn core.asgi:application \
+    --worker-class uvicorn_worker.UvicornWorker \
     --bind 0.0.0.0:${PORT:-8080} \
     --workers ${WEB_CONCURRENCY:-2} \
-    --threads ${PYTHON_MAX_THREADS:-4} \
     --timeout 120 \
     --log-level info \
     --access-logfile - \
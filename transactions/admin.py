@@ -28,6 +28,7 @@ class TransactionAdmin(admin.ModelAdmin):
     )
     date_hierarchy = 'transaction_date'
     readonly_fields = (
+        'fingerprint',
         'created_at',
         'updated_at',
     )
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:12
+
+import hashlib
+import re
+import unicodedata
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+# Frozen copies of transactions.fingerprints as of this migration: later
+# changes to the helpers must not change what this backfill computes
+
+
+def normalize_description(description):
+    text = unicodedata.normalize('NFKD', description or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _WHITESPACE_RE.sub(' ', text).strip().upper()
+
+
+def content_fingerprint(account_id, transaction_date, amount, description, occurrence=0):
+    parts = [
+        'content',
+        account_id,
+        transaction_date.isoformat(),
+        f'{abs(Decimal(str(amount))):.2f}',
+        normalize_description(description),
+    ]
+    if occurrence:
+        parts.append(occurrence)
+    payload = '|'.join(str(part) for part in parts)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    '''
+    Fingerprint existing transactions with the content hash so re-importing
+    an already imported statement is still detected. Identical rows on the
+    same account and day get increasing occurrence indexes, mirroring
+    FingerprintBuilder.
+
+    Rows created before this migration cannot be told apart (imported or
+    typed by hand), so all of them get the content hash; a hand-typed row
+    then matches the same statement line exactly. Transactions created
+    manually from now on keep a NULL fingerprint and are matched by content
+    during the import (see profiles/importers/pipeline.py).
+    '''
+    Transaction = apps.get_model('transactions', 'Transaction')
+
+    batch = []
+    occurrences = {}
+    current_day = None
+    queryset = Transaction.objects.order_by('account_id', 'transaction_date', 'pk').only(
+        'pk', 'account_id', 'transaction_date', 'amount', 'description'
+    )
+    for transaction in queryset.iterator(chunk_size=BATCH_SIZE):
+        day = (transaction.account_id, transaction.transaction_date)
+        if day != current_day:
+            current_day = day
+            occurrences = {}
+
+        key = (transaction.amount, normalize_description(transaction.description))
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+
+        transaction.fingerprint = content_fingerprint(
+            transaction.account_id,
+            transaction.transaction_date,
+            transaction.amount,
+            transaction.description,
+            occurrence,
+        )
+        batch.append(transaction)
+        if len(batch) >= BATCH_SIZE:
+            Transaction.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+
+    Transaction.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_transaction_credit_card'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Identifica a linha do extrato importado (FITID ou hash do conteúdo)', max_length=64, null=True, unique=True, verbose_name='Impressão digital'),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
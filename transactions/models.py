@@ -22,6 +22,8 @@ class Transaction(models.Model):
         amount: Transaction amount in BRL (must be positive, min 0.01)
         transaction_date: Date when the transaction occurred
         description: Optional text description
+        fingerprint: Unique source-line id for imported transactions (NULL when manual),
+            see transactions/fingerprints.py
         created_at: Timestamp when transaction was created (auto-generated)
         updated_at: Timestamp when transaction was last modified (auto-updated)
 
@@ -108,6 +110,15 @@ class Transaction(models.Model):
     blank=True,
     help_text='Vincule se a transação foi feita com cartão de crédito'
     )
+    fingerprint = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Impressão digital',
+        help_text='Identifica a linha do extrato importado (FITID ou hash do conteúdo)'
+    )
 
     class Meta:
         verbose_name = 'Transação'
@@ -142,8 +153,9 @@ def processar_gamificacao_transacao(sender, instance, created, **kwargs):
     
     try:
         # Importa aqui para evitar circular import
+        from django.utils import timezone
+        from gamification.achievements import TRANSACAO_CRIADA
         from gamification.services import GamificationService
-        from gamification.models import PerfilGamificacao
         
         # Pega o usuário da transação
         user = instance.account.user
@@ -155,62 +167,20 @@ def processar_gamificacao_transacao(sender, instance, created, **kwargs):
         bonus = int(instance.amount / 100)
         pontos += bonus
         
-        # Adiciona os pontos
-        GamificationService.adicionar_pontos(
-            user=user,
+        # Adiciona os pontos e verifica as conquistas de transações
+        # (contador no perfil, sem contar as transações a cada evento)
+        GamificationService.registrar_evento(
+            user,
+            TRANSACAO_CRIADA,
             pontos=pontos,
             tipo='transacao',
-            descricao=f'💰 Transação registrada: {instance.description[:50] if instance.description else "sem descrição"}'
+            descricao=f'💰 Transação registrada: {instance.description[:50] if instance.description else "sem descrição"}',
+            hora=timezone.localtime(instance.created_at).hour if instance.created_at else None
         )
         
         # Atualiza streak (sequência de dias)
         GamificationService.atualizar_streak(user)
         
-        # Verifica conquistas de transações
-        verificar_conquistas_transacoes(user)
-        
     except Exception as e:
         # Se der erro, só loga mas não quebra a criação da transação
         print(f"Erro ao processar gamificação: {e}")
-
-
-def verificar_conquistas_transacoes(user):
-    """
-    Verifica e desbloqueia conquistas relacionadas a transações
-    """
-    try:
-        from gamification.services import GamificationService
-        
-        # Conta quantas transações o usuário tem
-        total = Transaction.objects.filter(account__user=user).count()
-        
-        # Primeira transação
-        if total == 1:
-            GamificationService.verificar_e_desbloquear_conquista(
-                user, 
-                'primeira_transacao'
-            )
-        
-        # 10 transações
-        elif total == 10:
-            GamificationService.verificar_e_desbloquear_conquista(
-                user, 
-                '10_transacoes'
-            )
-        
-        # 50 transações
-        elif total == 50:
-            GamificationService.verificar_e_desbloquear_conquista(
-                user, 
-                '50_transacoes'
-            )
-        
-        # 100 transações
-        elif total == 100:
-            GamificationService.verificar_e_desbloquear_conquista(
-                user, 
-                '100_transacoes'
-            )
-        
-    except Exception as e:
-        print(f"Erro ao verificar conquistas: {e}")
\ No newline at end of file
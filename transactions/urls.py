@@ -1,6 +1,12 @@
 from django.urls import path
 
-from .views import TransactionCreateView, TransactionDeleteView, TransactionListView, TransactionUpdateView
+from .views import (
+    CategorySuggestionView,
+    TransactionCreateView,
+    TransactionDeleteView,
+    TransactionListView,
+    TransactionUpdateView,
+)
 
 app_name = 'transactions'
 
@@ -9,4 +15,5 @@ urlpatterns = [
     path('new/', TransactionCreateView.as_view(), name='transaction_create'),
     path('<int:pk>/edit/', TransactionUpdateView.as_view(), name='transaction_update'),
     path('<int:pk>/delete/', TransactionDeleteView.as_view(), name='transaction_delete'),
+    path('suggest-category/', CategorySuggestionView.as_view(), name='suggest_category'),
 ]
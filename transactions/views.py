@@ -1,15 +1,16 @@
 from datetime import date
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Q, Sum
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse_lazy
 from django.utils.dateparse import parse_date
-from django.views.generic import CreateView, DeleteView, ListView, UpdateView
+from django.views.generic import CreateView, DeleteView, ListView, UpdateView, View
 
 from accounts.models import Account
+from categories.classifier import CategorySuggester
 from categories.models import Category
 
 from .forms import TransactionForm
@@ -262,3 +263,28 @@ class TransactionDeleteView(LoginRequiredMixin, DeleteView):
         self.object.delete()
         messages.success(self.request, 'Transação excluída com sucesso!')
         return HttpResponseRedirect(success_url)
+
+
+class CategorySuggestionView(LoginRequiredMixin, View):
+    """
+    Sugere a categoria de uma nova transação a partir da descrição.
+
+    Usa o classificador aprendido do usuário e, na falta de confiança, as
+    regras por palavra-chave. Consumido pelo formulário de transação.
+    """
+
+    def get(self, request):
+        description = request.GET.get('description', '').strip()
+        transaction_type = request.GET.get('transaction_type', '')
+        try:
+            amount = Decimal(request.GET.get('amount') or 0)
+        except InvalidOperation:
+            amount = None
+        if amount is not None and not amount.is_finite():
+            return JsonResponse({'error': 'Valor inválido'}, status=400)
+
+        category_id = None
+        if description and transaction_type in Transaction.TransactionType.values:
+            category_id = CategorySuggester(request.user).suggest(description, transaction_type, amount)
+
+        return JsonResponse({'category_id': category_id})